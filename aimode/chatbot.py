@@ -1,12 +1,51 @@
+import asyncio
+import contextvars
 import json, ast
-from typing import Dict, Any, Optional, List
-from aimode.core.agent import graph
-from aimode.core.tools import get_last_generated_testplan
+from copy import deepcopy
+from typing import AsyncIterator, Dict, Any, Optional, List, Tuple
+from asgiref.sync import sync_to_async
+from aimode.core.agent import AGENT_REPLY_TAG, graph
+from aimode.core.tools import get_last_generated_testplan, session_context
 from langchain_core.messages import HumanMessage, ToolMessage
-from langgraph.checkpoint.memory import MemorySaver
 from loguru import logger
 
-memory = MemorySaver()
+
+def _modified_plan_response(result: Dict[str, Any]) -> Dict[str, Any]:
+    logger.success(result)
+    return {
+        "content": result["content"],
+        "tcs_data": result.get("tcs_data"),
+        "suggestions": [
+            "Yes, save the updated test plan",
+            "No, discard changes",
+        ],
+        "ask_to_save": True,
+    }
+
+
+MODIFY_SUGGESTIONS_RESPONSE = {
+    "content": "Hey! You have chosen to modify the test plan, What would you like to do next — add some new test cases or remove a few from your test plan?",
+    "suggestions": [
+        "Add new test cases",
+        "Delete testcases",
+    ],
+}
+
+GRAPH_ERROR_RESPONSE = {
+    "content": "Something went wrong while creating the test plan. Please retry or modify your parameters.",
+    "tcs_data": {},
+    "suggestions": [],
+}
+
+
+def _graph_input(query: str, session_id: str):
+    config = {"configurable": {"thread_id": session_id}}
+    state = {
+        "messages": [HumanMessage(content=query)],
+        "user_prompt": query,
+        "session_id": session_id,
+    }
+    return state, config
 
 
 def get_llm_response(
@@ -19,48 +58,120 @@ def get_llm_response(
     if tcs_list is not None:
         from aimode.core.modify_testplan import modify_testplan
 
-        result = modify_testplan(
-            session_id=session_id, add_data=add_data, tcs_list=tcs_list
+        return _modified_plan_response(
+            modify_testplan(session_id=session_id, add_data=add_data, tcs_list=tcs_list)
         )
-        logger.success(result)
-        return {
-            "content": result["content"],
-            "tcs_data": result.get("tcs_data"),
-            "suggestions": [
-                "Yes, save the updated test plan",
-                "No, discard changes",
-            ],
-            "ask_to_save": True,
-        }
     logger.success(modify_extra_suggestions)
-    # if modify_extra_suggestions:
-    #     return
-
     if modify_extra_suggestions:
-        return {
-            "content": "Hey! You have chosen to modify the test plan, What would you like to do next — add some new test cases or remove a few from your test plan?",
-            "suggestions": [
-                "Add new test cases",
-                "Delete testcases",
-            ],
-        }
+        return deepcopy(MODIFY_SUGGESTIONS_RESPONSE)
+
+    state, config = _graph_input(query, session_id)
+    try:
+        with session_context(session_id, query):
+            messages = graph.invoke(state, config=config)
+    except Exception as e:
+        logger.error(f"LLM or tool execution failed: {e}")
+        return deepcopy(GRAPH_ERROR_RESPONSE)
+    return build_llm_response(messages)
 
-    config = {"configurable": {"thread_id": session_id}}
-    state = {
-        "messages": [HumanMessage(content=query)],
-        "user_prompt": query,
-        "session_id": session_id,
-    }
 
+async def aget_llm_response(
+    query: str,
+    session_id: str,
+    add_data: bool = False,
+    tcs_list: List[Dict[str, Any]] = None,
+    modify_extra_suggestions: bool = False,
+) -> Dict[str, Any]:
+    """Async ``get_llm_response``; the event loop is free while the LLM answers."""
+    if tcs_list is not None:
+        from aimode.core.modify_testplan import modify_testplan
+
+        result = await sync_to_async(modify_testplan, thread_sensitive=False)(
+            session_id=session_id, add_data=add_data, tcs_list=tcs_list
+        )
+        return _modified_plan_response(result)
+    if modify_extra_suggestions:
+        return deepcopy(MODIFY_SUGGESTIONS_RESPONSE)
+
+    state, config = _graph_input(query, session_id)
     try:
-        messages = graph.invoke(state, config=config)
+        with session_context(session_id, query):
+            messages = await graph.ainvoke(state, config=config)
     except Exception as e:
         logger.error(f"LLM or tool execution failed: {e}")
-        return {
-            "content": "Something went wrong while creating the test plan. Please retry or modify your parameters.",
-            "tcs_data": {},
-            "suggestions": [],
-        }
+        return deepcopy(GRAPH_ERROR_RESPONSE)
+    return build_llm_response(messages)
+
+
+async def _produce_graph_events(queue: asyncio.Queue, state, config, query: str, session_id: str):
+    """
+    Run the graph in its own task, with the session bound in the task's context,
+    and feed its events to ``queue``; an exception or ``None`` ends the stream.
+    """
+    try:
+        with session_context(session_id, query):
+            async for event in graph.astream_events(state, config=config, version="v2"):
+                queue.put_nowait(event)
+    except Exception as e:
+        queue.put_nowait(e)
+        return
+    queue.put_nowait(None)
+
+
+async def astream_llm_response(
+    query: str,
+    session_id: str,
+    add_data: bool = False,
+    tcs_list: List[Dict[str, Any]] = None,
+    modify_extra_suggestions: bool = False,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Streaming ``aget_llm_response`` yielding ``(event, data)`` pairs while the
+    graph runs: ``token`` for each piece of the assistant reply, ``tool_start``
+    and ``tool_end`` around tool calls and a final ``result`` holding the same
+    payload ``get_llm_response`` returns.
+
+    The graph runs in a separate task so no context variable is set across the
+    yields here: a client disconnect closes this generator from another context,
+    which then only has to cancel the task.
+    """
+    if tcs_list is not None or modify_extra_suggestions:
+        yield "result", await aget_llm_response(query, session_id, add_data, tcs_list, modify_extra_suggestions)
+        return
+
+    state, config = _graph_input(query, session_id)
+    final_state = None
+    queue = asyncio.Queue()
+    task = asyncio.create_task(
+        _produce_graph_events(queue, state, config, query, session_id), context=contextvars.copy_context()
+    )
+    try:
+        while (event := await queue.get()) is not None:
+            if isinstance(event, Exception):
+                logger.error(f"LLM or tool execution failed: {event}")
+                yield "result", deepcopy(GRAPH_ERROR_RESPONSE)
+                return
+            kind = event["event"]
+            if kind == "on_chat_model_stream" and AGENT_REPLY_TAG in event.get("tags", []):
+                content = event["data"]["chunk"].content
+                if content and isinstance(content, str):
+                    yield "token", {"content": content}
+            elif kind == "on_tool_start":
+                yield "tool_start", {"tool": event["name"]}
+            elif kind == "on_tool_end":
+                yield "tool_end", {"tool": event["name"]}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                final_state = event["data"].get("output")
+    finally:
+        task.cancel()
+    if not final_state or not final_state.get("messages"):
+        yield "result", deepcopy(GRAPH_ERROR_RESPONSE)
+        return
+    yield "result", build_llm_response(final_state)
+
+
+def build_llm_response(messages: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn the final graph state into the chat response payload."""
     msgs = messages["messages"]
     last_human_index = max(
         (i for i, m in enumerate(msgs) if isinstance(m, HumanMessage)), default=-1
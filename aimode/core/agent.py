@@ -1,12 +1,14 @@
 from typing import Sequence, Annotated
 from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph
 import operator
 from langgraph.prebuilt import ToolNode, tools_condition
-from langgraph.checkpoint.memory import MemorySaver
 from pydantic import BaseModel, Field
 from typing import List, Optional
 from typing_extensions import TypedDict
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from loguru import logger
 
 from aimode.core.tools import (
@@ -14,13 +16,15 @@ from aimode.core.tools import (
     execute_sql_query,
     generate_testplan,
     save_new_testplan_version,
-    set_current_session_id,
     add_testcases,
     delete_testcases,
 )
 from aimode.core.testplan_filter import filter_testcases_tool
 from aimode.core.prompts import AGENT_PROMPT, SUGGESTION_LLM_PROMPT
-from aimode.core.llms import llm
+from aimode.core.prompt_context import get_prompt_context
+from aimode.core.llms import get_llm
+from aimode.core.checkpointer import DatabaseSaver
+from aimode.core.suggestions import rule_based_suggestions
 
 
 class AgentState(TypedDict):
@@ -45,10 +49,12 @@ tools = [
     delete_testcases,
     filter_testcases_tool,
 ]
-llm_with_tools = AGENT_PROMPT | llm.bind_tools(tools)
+# tagged so streamed tokens of the reply can be told apart from the suggestion pass
+AGENT_REPLY_TAG = "agent_reply"
+llm_with_tools = (AGENT_PROMPT | get_llm().bind_tools(tools)).with_config(tags=[AGENT_REPLY_TAG])
 
 
-def chatbot(state: AgentState):
+def _prepare_turn(state: AgentState):
     messages = state["messages"]
     user_prompt = state.get("user_prompt", None)
     session_id = state.get("session_id", None)
@@ -65,21 +71,33 @@ def chatbot(state: AgentState):
             messages[0].content if hasattr(messages[0], "content") else str(messages[0])
         )
 
-    set_current_session_id(session_id=session_id, user_prompt=user_prompt)
-    logger.info(f"session_id set for tools: {session_id}")
-    response = llm_with_tools.invoke({"messages": messages})
-    # logger.info(f"LLM raw response: {response}")
-    if hasattr(response, "additional_kwargs"):
-        logger.info(f"LLM additional kwargs: {response.additional_kwargs}")
+    # the tools read the session bound by the caller's ``session_context``
+    return messages, user_prompt, session_id
 
-    content_to_structure = (
-        response.content if hasattr(response, "content") else str(response)
-    )
 
-    chain = SUGGESTION_LLM_PROMPT | llm.with_structured_output(
+def _suggestion_chain():
+    return SUGGESTION_LLM_PROMPT | get_llm().with_structured_output(
         GetSuggestions, method="function_calling"
     )
-    structured = chain.invoke({"content": content_to_structure})
+
+
+def _is_final_turn(response):
+    """A reply without tool calls ends the turn; only its suggestions reach the user."""
+    return not getattr(response, "tool_calls", None)
+
+
+def _prompt_variables():
+    return get_prompt_context().variables()
+
+
+def _rule_suggestions(response, user_prompt):
+    content = _content(response)
+    return GetSuggestions(base_content=content, suggestions=rule_based_suggestions(content, user_prompt))
+
+
+def _finish_turn(response, structured, user_prompt, session_id):
+    if structured is None:
+        return {"messages": [response]}
     try:
         structured_dict = structured.dict()
         base_content = structured_dict.get("base_content")
@@ -104,13 +122,51 @@ def chatbot(state: AgentState):
     return {"messages": [response]}
 
 
+def _content(response):
+    return response.content if hasattr(response, "content") else str(response)
+
+
+def chatbot(state: AgentState):
+    messages, user_prompt, session_id = _prepare_turn(state)
+    variables = _prompt_variables()
+    response = llm_with_tools.invoke({"messages": messages, **variables})
+    # logger.info(f"LLM raw response: {response}")
+    if hasattr(response, "additional_kwargs"):
+        logger.info(f"LLM additional kwargs: {response.additional_kwargs}")
+
+    structured = None
+    if _is_final_turn(response):
+        if settings.AGENT_SUGGESTIONS == "llm":
+            structured = _suggestion_chain().invoke({"content": _content(response), **variables})
+        else:
+            structured = _rule_suggestions(response, user_prompt)
+    return _finish_turn(response, structured, user_prompt, session_id)
+
+
+async def achatbot(state: AgentState):
+    """Async ``chatbot`` used by ``graph.ainvoke``; awaits the LLM instead of blocking a thread."""
+    messages, user_prompt, session_id = _prepare_turn(state)
+    variables = await sync_to_async(_prompt_variables)()
+    response = await llm_with_tools.ainvoke({"messages": messages, **variables})
+    if hasattr(response, "additional_kwargs"):
+        logger.info(f"LLM additional kwargs: {response.additional_kwargs}")
+
+    structured = None
+    if _is_final_turn(response):
+        if settings.AGENT_SUGGESTIONS == "llm":
+            structured = await _suggestion_chain().ainvoke({"content": _content(response), **variables})
+        else:
+            structured = await sync_to_async(_rule_suggestions)(response, user_prompt)
+    return _finish_turn(response, structured, user_prompt, session_id)
+
+
 # Workflow definition
 workflow = StateGraph(AgentState)
-workflow.add_node("chatbot", chatbot)
+workflow.add_node("chatbot", RunnableLambda(chatbot, afunc=achatbot))
 workflow.add_node("tools", ToolNode(tools))
 workflow.add_conditional_edges("chatbot", tools_condition)
 workflow.add_edge("tools", "chatbot")
 workflow.set_entry_point("chatbot")
 
-memory = MemorySaver()
+memory = DatabaseSaver()
 graph = workflow.compile(checkpointer=memory)
@@ -4,8 +4,9 @@ Detects major changes between consecutive queries using LLM reasoning, 'no save'
 
 from typing import Dict
 from loguru import logger
-from aimode.core.llms import llm
+from aimode.core.llms import get_llm
 from aimode.core.prompts import CHANGE_DETECTION_PROMPT
+from aimode.core.prompt_context import get_prompt_context
 
 # In-memory store for the last query per session
 LAST_QUERY_CACHE: Dict[str, str] = {}
@@ -65,9 +66,9 @@ class QueryChangeDetectorLLM:
     def _llm_decide_major_change(self, last_query: str, current_query: str) -> bool:
         try:
             prompt = CHANGE_DETECTION_PROMPT.format_messages(
-                last_query=last_query, current_query=current_query
+                last_query=last_query, current_query=current_query, **get_prompt_context().variables()
             )
-            response = llm.invoke(prompt)
+            response = get_llm().invoke(prompt)
             answer = response.content.strip().upper()
             is_major = answer.startswith("YES")
             logger.info(f"LLM decision on major change: {answer} -> {is_major}")
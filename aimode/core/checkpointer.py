@@ -0,0 +1,332 @@
+"""
+Database backed LangGraph checkpointer for the AI chat.
+
+Checkpoints are stored as ``AgentCheckpoint`` rows, so a conversation survives
+restarts and continues on whichever worker serves the next request. Memory per
+worker stays bounded: each thread keeps only its latest
+``AGENT_CHECKPOINT_HISTORY`` checkpoints, the ``messages`` channel is trimmed to
+``AGENT_CHECKPOINT_MAX_MESSAGES`` and only ``AGENT_CHECKPOINT_CACHE_SIZE``
+decoded checkpoints are cached in process. Idle threads are evicted by the
+``compact_sessions`` command.
+
+LangGraph calls the checkpointer from its own short lived worker threads, each
+of which would open a database connection. All queries therefore run on a pool
+of ``AGENT_CHECKPOINT_WORKERS`` threads owned by the saver, each keeping its own
+connection, so concurrent chats do not queue behind one another while the
+number of connections per process stays bounded.
+"""
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator, Optional, Sequence
+
+from django.conf import settings
+from django.db import Error, connections, router, transaction
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    copy_checkpoint,
+    get_checkpoint_id,
+    get_serializable_checkpoint_metadata,
+)
+
+from apps.core.models import AgentCheckpoint, AgentCheckpointWrite
+
+
+def trim_messages(messages, limit):
+    """
+    Keep the last ``limit`` messages, starting at a user message so a tool
+    result is never separated from the tool call that requested it.
+    """
+    if not limit or len(messages) <= limit:
+        return messages
+    tail = list(messages[-limit:])
+    for index, message in enumerate(tail):
+        if isinstance(message, HumanMessage):
+            return tail[index:]
+    while tail and isinstance(tail[0], ToolMessage):
+        tail.pop(0)
+    return tail
+
+
+class CheckpointCache:
+    """Thread safe LRU of decoded checkpoints; checkpoint ids are immutable so entries never go stale."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            checkpoint = self._data.get(key)
+            if checkpoint is not None:
+                self._data.move_to_end(key)
+            return checkpoint
+
+    def set(self, key, checkpoint):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = checkpoint
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_thread(self, thread_id):
+        with self._lock:
+            for key in [key for key in self._data if key[0] == thread_id]:
+                del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class DatabaseSaver(BaseCheckpointSaver[int]):
+    """``BaseCheckpointSaver`` storing checkpoints and pending writes through the Django ORM."""
+
+    def __init__(self, *, serde=None, history=None, max_messages=None, cache_size=None, workers=None):
+        super().__init__(serde=serde)
+        self.history = settings.AGENT_CHECKPOINT_HISTORY if history is None else history
+        self.max_messages = settings.AGENT_CHECKPOINT_MAX_MESSAGES if max_messages is None else max_messages
+        self.cache = CheckpointCache(settings.AGENT_CHECKPOINT_CACHE_SIZE if cache_size is None else cache_size)
+        self.using = router.db_for_write(AgentCheckpoint)
+        self._executor = ThreadPoolExecutor(
+            max_workers=settings.AGENT_CHECKPOINT_WORKERS if workers is None else workers,
+            thread_name_prefix='checkpointer', initializer=self._register_thread,
+        )
+        self._threads = set()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _register_thread(self):
+        connection = connections[self.using]
+        # ``close`` closes the worker connections from the calling thread
+        connection.inc_thread_sharing()
+        with self._lock:
+            self._threads.add(threading.get_ident())
+            self._connections.append(connection)
+
+    def _run(self, func, *args):
+        try:
+            return func(*args)
+        except Error:
+            # drop a broken connection so the next call reconnects
+            connections[self.using].close()
+            raise
+
+    def _call(self, func, *args):
+        if threading.get_ident() in self._threads:
+            return func(*args)
+        return self._executor.submit(self._run, func, *args).result()
+
+    async def _acall(self, func, *args):
+        return await asyncio.wrap_future(self._executor.submit(self._run, func, *args))
+
+    def close(self):
+        """Stop the saver's threads and close their database connections."""
+        self._executor.shutdown()
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+                connection.dec_thread_sharing()
+            self._connections.clear()
+
+    @staticmethod
+    def _config(thread_id, checkpoint_ns, checkpoint_id):
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint_id}}
+
+    def _load_checkpoint(self, row):
+        key = (row.thread_id, row.checkpoint_ns, row.checkpoint_id)
+        checkpoint = self.cache.get(key)
+        if checkpoint is None:
+            data = AgentCheckpoint.objects.filter(pk=row.pk).values_list('checkpoint', flat=True).first()
+            checkpoint = self.serde.loads_typed((row.checkpoint_type, bytes(data)))
+            self.cache.set(key, checkpoint)
+        return copy_checkpoint(checkpoint)
+
+    def _pending_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        writes = AgentCheckpointWrite.objects.filter(
+            thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint_id,
+        ).order_by('task_id', 'idx').values_list('task_id', 'channel', 'value_type', 'value')
+        return [(task_id, channel, self.serde.loads_typed((value_type, bytes(value))))
+                for task_id, channel, value_type, value in writes]
+
+    def _to_tuple(self, row):
+        return CheckpointTuple(
+            config=self._config(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+            checkpoint=self._load_checkpoint(row),
+            metadata=row.metadata,
+            parent_config=(self._config(row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id)
+                           if row.parent_checkpoint_id else None),
+            pending_writes=self._pending_writes(row.thread_id, row.checkpoint_ns, row.checkpoint_id),
+        )
+
+    def _get_tuple(self, config):
+        rows = AgentCheckpoint.objects.defer('checkpoint').filter(
+            thread_id=config["configurable"]["thread_id"],
+            checkpoint_ns=config["configurable"].get("checkpoint_ns", ""),
+        ).order_by('-checkpoint_id')
+        if checkpoint_id := get_checkpoint_id(config):
+            rows = rows.filter(checkpoint_id=checkpoint_id)
+        row = rows.first()
+        return self._to_tuple(row) if row else None
+
+    def _list(self, config, filter, before, limit):
+        rows = AgentCheckpoint.objects.defer('checkpoint').order_by('-checkpoint_id')
+        if config:
+            rows = rows.filter(thread_id=config["configurable"]["thread_id"])
+            if "checkpoint_ns" in config["configurable"]:
+                rows = rows.filter(checkpoint_ns=config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                rows = rows.filter(checkpoint_id=checkpoint_id)
+        if filter:
+            rows = rows.filter(metadata__contains=filter)
+        if before and (before_id := get_checkpoint_id(before)):
+            rows = rows.filter(checkpoint_id__lt=before_id)
+        if limit:
+            rows = rows[:limit]
+        return [self._to_tuple(row) for row in rows]
+
+    def _put(self, config, checkpoint, metadata):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint = copy_checkpoint(checkpoint)
+        if isinstance(checkpoint["channel_values"].get("messages"), (list, tuple)):
+            checkpoint["channel_values"]["messages"] = trim_messages(
+                checkpoint["channel_values"]["messages"], self.max_messages
+            )
+        checkpoint_type, data = self.serde.dumps_typed(checkpoint)
+        with transaction.atomic(using=self.using):
+            AgentCheckpoint.objects.update_or_create(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint["id"],
+                defaults={
+                    'parent_checkpoint_id': config["configurable"].get("checkpoint_id"),
+                    'checkpoint_type': checkpoint_type,
+                    'checkpoint': data,
+                    'metadata': get_serializable_checkpoint_metadata(config, metadata),
+                },
+            )
+            self._prune(thread_id, checkpoint_ns)
+        self.cache.set((thread_id, checkpoint_ns, checkpoint["id"]), checkpoint)
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _prune(self, thread_id, checkpoint_ns):
+        """Drop checkpoints of the thread beyond the newest ``history`` and their writes."""
+        if not self.history:
+            return
+        stale = list(AgentCheckpoint.objects.filter(
+            thread_id=thread_id, checkpoint_ns=checkpoint_ns,
+        ).order_by('-checkpoint_id').values_list('checkpoint_id', flat=True)[self.history:])
+        if stale:
+            AgentCheckpointWrite.objects.filter(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id__in=stale,
+            ).delete()
+            AgentCheckpoint.objects.filter(
+                thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id__in=stale,
+            ).delete()
+
+    def _put_writes(self, config, writes, task_id, task_path):
+        keys = {
+            'thread_id': config["configurable"]["thread_id"],
+            'checkpoint_ns': config["configurable"].get("checkpoint_ns", ""),
+            'checkpoint_id': config["configurable"]["checkpoint_id"],
+        }
+        regular, special = [], []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, data = self.serde.dumps_typed(value)
+            write = AgentCheckpointWrite(task_id=task_id, task_path=task_path, idx=WRITES_IDX_MAP.get(channel, idx),
+                                         channel=channel, value_type=value_type, value=data, **keys)
+            (special if write.idx < 0 else regular).append(write)
+        with transaction.atomic(using=self.using):
+            # regular writes are never overwritten, special ones (errors, interrupts) always are
+            AgentCheckpointWrite.objects.bulk_create(regular, ignore_conflicts=True)
+            for write in special:
+                AgentCheckpointWrite.objects.update_or_create(
+                    task_id=task_id, idx=write.idx, **keys,
+                    defaults={'task_path': task_path, 'channel': write.channel,
+                              'value_type': write.value_type, 'value': write.value},
+                )
+
+    def _delete_thread(self, thread_id):
+        with transaction.atomic(using=self.using):
+            AgentCheckpointWrite.objects.filter(thread_id=thread_id).delete()
+            AgentCheckpoint.objects.filter(thread_id=thread_id).delete()
+        self.cache.discard_thread(thread_id)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return self._call(self._get_tuple, config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        yield from self._call(self._list, config, filter, before, limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self._call(self._put, config, checkpoint, metadata)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return self._call(self._put_writes, config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        return self._call(self._delete_thread, thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._acall(self._get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        for item in await self._acall(self._list, config, filter, before, limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._acall(self._put, config, checkpoint, metadata)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        return await self._acall(self._put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await self._acall(self._delete_thread, thread_id)
@@ -113,5 +113,5 @@ class SQLDatabaseConnection:
             logger.info("PostgreSQL connection closed cleanly.")
 
 
+# connects on first query, see ensure_connection_alive
 db = SQLDatabaseConnection()
-conn = db.connect_postgresql()
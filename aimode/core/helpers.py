@@ -1,6 +1,6 @@
 from typing import Dict, List
 from loguru import logger
-from aimode.core.database import db, conn
+from aimode.core.database import db
 
 # from database import db, conn
 from functools import lru_cache
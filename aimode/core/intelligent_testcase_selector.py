@@ -5,13 +5,129 @@ Intelligent hybrid test case selector:
 """
 
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from django.conf import settings
 from loguru import logger
 from rest_framework import status
+from django.db import close_old_connections
 from django.db.models import Q
 from typing import List, Dict
 from apps.core.helpers import generate_score
 from apps.core.models import Module
-from aimode.core.llms import llm
+from aimode.core.llm_cache import cached_llm
+from aimode.core.shortlist import encode_candidates, pick_candidates, shortlist_candidates
+
+# shared by all requests; a stage that times out keeps its worker until the LLM call returns
+_stage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="selector-stage")
+
+
+def _run_stages(stages, fallbacks, timeout=None):
+    """
+    Run independent post-selection stages concurrently and return their results
+    by name. A stage that fails or exceeds ``timeout`` seconds
+    (``AI_SELECTOR_STAGE_TIMEOUT``) gets its fallback value.
+    """
+    timeout = settings.AI_SELECTOR_STAGE_TIMEOUT if timeout is None else timeout
+    started = time.perf_counter()
+
+    def timed(name, stage):
+        stage_started = time.perf_counter()
+        # stage threads outlive requests, so their cache queries' connections are closed here
+        close_old_connections()
+        try:
+            return stage()
+        finally:
+            close_old_connections()
+            logger.info(f"[{name}] finished in {time.perf_counter() - stage_started:.2f}s")
+
+    futures = {name: _stage_executor.submit(timed, name, stage) for name, stage in stages.items()}
+    results = {}
+    for name, future in futures.items():
+        remaining = max(timeout - (time.perf_counter() - started), 0)
+        try:
+            results[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            future.cancel()
+            logger.error(f"{name.capitalize()} generation timed out after {timeout}s")
+            results[name] = fallbacks[name]
+        except Exception as e:
+            logger.error(f"{name.capitalize()} generation failed: {e}")
+            results[name] = fallbacks[name]
+    logger.info(f"Post-selection stages finished in {time.perf_counter() - started:.2f}s")
+    return results
+
+
+def _coverage_warning(selected_cases, module_names):
+    warning_prompt = f"""
+    You are a Senior QA Analyst who is working with a Risk-Based Testing system.
+
+    Evaluate whether the selected testcases below are sufficient for risk based testing of the selected modules {module_names}.
+    if not then explain what is missing to test the selected modules and how it can be improved.
+
+    The warning must:
+    - Not mention module names or numbers
+
+    If coverage appears adequate, return an empty string.
+    Output ONLY the warning or an empty string.
+
+    Selected testcases:
+    {encode_candidates(selected_cases)}
+    """
+    warning_response = cached_llm("coverage_warning").invoke(warning_prompt)
+
+    warning = getattr(warning_response, "content", str(warning_response)).strip()
+    warning = warning.replace("```", "").strip()
+    warning = warning.strip('"')
+    warning = " ".join(warning.split())
+    logger.success(warning)
+    return warning
+
+
+def _selection_reasoning(selected_cases, module_names):
+    logger.info("Generating reasoning for selected testcases...")
+
+    reasoning_system_prompt = """
+    You are a Senior QA Analyst contributing to Risk-Based Test Planning (RBTP) system.
+    Your task is to provide a concise, risk-focused reasoning for why each selected test case was chosen for testing of given modules or features.
+
+    Guidelines:
+    - Provide **1-2 clear, specific sentence** per test case.
+    - Base your reasoning on testcases and parameters like **failure rate, defect**.
+    - Explain how the test case helps cover high-risk areas, critical paths, or potential failure points.
+    - Avoid generic or obvious statements; focus on meaningful, risk-aware insights.
+    - Ensure each reasoning item is unique and tailored to the test case's purpose.
+
+    Return ONLY a valid JSON array in this format:
+    [
+    {"id": <testcase_id>, "reason": "<AI-driven risk-based explanation>"},
+    ...
+    ]
+    """
+
+    reasoning_user_prompt = f"""
+    MODULES: {module_names}
+
+    Selected Test Cases:
+    {encode_candidates(selected_cases)}
+
+    Generate risk-based reasoning for each test case.
+    """
+
+    reasoning_response = cached_llm("reasoning").invoke(
+        [
+            {"role": "system", "content": reasoning_system_prompt},
+            {"role": "user", "content": reasoning_user_prompt},
+        ]
+    )
+
+    reasoning_content = reasoning_response.content.strip()
+    if "```json" in reasoning_content:
+        reasoning_content = reasoning_content.split("```json")[-1].split("```")[0]
+
+    reasoning = json.loads(reasoning_content)
+    logger.info(f"Generated reasoning for {len(reasoning)} testcases.")
+    return reasoning
 
 
 def intelligent_testcase_selector(
@@ -70,7 +186,9 @@ def intelligent_testcase_selector(
             "message": "Error while fetching testcases. Please retry.",
         }
 
-    # Step 3: LLM selection (choose most relevant testcases)
+    # Step 3: LLM selection (choose most relevant testcases) from a shortlist that fits the prompt
+    candidates = shortlist_candidates(testcases, output_counts)
+    by_id = {testcase["id"]: testcase for testcase in candidates}
     try:
         system_prompt = """
         You are an expert QA Test Planner working in a risk-based testing system.
@@ -83,8 +201,8 @@ def intelligent_testcase_selector(
         MODULES: {module_names}
         REQUESTED NUMBER OF TESTCASES: {output_counts}
 
-        Below are the candidate test cases in JSON format:
-        {json.dumps(testcases, indent=2)}
+        Below are the candidate test cases, one per line after the header row:
+        {encode_candidates(candidates)}
 
         SELECTION RULES:
         - Analyze risk based on ALL attributes, not only testscore.
@@ -92,24 +210,26 @@ def intelligent_testcase_selector(
         - Do NOT create or imagine new testcases.
         - Only choose from the list provided above.
         - Only include testcases belonging to the requested modules.
-        - Output must be a pure JSON array of ONLY the selected testcase objects.
+        - Output must be a pure JSON array of ONLY the ids of the selected testcases.
 
         No extra text, explanations, comments, or metadata.
         Output MUST be a valid JSON array.
         """
 
-        llm_response = llm.invoke(
+        started = time.perf_counter()
+        llm_response = cached_llm("selection").invoke(
             [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt},
             ]
         )
+        logger.info(f"[selection] finished in {time.perf_counter() - started:.2f}s")
 
         content = llm_response.content.strip()
         if "```json" in content:
             content = content.split("```json")[-1].split("```")[0]
 
-        selected_cases = json.loads(content)
+        selected_cases = pick_candidates(json.loads(content), by_id)
         logger.info(f"LLM selected {len(selected_cases)} testcases.")
 
     except Exception as e:
@@ -120,82 +240,18 @@ def intelligent_testcase_selector(
             "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
             "message": "Error during intelligent selection. Please retry.",
         }
-    warning = ""
-    warning_prompt = f"""
-    You are a Senior QA Analyst who is working with a Risk-Based Testing system.
-
-    Evaluate whether the selected testcases {selected_cases} are sufficient for risk based testing of the selected modules {module_names}.
-    if not then explain what is missing to test the selected modules and how it can be improved.
-
-    The warning must:
-    - Not mention module names or numbers
-
-    If coverage appears adequate, return an empty string.
-    Output ONLY the warning or an empty string.
-    """
-
-    try:
-        warning_response = llm.invoke(warning_prompt)
-
-        warning = getattr(warning_response, "content", str(warning_response)).strip()
-        warning = warning.replace("```", "").strip()
-        warning = warning.strip('"')
-        warning = " ".join(warning.split())
-        logger.success(warning)
-
-    except Exception as e:
-        logger.error(f"Warning generation failed: {e}")
-        warning = ""
-
-    # Step 4: Generate separate reasoning summary
-    reasoning = []
-    try:
-        logger.info("Generating reasoning for selected testcases...")
-
-        reasoning_system_prompt = """
-        You are a Senior QA Analyst contributing to Risk-Based Test Planning (RBTP) system.
-        Your task is to provide a concise, risk-focused reasoning for why each selected test case was chosen for testing of given modules or features.
-
-        Guidelines:
-        - Provide **1-2 clear, specific sentence** per test case.
-        - Base your reasoning on testcases and parameters like **failure rate, defect**.
-        - Explain how the test case helps cover high-risk areas, critical paths, or potential failure points.
-        - Avoid generic or obvious statements; focus on meaningful, risk-aware insights.
-        - Ensure each reasoning item is unique and tailored to the test case's purpose.
-
-        Return ONLY a valid JSON array in this format:
-        [
-        {"id": <testcase_id>, "reason": "<AI-driven risk-based explanation>"},
-        ...
-        ]
-        """
-
-        reasoning_user_prompt = f"""
-        MODULES: {module_names}
-
-        Selected Test Cases:
-        {json.dumps(selected_cases, indent=2)}
-
-        Generate risk-based reasoning for each test case.
-        """
-
-        reasoning_response = llm.invoke(
-            [
-                {"role": "system", "content": reasoning_system_prompt},
-                {"role": "user", "content": reasoning_user_prompt},
-            ]
-        )
-
-        reasoning_content = reasoning_response.content.strip()
-        if "```json" in reasoning_content:
-            reasoning_content = reasoning_content.split("```json")[-1].split("```")[0]
-
-        reasoning = json.loads(reasoning_content)
-        logger.info(f"Generated reasoning for {len(reasoning)} testcases.")
-
-    except Exception as e:
-        logger.error(f"Reasoning generation failed: {e}")
-        reasoning = [{"id": None, "reason": "Reasoning generation failed."}]
+    # Step 4: coverage warning and reasoning only depend on the selection, so they run side by side
+    stages = _run_stages(
+        {
+            "warning": lambda: _coverage_warning(selected_cases, module_names),
+            "reasoning": lambda: _selection_reasoning(selected_cases, module_names),
+        },
+        fallbacks={
+            "warning": "",
+            "reasoning": [{"id": None, "reason": "Reasoning generation failed."}],
+        },
+    )
+    warning, reasoning = stages["warning"], stages["reasoning"]
 
     # Merging reasoning in testcases
     for i in range(min(len(selected_cases), len(reasoning))):
@@ -0,0 +1,133 @@
+"""
+Database cache of LLM responses for prompt stages that are asked the same
+thing again, e.g. SQL generation or the selector's warning and reasoning.
+
+``cached_llm(stage)`` returns the shared chat model with a ``DatabaseLLMCache``
+attached when the stage is listed in ``AI_LLM_CACHE_STAGES``. Entries are keyed
+by the SHA-256 of the model settings (deployment, temperature, ...) and the
+messages, expire after ``AI_LLM_CACHE_TTL_SECONDS`` and the least recently used
+ones are evicted once the table grows beyond ``AI_LLM_CACHE_MAX_ENTRIES`` (or by
+``manage.py llm_cache --evict``, which also drops expired ones). Hits and misses are
+counted per stage, per process in ``cache_stats`` and per entry in ``hits``.
+"""
+import hashlib
+import threading
+import warnings
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from langchain_core._api import LangChainBetaWarning
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, load
+from loguru import logger
+
+from aimode.core.llms import get_llm
+from apps.core.blobs import decode_payload, encode_payload
+from apps.core.models import LLMCacheEntry
+
+_stats = defaultdict(Counter)
+_stats_lock = threading.Lock()
+
+
+def _record(stage, outcome):
+    with _stats_lock:
+        _stats[stage][outcome] += 1
+
+
+def cache_key(prompt, llm_string):
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+
+class DatabaseLLMCache(BaseCache):
+    """LangChain cache storing the generations of one prompt stage in ``LLMCacheEntry``."""
+
+    def __init__(self, stage, ttl_seconds=None, max_entries=None):
+        self.stage = stage
+        self.ttl_seconds = settings.AI_LLM_CACHE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self.max_entries = settings.AI_LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+
+    def lookup(self, prompt, llm_string):
+        now = timezone.now()
+        entries = LLMCacheEntry.objects.filter(key=cache_key(prompt, llm_string), expires__gt=now)
+        entry = entries.values_list('id', 'data', 'codec').first()
+        if entry is None:
+            _record(self.stage, 'misses')
+            return None
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', LangChainBetaWarning)
+                generations = load(decode_payload(entry[1], entry[2]))
+        except Exception as e:
+            logger.warning(f"Discarding unreadable LLM cache entry for {self.stage}: {e}")
+            LLMCacheEntry.objects.filter(id=entry[0]).delete()
+            _record(self.stage, 'misses')
+            return None
+        LLMCacheEntry.objects.filter(id=entry[0]).update(hits=F('hits') + 1, modified=now)
+        _record(self.stage, 'hits')
+        return generations
+
+    def update(self, prompt, llm_string, return_val):
+        raw = dumps(return_val).encode()
+        codec, data = encode_payload(raw)
+        now = timezone.now()
+        using = router.db_for_write(LLMCacheEntry)
+        table = connections[using].ops.quote_name(LLMCacheEntry._meta.db_table)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {table} (created, modified, key, stage, codec, data, size, hits, expires)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, 0, %s)
+                ON CONFLICT (key) DO UPDATE SET codec = EXCLUDED.codec, data = EXCLUDED.data,
+                    size = EXCLUDED.size, modified = EXCLUDED.modified, expires = EXCLUDED.expires
+                """,
+                [now, now, cache_key(prompt, llm_string), self.stage, codec, data, len(raw),
+                 now + timedelta(seconds=self.ttl_seconds)],
+            )
+        _record(self.stage, 'writes')
+        if LLMCacheEntry.objects.count() > self.max_entries:
+            evict_entries(self.max_entries)
+
+    def clear(self, **kwargs):
+        LLMCacheEntry.objects.filter(stage=self.stage).delete()
+
+
+def evict_entries(max_entries=None):
+    """Delete expired entries and the least recently used ones beyond ``max_entries``."""
+    max_entries = settings.AI_LLM_CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    using = router.db_for_write(LLMCacheEntry)
+    table = connections[using].ops.quote_name(LLMCacheEntry._meta.db_table)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"""
+            DELETE FROM {table} WHERE expires <= %s OR id IN (
+                SELECT id FROM {table} ORDER BY modified DESC OFFSET %s
+            )
+            """,
+            [timezone.now(), max_entries],
+        )
+        return cursor.rowcount
+
+
+def cache_stats():
+    """Per stage entries, stored bytes and hits in the database plus this process' hit/miss counters."""
+    stages = defaultdict(lambda: {'entries': 0, 'bytes': 0, 'stored_hits': 0, 'hits': 0, 'misses': 0, 'writes': 0})
+    for row in LLMCacheEntry.objects.values('stage').annotate(
+        entries=Count('id'), bytes=Sum('size'), stored_hits=Sum('hits'),
+    ).order_by('stage'):
+        stages[row['stage']].update(entries=row['entries'], bytes=row['bytes'] or 0,
+                                    stored_hits=row['stored_hits'] or 0)
+    with _stats_lock:
+        for stage, counter in _stats.items():
+            stages[stage].update(counter)
+    return dict(stages)
+
+
+def cached_llm(stage):
+    """The chat model for ``stage``, caching its responses if the stage opted in."""
+    if stage not in settings.AI_LLM_CACHE_STAGES:
+        return get_llm()
+    return get_llm().model_copy(update={'cache': DatabaseLLMCache(stage)})
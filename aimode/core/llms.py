@@ -1,4 +1,3 @@
-from langchain_openai import AzureChatOpenAI
 import os
 from loguru import logger
 from dotenv import load_dotenv
@@ -17,8 +16,10 @@ _llm = None
 
 
 def get_llm():
+    """The shared Azure chat model, built on first use so importing this module stays cheap."""
     global _llm
     if _llm is None:
+        from langchain_openai import AzureChatOpenAI
         _llm = AzureChatOpenAI(
             azure_endpoint=OPENAI_ENDPOINT,
             openai_api_version=OPENAI_API_VERSION,
@@ -27,6 +28,3 @@ def get_llm():
             temperature=0.2,
         )
     return _llm
-
-
-llm = get_llm()
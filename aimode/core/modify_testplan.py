@@ -2,7 +2,7 @@ import json
 from typing import Dict, Any
 from langchain_core.messages import HumanMessage
 from loguru import logger
-from aimode.core.llms import llm
+from aimode.core.llm_cache import cached_llm
 from apps.core.models import AISessionStore, TestPlanSession
 from apps.core.helpers import save_version
 from aimode.core.tools import set_last_generated_testplan, get_last_generated_testplan
@@ -71,7 +71,7 @@ def modify_testplan(
     {chosen_testcases_json}
     """
 
-    llm_response = llm.invoke([HumanMessage(content=PROMPT)])
+    llm_response = cached_llm("coverage_impact").invoke([HumanMessage(content=PROMPT)])
     logger.success(llm_response)
     coverage_impact = llm_response.content.strip()
     logger.success(coverage_impact)
@@ -0,0 +1,114 @@
+"""
+Database context rendered into the AI prompts: core tables and their columns,
+active projects, modules per project, module names and priorities.
+
+The context is built on first use and cached per process. At most every
+``AI_PROMPT_CONTEXT_TTL_SECONDS`` a cheap version query (a hash of the core
+schema from ``pg_catalog`` plus row counts and last modification of projects,
+modules and testcases) is run and the context is rebuilt only if the version
+changed, so new modules show up in the prompts without a restart.
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from django.conf import settings
+from loguru import logger
+
+from aimode.core.database import db
+from aimode.core.helpers import get_active_projects, get_all_table_columns, get_modules_by_project, \
+    get_sql_table_names
+
+CONTEXT_VERSION_SQL = """
+    SELECT
+        (SELECT md5(COALESCE(string_agg(c.relname || '.' || a.attname || ':' || a.atttypid,
+                                        ',' ORDER BY c.relname, a.attnum), ''))
+         FROM pg_catalog.pg_attribute a
+         JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+         JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+         WHERE n.nspname = 'core' AND c.relkind = 'r' AND a.attnum > 0 AND NOT a.attisdropped),
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(modified)::text, '') FROM core.core_project),
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(modified)::text, '') FROM core.core_module),
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(modified)::text, '') FROM core.core_testcasemodel)
+"""
+
+
+@dataclass(frozen=True)
+class PromptContext:
+    version: tuple = ()
+    table_names: list = field(default_factory=list)
+    table_columns: Dict[str, List[str]] = field(default_factory=dict)
+    active_projects: List[str] = field(default_factory=list)
+    modules_by_project: Dict[str, List[str]] = field(default_factory=dict)
+    module_names: List[str] = field(default_factory=list)
+    module_priorities: List[str] = field(default_factory=list)
+
+    def variables(self):
+        """Values of the placeholders used by the prompts in ``aimode.core.prompts``."""
+        return {
+            "table_names": ", ".join(name[0] for name in self.table_names),
+            "table_columns": ", ".join(f"{col} = {dtype.strip('{}')}" for col, dtype in self.table_columns.items()),
+            "active_projects": self.active_projects,
+            "modules_by_project": json.dumps(self.modules_by_project, indent=2),
+            "module_names": self.module_names,
+            "module_priorities": self.module_priorities,
+        }
+
+
+class PromptContextProvider:
+    """Process wide cache of the ``PromptContext``, rebuilt when its version changes."""
+
+    def __init__(self, ttl_seconds=None):
+        self.ttl_seconds = ttl_seconds
+        self._context = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _ttl(self):
+        return settings.AI_PROMPT_CONTEXT_TTL_SECONDS if self.ttl_seconds is None else self.ttl_seconds
+
+    def _version(self, conn):
+        with conn.cursor() as cur:
+            cur.execute(CONTEXT_VERSION_SQL)
+            return tuple(cur.fetchone())
+
+    def _build(self, conn, version):
+        active_projects = get_active_projects(conn)
+        return PromptContext(
+            version=version,
+            table_names=get_sql_table_names(conn) or [],
+            table_columns=get_all_table_columns(conn),
+            active_projects=active_projects,
+            modules_by_project=get_modules_by_project(conn, active_projects),
+            module_names=db.execute("SELECT DISTINCT cm.name FROM core.core_module AS cm"),
+            module_priorities=db.execute("SELECT DISTINCT ct.priority FROM core.core_testcasemodel AS ct"),
+        )
+
+    def get(self):
+        context = self._context
+        if context is not None and time.monotonic() - self._checked < self._ttl():
+            return context
+        with self._lock:
+            if self._context is not None and time.monotonic() - self._checked < self._ttl():
+                return self._context
+            conn = db.ensure_connection_alive()
+            version = self._version(conn)
+            if self._context is None or self._context.version != version:
+                started = time.perf_counter()
+                self._context = self._build(conn, version)
+                logger.info(f"Prompt context built in {time.perf_counter() - started:.2f}s")
+            self._checked = time.monotonic()
+            return self._context
+
+    def invalidate(self):
+        with self._lock:
+            self._context = None
+
+
+prompt_context = PromptContextProvider()
+
+
+def get_prompt_context():
+    return prompt_context.get()
@@ -1,13 +1,5 @@
 from string import Template
-import json
-from typing import Dict, List
-from aimode.core.database import db, conn
-from aimode.core.helpers import (
-    get_active_projects,
-    get_modules_by_project,
-    get_sql_table_names,
-    get_all_table_columns,
-)
+from aimode.core.prompt_context import get_prompt_context
 from langchain_core.prompts import ChatPromptTemplate
 
 SQL_QUERY_GENERATION_BASE_PROMPT = """You are an expert who can create efficient SQL Query. 
@@ -32,32 +24,21 @@ SQL_QUERY_GENERATION_BASE_PROMPT = """You are an expert who can create efficient
     """
 
 
-def build_sql_generation_prompt(conn, user_query) -> str:
-    table_names = get_sql_table_names(conn)
-    table_descriptions = get_all_table_columns(conn)
+def build_sql_generation_prompt(user_query, context=None) -> str:
+    context = context or get_prompt_context()
 
     prompt = SQL_QUERY_GENERATION_BASE_PROMPT
     return Template(prompt).substitute(
-        table_names=table_names,
-        table_descriptions=table_descriptions,
+        table_names=context.table_names,
+        table_descriptions=context.table_columns,
         user_query=user_query,
     )
 
 
-table_columns = ", ".join(
-    f"{col} = {dtype.strip('{}')}" for col, dtype in get_all_table_columns(conn).items()
-)
-
-table_names = ", ".join(name[0] for name in get_sql_table_names(conn))
-active_projects = get_active_projects(conn)
-modules_by_project = get_modules_by_project(conn, active_projects)
-moduleProjects = json.dumps(modules_by_project, indent=2)
-moduleProjects_escaped = moduleProjects.replace("{", "{{").replace("}", "}}")
+# The prompts below are templates: {table_names}, {table_columns}, {active_projects},
+# {modules_by_project}, {module_names} and {module_priorities} are filled per request
+# from PromptContext.variables().
 
-module_names = db.execute("SELECT DISTINCT cm.name FROM core.core_module AS cm")
-module_priorities = db.execute(
-    "SELECT DISTINCT ct.priority FROM core.core_testcasemodel AS ct"
-)
 
 # AGENT_PROMPT_TEXT = f"""
 # You are a helpful assistant with access to these tools: `sql_query_generator`, `execute_sql_query`, `generate_testplan`, 'save_new_testplan_version', 'add_testcases', and 'delete_testcases'.
@@ -86,7 +67,7 @@ module_priorities = db.execute(
 # 8. Automatically generate a `name` and `description` for the test plan.
 # """
 
-AGENT_PROMPT_TEXT = f"""
+AGENT_PROMPT_TEXT = """
 You are a helpful assistant with access to these tools: `sql_query_generator`, `execute_sql_query`, `generate_testplan`, 'save_new_testplan_version', 'add_testcases', and 'delete_testcases'.
 1. add_testcases: Use this when the user asks to **add testcases to an existing test plan**, even when there is no list of testcase ids.
 2. delete_testcases: When the user asks to **Remove/Delete testcases from an existing test plan**, even when there is no list of testcase ids.
@@ -95,7 +76,7 @@ You have access to:
 - Table names: {table_names}
 - Table columns: {table_columns}
 - Active projects: {active_projects}
-- Modules by projects: {moduleProjects_escaped}
+- Modules by projects: {modules_by_project}
 
 *Test Plan Generation*
 When the user asks to generate a **test plan** or **test case**:
@@ -139,7 +120,7 @@ CHANGE_DETECTION_PROMPT = ChatPromptTemplate.from_messages(
     [("system", CHANGE_DETECTION_PROMPT_TEXT)]
 )
 
-SUGGESTION_LLM_PROMPT_TEXT = f"""
+SUGGESTION_LLM_PROMPT_TEXT = """
 You are a Test Plan Structuring Assistant. Structure responses using only the provided context.
 
 Context:
@@ -174,7 +155,7 @@ SUGGESTION_LLM_PROMPT = ChatPromptTemplate.from_messages(
 )
 
 
-AGENT_FILTER_PROMPT_TEXT = f"""
+AGENT_FILTER_PROMPT_TEXT = """
 You are a Testcase Filtering Agent.
 You have access to tools: `filter_testcases_tool`.
 When the user mentions any filters (module, priority, testcase_type), you MUST call the tool `filter_testcases_tool` directly.
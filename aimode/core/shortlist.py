@@ -0,0 +1,128 @@
+"""
+Token budgeted shortlist of scored testcases for the LLM selection prompt.
+
+``generate_score`` returns every functional testcase of the requested modules,
+which for large modules does not fit a prompt. The shortlist keeps the best
+scored candidates, tops them up with the best of each priority so lower
+priorities stay represented, and stops once the compact table of candidates
+reaches ``AI_SHORTLIST_TOKEN_BUDGET`` tokens.
+"""
+from collections import defaultdict, deque
+from functools import lru_cache
+
+from django.conf import settings
+from loguru import logger
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover
+    tiktoken = None
+
+CANDIDATE_COLUMNS = ("id", "name", "module", "priority", "score", "failure_rate", "defects")
+# rough size of a token when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        # encodings are downloaded on first use, which fails on offline hosts
+        logger.warning(f"Tokenizer {name} unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding(settings.AI_TOKEN_ENCODING)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text))
+
+
+def _cell(value):
+    if isinstance(value, float):
+        value = round(value, 2)
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def candidate_row(testcase):
+    return "|".join(_cell(value) for value in (
+        testcase.get("id"), testcase.get("name", ""), testcase.get("modules", ""), testcase.get("priority", ""),
+        testcase.get("testscore", 0), testcase.get("failure_rate", 0), testcase.get("defects", 0),
+    ))
+
+
+def encode_candidates(testcases):
+    """One header line and one ``|`` separated row per testcase."""
+    return "\n".join(["|".join(CANDIDATE_COLUMNS), *(candidate_row(testcase) for testcase in testcases)])
+
+
+def _by_priority(testcases):
+    strata = defaultdict(deque)
+    for testcase in testcases:
+        strata[testcase.get("priority")].append(testcase)
+    while strata:
+        for priority in list(strata):
+            yield strata[priority].popleft()
+            if not strata[priority]:
+                del strata[priority]
+
+
+def shortlist_candidates(testcases, output_counts, token_budget=None, top_factor=None):
+    """
+    Pick the candidates shown to the LLM: the ``output_counts * top_factor``
+    best scored ones first, then the rest taken round robin across priorities,
+    as long as their table stays within ``token_budget`` tokens. Returned in
+    score order.
+    """
+    token_budget = settings.AI_SHORTLIST_TOKEN_BUDGET if token_budget is None else token_budget
+    top_factor = settings.AI_SHORTLIST_TOP_FACTOR if top_factor is None else top_factor
+    ranked = sorted(testcases, key=lambda testcase: testcase.get("testscore") or 0, reverse=True)
+    top = max(output_counts, 1) * top_factor
+
+    budget = token_budget - count_tokens("|".join(CANDIDATE_COLUMNS))
+    shortlist = []
+    for testcase in [*ranked[:top], *_by_priority(ranked[top:])]:
+        cost = count_tokens(candidate_row(testcase)) + 1
+        if cost > budget:
+            break
+        budget -= cost
+        shortlist.append(testcase)
+    shortlist.sort(key=lambda testcase: testcase.get("testscore") or 0, reverse=True)
+    logger.info(f"Shortlisted {len(shortlist)} of {len(testcases)} candidates "
+                f"({token_budget - budget} of {token_budget} tokens).")
+    return shortlist
+
+
+def _candidate_id(item):
+    value = item.get("id") if isinstance(item, dict) else item
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+
+def pick_candidates(selected, by_id):
+    """
+    The candidates of ``by_id`` the LLM ``selected`` (ids or objects with an
+    ``id``), in its order and once each. Ids returned as strings or floats are
+    matched as ints; ids that match no candidate are logged and dropped.
+    """
+    picked, dropped = {}, []
+    for item in selected:
+        candidate_id = _candidate_id(item)
+        if candidate_id in by_id:
+            picked.setdefault(candidate_id, dict(by_id[candidate_id]))
+        else:
+            dropped.append(item)
+    if dropped:
+        logger.warning(f"Dropped {len(dropped)} testcase id(s) the LLM selected outside the shortlist: {dropped}")
+    return list(picked.values())
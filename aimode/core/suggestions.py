@@ -0,0 +1,52 @@
+"""
+Rule based suggestions for the final reply of a chat turn.
+
+These cover the cases ``SUGGESTION_LLM_PROMPT`` allows suggestions for, without
+a second LLM call: the user does not want the plan saved, or the agent asks
+for the module or the number of testcases of a test plan. Any other reply gets
+no suggestions.
+"""
+import re
+
+from apps.core.models import Module
+
+NO_SAVE = re.compile(r"\b(?:don'?t|do not|not|without|no need to|never)\s+(?:\w+\s+)?sav(?:e|ed|ing)\b", re.I)
+ASKS_MODULE = re.compile(
+    r"\b(?:which|what|specify|provide|choose|select|pick)\b[^?.]*\bmodules?\b|\bmodule[_ ]names?\b", re.I,
+)
+ASKS_OUTPUT_COUNTS = re.compile(r"\b(?:how many|number of|output[_ ]counts?|count of)\b", re.I)
+
+SAVE_SUGGESTIONS = ["Save the test plan"]
+OUTPUT_COUNT_SUGGESTIONS = ["2", "4", "5", "10"]
+MAX_MODULE_SUGGESTIONS = 5
+
+
+def allowed_module_names():
+    return list(Module.objects.order_by('name').values_list('name', flat=True).distinct())
+
+
+def _words(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def suggest_modules(user_prompt, module_names):
+    """Up to ``MAX_MODULE_SUGGESTIONS`` modules, those sharing a word with the prompt first."""
+    prompt_words = _words(user_prompt or "")
+    ranked = sorted(module_names, key=lambda name: (not _words(name) & prompt_words, name.lower()))
+    return ranked[:MAX_MODULE_SUGGESTIONS]
+
+
+def rule_based_suggestions(content, user_prompt, module_names=allowed_module_names):
+    """
+    Suggestions for the reply ``content`` to ``user_prompt``. ``module_names``
+    is only called when module suggestions are needed.
+    """
+    if user_prompt and NO_SAVE.search(user_prompt):
+        return list(SAVE_SUGGESTIONS)
+    if "?" not in content:
+        return []
+    if ASKS_MODULE.search(content):
+        return suggest_modules(user_prompt, module_names())
+    if ASKS_OUTPUT_COUNTS.search(content):
+        return list(OUTPUT_COUNT_SUGGESTIONS)
+    return []
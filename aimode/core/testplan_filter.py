@@ -3,13 +3,16 @@ import re
 from typing import Any, Dict, List
 from loguru import logger
 from pydantic import BaseModel
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
 
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.tools import tool
 
-from aimode.core.llms import llm
+from aimode.core.llms import get_llm
 from apps.core.ai_filter import get_filtered_data
 from aimode.core.prompts import AGENT_FILTER_PROMPT_TEXT
+from aimode.core.prompt_context import PromptContext, get_prompt_context
 
 session_states: Dict[str, Dict[str, Any]] = {}
 
@@ -68,17 +71,16 @@ def filter_testcases_tool(filters: Dict[str, List[str]]):
     return get_filtered_data(filters)
 
 
-def run_filter_flow(user_message: str, session_id: str) -> Dict[str, Any]:
-    state = get_session_state(session_id)
-
+def _start_filter_turn(state: Dict[str, Any], user_message: str, context: PromptContext) -> list:
     state["conversation_history"].append(HumanMessage(content=user_message))
 
-    messages = [
-        SystemMessage(content=AGENT_FILTER_PROMPT_TEXT),
+    return [
+        SystemMessage(content=AGENT_FILTER_PROMPT_TEXT.format(**context.variables())),
         *state["conversation_history"],
     ]
 
-    response = llm.bind_tools([filter_testcases_tool]).invoke(messages)
+
+def _read_filter_response(state: Dict[str, Any], response):
     raw_content = (getattr(response, "content", None) or str(response)).strip()
     logger.info(f"[LLM] {raw_content}")
 
@@ -90,10 +92,12 @@ def run_filter_flow(user_message: str, session_id: str) -> Dict[str, Any]:
 
     has_new_filters = any(new_filters.values())
     logger.debug(f"Has new filters: {has_new_filters}")
+    return raw_content, new_filters if has_new_filters else None, suggestions
 
-    if has_new_filters:
+
+def _finish_filter_turn(state, session_id, raw_content, new_filters, tcs_data, suggestions) -> Dict[str, Any]:
+    if new_filters:
         state["filters"] = new_filters
-        tcs_data = get_filtered_data(new_filters)
         if tcs_data:
             state["last_testplan"] = tcs_data
             filters_summary = "; ".join(
@@ -123,3 +127,31 @@ def run_filter_flow(user_message: str, session_id: str) -> Dict[str, Any]:
 
     logger.success(result)
     return result
+
+
+def run_filter_flow(user_message: str, session_id: str) -> Dict[str, Any]:
+    state = get_session_state(session_id)
+    messages = _start_filter_turn(state, user_message, get_prompt_context())
+    response = get_llm().bind_tools([filter_testcases_tool]).invoke(messages)
+    raw_content, new_filters, suggestions = _read_filter_response(state, response)
+    tcs_data = get_filtered_data(new_filters) if new_filters else None
+    return _finish_filter_turn(state, session_id, raw_content, new_filters, tcs_data, suggestions)
+
+
+def _get_filtered_data_in_worker(filters):
+    """``get_filtered_data`` for a worker thread, which has no request cycle closing its connections."""
+    close_old_connections()
+    try:
+        return get_filtered_data(filters)
+    finally:
+        close_old_connections()
+
+
+async def arun_filter_flow(user_message: str, session_id: str) -> Dict[str, Any]:
+    """Async ``run_filter_flow``: awaits the LLM and runs the ORM filter in a worker thread."""
+    state = get_session_state(session_id)
+    messages = _start_filter_turn(state, user_message, await sync_to_async(get_prompt_context)())
+    response = await get_llm().bind_tools([filter_testcases_tool]).ainvoke(messages)
+    raw_content, new_filters, suggestions = _read_filter_response(state, response)
+    tcs_data = await sync_to_async(_get_filtered_data_in_worker, thread_sensitive=False)(new_filters) if new_filters else None
+    return _finish_filter_turn(state, session_id, raw_content, new_filters, tcs_data, suggestions)
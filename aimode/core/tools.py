@@ -1,14 +1,17 @@
 from loguru import logger
 import json
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from dotenv import load_dotenv
+from langchain_core.runnables import ensure_config
 from langchain_core.tools import tool
 
-from aimode.core.database import db, conn
-from aimode.core.prompts import build_sql_generation_prompt, get_sql_table_names
+from aimode.core.database import db
+from aimode.core.prompts import build_sql_generation_prompt
 from aimode.core.intelligent_testcase_selector import intelligent_testcase_selector
-from aimode.core.llms import llm
+from aimode.core.llm_cache import cached_llm
 from apps.core.helpers import save_version
 from apps.core.models import AISessionStore, TestPlanSession
 from aimode.core.helpers import get_id_module_mapping, get_ids_by_module_names
@@ -17,8 +20,11 @@ from aimode.core.helpers import get_testcases
 
 load_dotenv()
 
-_current_session_id: Optional[str] = None
-_current_user_prompt: Optional[str] = None
+# chat session of the request being served; context variables keep concurrent
+# requests on threaded or async workers apart, and LangGraph copies the caller's
+# context into the threads and tasks that run the tools
+_current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+_current_user_prompt: ContextVar[Optional[str]] = ContextVar("current_user_prompt", default=None)
 _last_generated_testplan: Optional[dict] = None
 _last_generated_testplans: dict[str, dict] = {}
 
@@ -50,26 +56,40 @@ def get_last_generated_testplan(session_id: str) -> Optional[list]:
     plan = (
         TestPlanSession.objects.filter(session=session_obj)
         .order_by("-version")
-        .only("testcase_data")
+        .select_related("testcase_blob")
+        .only("testcase_data", "testcase_blob")
         .first()
     )
-    return {"data": {"testcases": plan.testcase_data or []}}
+    return {"data": {"testcases": plan.get_testcase_data() or []}}
 
 
-def set_current_session_id(session_id: str, user_prompt: Optional[str] = None):
-    global _current_session_id, _current_user_prompt
-    _current_session_id = session_id
-    _current_user_prompt = user_prompt
+@contextmanager
+def session_context(session_id: str, user_prompt: Optional[str] = None):
+    """
+    Bind the chat session and prompt for the tools run inside the block. This is
+    the only way to set them, so the binding never outlives the request.
+    """
+    session_token = _current_session_id.set(session_id)
+    prompt_token = _current_user_prompt.set(user_prompt)
     logger.info(f"[tools.py] session_id set: {session_id}")
-    logger.info(f"[tools.py] user_prompt set: {user_prompt[:100]}")
+    logger.info(f"[tools.py] user_prompt set: {(user_prompt or '')[:100]}")
+    try:
+        yield
+    finally:
+        _current_session_id.reset(session_token)
+        _current_user_prompt.reset(prompt_token)
 
 
 def get_current_session_id() -> Optional[str]:
-    return _current_session_id
+    session_id = _current_session_id.get()
+    if session_id is None:
+        # graph invoked without a session context: the thread id is the session id
+        session_id = ensure_config().get("configurable", {}).get("thread_id")
+    return session_id
 
 
 def get_current_user_prompt() -> Optional[str]:
-    return _current_user_prompt
+    return _current_user_prompt.get()
 
 
 class SQLQueryGeneratorInput(BaseModel):
@@ -91,12 +111,9 @@ def save_new_testplan_version():
         if not testcases:
             return {"status": 400, "message": "No testcases found to save."}
 
-        next_version = TestPlanSession.objects.filter(session=session_obj).count() + 1
-
         save_data = {
             "session": session_id,
             "context": testplan_data["data"].get("description", "AI-generated context"),
-            "version": str(next_version),
             "name": testplan_data["data"].get("name", "Test Plan"),
             "description": testplan_data["data"].get("description", ""),
             "modules": testplan_data["data"].get("modules", []),
@@ -104,7 +121,11 @@ def save_new_testplan_version():
             "testcase_data": testcases,
         }
 
-        save_version(save_data)
+        instance = save_version(save_data)
+        if not instance:
+            return {"status": 400, "message": "Session not found."}
+        next_version = instance.version
+        save_data["version"] = next_version
         logger.success(
             f"Saved test plan version {next_version} for session {session_id}"
         )
@@ -128,10 +149,8 @@ def save_new_testplan_version():
 def sql_query_generator(user_query) -> str:
     try:
         logger.info(f"SQL Query Requested: {user_query}")
-        pg_conn = db.ensure_connection_alive()
-        tables = get_sql_table_names(pg_conn)
-        sql_prompt = build_sql_generation_prompt(conn=pg_conn, user_query=user_query)
-        response = llm.invoke(sql_prompt)
+        sql_prompt = build_sql_generation_prompt(user_query=user_query)
+        response = cached_llm("sql_query").invoke(sql_prompt)
         sql_query = response.content
         logger.info(f"SQL Query Generated: {sql_query}")
         return sql_query
@@ -231,13 +250,9 @@ def generate_testplan(
                 logger.warning("No testcases generated — skipping version save.")
                 should_save = False
             else:
-                next_version = (
-                    TestPlanSession.objects.filter(session=session_obj).count() + 1
-                )
                 save_data = {
                     "session": session_id,
                     "context": user_prompt or "No context provided",
-                    "version": str(next_version),
                     "name": name or "Test Plan",
                     "description": description or "Auto-generated test plan",
                     "modules": module_names,
@@ -245,7 +260,7 @@ def generate_testplan(
                     "testcase_data": testcases,
                     "version_info": version_info,
                 }
-                save_version(save_data)
+                next_version = save_version(save_data).version
                 tcs_data["data"]["version_saved"] = next_version
                 tcs_data["data"][
                     "version_message"
@@ -0,0 +1,58 @@
+"""
+Lazy loading of the AI chat stack.
+
+Importing ``aimode.chatbot`` builds the Azure client, opens the aimode database
+connection and compiles the LangGraph graph, so the API views only load it on
+the first AI request (``aload``). Servers can pay that cost at boot instead by
+calling ``warm_up``, which ``sentriQA.asgi`` and ``sentriQA.wsgi`` do when
+``AI_WARM_UP`` is set.
+"""
+import importlib
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from loguru import logger
+
+AI_MODULES = ("aimode.chatbot", "aimode.core.testplan_filter")
+
+_modules = {}
+_lock = threading.Lock()
+
+
+def load(name="aimode.chatbot"):
+    """Import one of ``AI_MODULES`` on first use and return it."""
+    module = _modules.get(name)
+    if module is None:
+        with _lock:
+            if name not in _modules:
+                started = time.perf_counter()
+                _modules[name] = importlib.import_module(name)
+                logger.info(f"Loaded {name} in {time.perf_counter() - started:.2f}s")
+            module = _modules[name]
+    return module
+
+
+async def aload(name="aimode.chatbot"):
+    """Async ``load``; the first import runs in a worker thread so the event loop is not blocked."""
+    module = _modules.get(name)
+    if module is None:
+        module = await sync_to_async(load, thread_sensitive=False)(name)
+    return module
+
+
+def warm_up():
+    """
+    Load the AI chat stack and build the prompt context ahead of the first
+    request. Failures are logged, not raised, so a server still boots while the
+    database or the LLM is unavailable; the first AI request retries.
+    """
+    try:
+        for name in AI_MODULES:
+            load(name)
+        from aimode.core.prompt_context import get_prompt_context
+        get_prompt_context()
+    except Exception as e:
+        logger.error(f"AI warm-up failed, loading on first request instead: {e}")
+        return False
+    return True
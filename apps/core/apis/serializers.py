@@ -1,11 +1,17 @@
 import json
+from decimal import Decimal
 
-from openai.types.fine_tuning.jobs.fine_tuning_job_checkpoint import Metrics
+from django.db import router, transaction
+from django.utils import timezone
+from django.db.models import Q
 from rest_framework import serializers
 from pathlib import Path
 from apps.core.models import TestCaseModel, Module, TestCaseMetric, TestPlan, TestScore, HistoryTestPlan, \
-    TestPlanSession, AISessionStore, TestCaseScoreModel
-from apps.core.helpers import get_priority_repr, format_datetime
+    TestPlanSession, AISessionStore, TestCaseScoreModel, SessionVersionTestcase
+from apps.core.helpers import get_priority_repr, format_datetime, get_plan_stats_repr, store_version_testcases, \
+    allocate_version, set_current_version
+from apps.core.history import get_plan_fields, next_version_number, record_plan_history, reconstruct_plan_version
+from apps.core.blobs import store_blob
 
 
 class ModuleSerializer(serializers.ModelSerializer):
@@ -263,6 +269,18 @@ class FileUploadSerializer(serializers.Serializer):
             raise serializers.ValidationError("Only .csv, .xlsx, .xls files are allowed")
         return file
 
+class ExecutionResultsSerializer(serializers.Serializer):
+
+    results = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=50000)
+    recompute_scores = serializers.BooleanField(default=True)
+
+
+class ClonePlanSerializer(serializers.Serializer):
+
+    name = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    refresh_scores = serializers.BooleanField(default=False)
+
+
 class AITestPlanSerializer(serializers.Serializer):
     user_msg = serializers.CharField(max_length=500)   # new field
     session_id = serializers.CharField(max_length=200, required=False, allow_blank=True)
@@ -278,8 +296,8 @@ class AITestPlanSerializer(serializers.Serializer):
 class SessionSerializer(serializers.Serializer):
 
     id = serializers.IntegerField()
-    version = serializers.CharField()
-    status = serializers.CharField()
+    version = serializers.IntegerField()
+    status = serializers.CharField(source='version_status')
     created = serializers.SerializerMethodField(source='created')
 
     def get_created(self, instance):
@@ -289,7 +307,7 @@ class TestplanSessionSerializer(serializers.Serializer):
 
     session = serializers.CharField(max_length=200)
     context = serializers.CharField()
-    version = serializers.CharField(max_length=200)
+    version = serializers.IntegerField(read_only=True)
     version_info = serializers.CharField()
     name = serializers.CharField()
     description = serializers.CharField()
@@ -298,30 +316,50 @@ class TestplanSessionSerializer(serializers.Serializer):
     testcase_data = serializers.JSONField(write_only=True)
     status = serializers.CharField(max_length=200, required=False)
 
-    def get_prev_version(self, session):
-        instance = TestPlanSession.objects.filter(session=session).order_by('-created').first()
-        if instance:
-            setattr(instance, 'status', 'draft')
-            instance.save()
-        return None
-
     def create(self, validated_data):
         session = validated_data.pop('session')
         modules = validated_data.pop('modules')
         get_modules = Module.objects.filter(name__in=modules)
         get_session = AISessionStore.objects.get(session_id=session)
         if get_session:
-            self.get_prev_version(get_session)
-            instance = TestPlanSession.objects.create(session=get_session, status='saved', **validated_data)
-            instance.modules.set(get_modules)
+            with transaction.atomic(using=router.db_for_write(TestPlanSession)):
+                testcase_data = validated_data.pop('testcase_data', None)
+                instance = TestPlanSession.objects.create(
+                    session=get_session, status='saved', version=allocate_version(get_session),
+                    testcase_blob_id=store_blob(testcase_data), **validated_data
+                )
+                instance.modules.set(get_modules)
+                store_version_testcases(instance, testcase_data)
+                set_current_version(instance)
             return instance
         return False
 
     def to_representation(self, instance):
         response = super().to_representation(instance)
-        response['testcases'] = instance.testcase_data
+        response['status'] = getattr(instance, 'version_status', instance.status)
+        if self.context.get('include_testcases', True):
+            response['testcases'] = instance.get_testcase_data()
         return response
 
+
+class SessionVersionTestcaseSerializer(serializers.ModelSerializer):
+    """Normalised session version testcase in the ``testcase_data`` entry format."""
+
+    class Meta:
+        model = SessionVersionTestcase
+        fields = ('id', 'position', 'testcase_id', 'name', 'module', 'priority', 'mode', 'testscore')
+
+    def to_representation(self, instance):
+        return {
+            'id': instance.testcase_id,
+            'position': instance.position,
+            'testcase': instance.name,
+            'modules': instance.module,
+            'priority': instance.priority,
+            'mode': instance.mode,
+            'testscore': float(instance.testscore) if instance.testscore else 0,
+        }
+
 class CreateTestPlanSerializer(serializers.Serializer):
 
     name = serializers.CharField(max_length=200, allow_blank=True, required=False)
@@ -331,40 +369,58 @@ class CreateTestPlanSerializer(serializers.Serializer):
     modes = serializers.CharField(max_length=200, required=False)
     testcases = serializers.ListSerializer(child=serializers.DictField())
 
+    @staticmethod
+    def get_testcase_ref(tc):
+        return tc.get('testcase') or tc.get('name') or tc.get('testcase_id') or tc.get('id')
+
+    def resolve_testcases(self, testcases):
+        """Resolve every testcase name or id of the payload with a single ``IN`` query."""
+        refs = [self.get_testcase_ref(tc) for tc in testcases]
+        ids = {int(ref) for ref in refs if isinstance(ref, int) or str(ref).isdigit()}
+        names = {str(ref) for ref in refs if ref is not None}
+        queryset = TestCaseModel.objects.filter(Q(name__in=names) | Q(id__in=ids)).only('id', 'name')
+        by_name = {obj.name: obj for obj in queryset}
+        by_id = {obj.id: obj for obj in by_name.values()}
+        resolved = {}
+        for ref in refs:
+            if ref is None:
+                continue
+            obj = by_name.get(str(ref))
+            if obj is None and (isinstance(ref, int) or str(ref).isdigit()):
+                obj = by_id.get(int(ref))
+            if obj is not None:
+                resolved[ref] = obj
+        return resolved
+
     def create(self, validated_data):
         module = validated_data.pop('modules', [])
-        testcase = validated_data.pop('testcases', [])
-        get_modules = Module.objects.filter(name__in=module)
-        testplan = TestPlan.objects.create(**validated_data)
-        testplan.modules.set(get_modules)
-        try:
-            for tc in testcase:
-                testcase_name = tc.get('testcase')
-                testcase_score = tc.get('testscore', 0)
-                mode=tc.get('mode')
-                print('testcase', testcase_name)
-                if testcase_name:
-                    try:
-                        testcase_obj = TestCaseModel.objects.get(name=testcase_name)
-                        print('testcase_obj', testcase_obj)
-                        TestScore.objects.create(
-                            testplan=testplan,
-                            testcases=testcase_obj,
-                            testscore=testcase_score,
-                            reasoning=tc.get('reasoning', "None"),
-                            mode=mode
-                        )
-                        print('testing')
-                    except TestCaseModel.DoesNotExist:
-                        print(f"TestCase with name '{testcase_name}' does not exist")
-                        continue
-                    except Exception as inner_e:
-                        print(f"Error creating TestScore for {testcase_name}: {str(inner_e)}")
-                        continue
-        except Exception as e:
-            print(f"Error processing testcases: {str(e)}")
-        testplan.save()
-        return testplan.id
+        testcases = validated_data.pop('testcases', [])
+        resolved = self.resolve_testcases(testcases)
+        self.unknown_testcases = []
+        scores = []
+        seen = set()
+        with transaction.atomic(using=router.db_for_write(TestPlan)):
+            testplan = TestPlan.objects.create(**validated_data)
+            testplan.modules.set(Module.objects.filter(name__in=module))
+            for tc in testcases:
+                ref = self.get_testcase_ref(tc)
+                testcase_obj = resolved.get(ref)
+                if testcase_obj is None:
+                    if ref is not None:
+                        self.unknown_testcases.append(ref)
+                    continue
+                if testcase_obj.id in seen:
+                    continue
+                seen.add(testcase_obj.id)
+                scores.append(TestScore(
+                    testplan=testplan,
+                    testcases=testcase_obj,
+                    testscore=tc.get('testscore', 0),
+                    reasoning=tc.get('reasoning', "None"),
+                    mode=tc.get('mode'),
+                ))
+            TestScore.objects.bulk_create(scores)
+        return testplan
 
 
 class TestPlanSerializer(serializers.Serializer):
@@ -496,70 +552,77 @@ class PlanSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
     def get_version_name(self, instance):
-        latest_history = HistoryTestPlan.objects.filter(testplan=instance.id).order_by('-created').first()
-        if latest_history:
-            return 'v3'
-            # get_version = latest_history.version.split(' ')[-1]
-            # number = int(get_version.replace('v', '')) + 1 if latest_history else 1
-            # if latest_history:
-            #     return number
-        return 'v1'
-
-    def add_histroy(self, instance, version=None, testcases=None, other_changes=None):
-        get_instance = instance if instance else None
-        get_version_name = self.get_version_name(instance)
-        _data = []
-        if testcases:
-            for tc in testcases:
-                testcase_obj = tc.get('testcases')
-                testplan_obj = tc.get('testplan')
-                testscore = tc.get('testscore', 0)
-                testcases_list = {
-                    "testcases_id": testcase_obj.id if testcase_obj else None,
-                    "testcases_name": str(testcase_obj) if testcase_obj else "",
-                    "testplan_id": testplan_obj.id if testplan_obj else None,
-                    "testplan_name": str(testplan_obj) if testplan_obj else "",
-                    "mode": tc.get('mode', 'ai'),
-                    "testscore": float(testscore) if testscore else 0.0
-                }
-                _data.append(testcases_list)
-            other_changes = other_changes if other_changes else {}
-            other_changes['testcases'] = _data
-        if get_instance:
-            HistoryTestPlan.objects.create(
-                testplan=get_instance,
-                version=get_instance.name + " - " + str(get_version_name),
-                other_changes=other_changes
-            )
+        return f'v{next_version_number(instance)}'
+
+    def add_histroy(self, instance, previous_fields=None, diff=None):
+        if instance:
+            record_plan_history(instance, previous_fields or {}, diff)
         return True
 
+    def apply_testcase_diff(self, instance, testcases_data):
+        """
+        Bring the plan's TestScore rows in line with ``testcases_data`` by
+        deleting, creating and updating only the rows that differ. Duplicate
+        rows of a testcase (left by the legacy create path) are collapsed into
+        the oldest one; the others are deleted and returned in ``removed``.
+        """
+        existing, duplicates = {}, []
+        for score in TestScore.objects.filter(testplan=instance).only(
+                'id', 'testcases_id', 'testscore', 'mode', 'reasoning').order_by('id'):
+            if score.testcases_id in existing:
+                duplicates.append(score)
+            else:
+                existing[score.testcases_id] = score
+        incoming = {}
+        for testcase_data in testcases_data:
+            testcase = testcase_data.get('testcases')
+            if testcase:
+                incoming[testcase.id] = testcase_data
+        removed = [existing[testcase_id] for testcase_id in existing.keys() - incoming.keys()] + duplicates
+        added = [
+            TestScore(
+                testplan=instance,
+                testcases=incoming[testcase_id]['testcases'],
+                testscore=incoming[testcase_id].get('testscore', 0),
+                mode=incoming[testcase_id].get('mode', 'ai'),
+                reasoning=incoming[testcase_id].get('reasoning'),
+            )
+            for testcase_id in incoming.keys() - existing.keys()
+        ]
+        changed = []
+        for testcase_id in incoming.keys() & existing.keys():
+            score, testcase_data = existing[testcase_id], incoming[testcase_id]
+            new_values = {
+                'testscore': Decimal(str(testcase_data.get('testscore', 0) or 0)),
+                'mode': testcase_data.get('mode', 'ai'),
+            }
+            if 'reasoning' in testcase_data:
+                new_values['reasoning'] = testcase_data['reasoning']
+            if any(getattr(score, field) != value for field, value in new_values.items()):
+                for field, value in new_values.items():
+                    setattr(score, field, value)
+                score.modified = timezone.now()
+                changed.append(score)
+        if removed:
+            TestScore.objects.filter(id__in=[score.id for score in removed]).delete()
+        TestScore.objects.bulk_create(added)
+        TestScore.objects.bulk_update(changed, ['testscore', 'mode', 'reasoning', 'modified'])
+        return {'added': added, 'removed': removed, 'changed': changed}
+
     def update(self, instance, validated_data):
         testcases_data = validated_data.pop('scores', [])
         modules = validated_data.pop('modules', [])
-        if modules:
-            get_modules = Module.objects.filter(name__in=modules)
-            instance.modules.set(get_modules)
-        _temp = validated_data.copy()
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        if testcases_data:
-            instance.testcases.clear()
-            for testcase_data in testcases_data:
-                testcase = testcase_data.get('testcases')
-                score = testcase_data.get('testscore', 0)
-                mode = testcase_data.get('mode', 'ai')
-                if testcase:
-                    instance.testcases.add(testcase)
-                    TestScore.objects.update_or_create(
-                        testplan=instance,
-                        testcases=testcase,
-                        mode=mode,
-                        defaults={'testscore': score}
-                    )
-        instance.save()
-        _temp['modules'] = modules
-        self.add_histroy(instance, testcases=testcases_data, other_changes=_temp)
-        return super().update(instance, validated_data)
+        diff = None
+        with transaction.atomic(using=router.db_for_write(TestPlan)):
+            # the row lock serialises concurrent edits so history versions stay sequential
+            previous_fields = get_plan_fields(TestPlan.objects.select_for_update().get(pk=instance.pk))
+            if modules:
+                instance.modules.set(Module.objects.filter(name__in=modules))
+            if testcases_data:
+                diff = self.apply_testcase_diff(instance, testcases_data)
+            instance = super().update(instance, validated_data)
+            self.add_histroy(instance, previous_fields=previous_fields, diff=diff)
+        return instance
 
     def delete(self, instance):
         instance.is_active = False
@@ -577,6 +640,56 @@ class PlanSerializer(serializers.ModelSerializer):
         return represent
 
 
+class PlanHeaderSerializer(serializers.ModelSerializer):
+    """Plan metadata with aggregate testcase counts; expects ``annotate_plan_stats`` annotations."""
+
+    class Meta:
+        model = TestPlan
+        fields = ('id', 'name', 'description', 'priority', 'output_counts', 'testcase_type', 'modes',
+                  'is_active', 'created', 'modified')
+
+    def to_representation(self, instance):
+        represent = super().to_representation(instance)
+        represent['modules'] = instance.module_names or []
+        represent['modes'] = instance.modes.upper() if instance.modes else ''
+        represent['created'] = format_datetime(instance.created)
+        represent['modified'] = format_datetime(instance.modified)
+        represent.update(get_plan_stats_repr(instance))
+        represent['module_breakdown'] = [
+            {'module': row['module'], 'count': row['count'],
+             'average_score': round(float(row['average_score']), 4) if row['average_score'] else 0}
+            for row in self.context.get('module_breakdown', [])
+        ]
+        return represent
+
+
+class PlanTestcaseSerializer(serializers.Serializer):
+    """Flat projection of a plan's ``TestScore`` rows built from ``values()`` dicts."""
+
+    id = serializers.IntegerField()
+    testcase_id = serializers.IntegerField()
+    name = serializers.CharField()
+    modules = serializers.CharField(allow_null=True)
+    priority = serializers.CharField(allow_null=True)
+    testcase_type = serializers.CharField(allow_null=True)
+    mode = serializers.CharField(allow_null=True)
+    testscore = serializers.FloatField(allow_null=True)
+    reason = serializers.CharField(allow_null=True, source='reasoning')
+
+    def to_representation(self, instance):
+        return {
+            'id': instance['id'],
+            'testcase_id': instance['testcase_id'],
+            'name': instance['name'],
+            'modules': instance['modules'],
+            'priority': get_priority_repr(instance['priority']) if instance['priority'] else None,
+            'testcase_type': instance['testcase_type'],
+            'mode': instance['mode'].upper() if instance['mode'] else None,
+            'testscore': float(instance['testscore']) if instance['testscore'] else 0,
+            'reason': instance['reasoning'] or None,
+        }
+
+
 class PlanListSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -588,6 +701,9 @@ class PlanListSerializer(serializers.ModelSerializer):
         represent['user'] = 'AI Generated'
         represent['created'] = format_datetime(instance.created)
         represent['modified'] = format_datetime(instance.modified)
+        if hasattr(instance, 'testcase_total'):
+            represent['modules'] = instance.module_names or []
+            represent.update(get_plan_stats_repr(instance))
         return represent
 
 
@@ -667,7 +783,7 @@ class HistoryPlanDetailsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = HistoryTestPlan
-        exclude = ('created', 'modified',)
+        exclude = ('created', 'modified', 'changes_blob')
 
     def get_other_changes(self, obj):
         try:
@@ -676,22 +792,24 @@ class HistoryPlanDetailsSerializer(serializers.ModelSerializer):
             return {}
         
     def to_representation(self, instance):
-        return super().to_representation(instance)
+        represent = super().to_representation(instance)
+        represent['delta'] = instance.get_other_changes()
+        represent['other_changes'] = reconstruct_plan_version(instance.testplan_id, instance.version_number)
+        return represent
 
 
 class PlanHistorySerializer(serializers.ModelSerializer):
 
-    modules = serializers.ListSerializer(
-        child=serializers.CharField(),
-        required=False,
-        read_only=True,
-        source='other_changes.modules'
-    )
+    modules = serializers.SerializerMethodField()
 
     class Meta:
         model = HistoryTestPlan
         fields = ('id', 'version', 'modules')
 
+    def get_modules(self, obj):
+        changes = obj.get_other_changes()
+        return changes.get('modules', []) if isinstance(changes, dict) else []
+
 
     def get_other_changes(self, obj):
         try:
@@ -8,6 +8,7 @@ urlpatterns = [
     path('testcase', views.TestCaseView.as_view(), name='testcase'),
     path('testcase/<int:pk>', views.TestCaseDetail.as_view(), name='testcase-detail'),
     path('search/testcase', views.SearchTestcaseModel.as_view(), name='search-testcase'),
+    path('results/ingest', views.ExecutionResultsView.as_view(), name='results-ingest'),
 
     # module API
     path('module/', views.ModuleAPIView.as_view(), name='module-list'),
@@ -24,25 +25,39 @@ urlpatterns = [
 
     # Version APIs
     path('version/<str:token>', views.GetTestVersionAPI.as_view(), name='version'),
-    path('version/<str:token>/<str:version>', views.VersionDetailAPI.as_view(), name='version'),
+    path('version/<str:token>/<int:version>', views.VersionDetailAPI.as_view(), name='version'),
+    path('version/<str:token>/<int:version>/testcases', views.SessionVersionTestcasesView.as_view(),
+         name='version-testcases'),
 
     # Testplan APIs
     path('test-plan', views.TestPlanningView.as_view(), name='test-plan'),
     path('create-testplan', views.CreateTestPlanView.as_view(), name='create-testplan'),
     path('plan', views.TestPlanView.as_view(), name='get-plans'),
     path('plan/<int:id>', views.PlanDetailsView.as_view(), name='plan-detail'),
+    path('plan/<int:id>/header', views.PlanHeaderView.as_view(), name='plan-header'),
+    path('plan/<int:id>/testcases', views.PlanTestcasesView.as_view(), name='plan-testcases'),
+    path('plan/<int:id>/clone', views.ClonePlanView.as_view(), name='plan-clone'),
+    path('plan/<int:id>/restore', views.RestorePlanView.as_view(), name='plan-restore'),
 
     # AI TestPlanCreate API
     path('ai-test-plan', views.AITestPlanningView.as_view(), name='ai-test-plan'),
-    path('ai-filter-test', views.AITestCaseFilterChat.as_view()),
+    path('ai-test-plan/stream', views.AITestPlanningStreamView.as_view(), name='ai-test-plan-stream'),
+    path('ai-filter-test', views.AITestCaseFilterChat.as_view(), name='ai-filter-test'),
 
     # Utils APIs
     path('file-upload', views.FileUploadView.as_view(), name='file-upload'),
     path('test-scores', views.TestScores.as_view(), name='test-scores'),
     path('get-excel', views.TestScoreExcel.as_view(), name='get-excel'),
+    path('export/<str:dataset>/<str:file_format>', views.ExportView.as_view(), name='export'),
     path('convert', views.ConvertAPIView.as_view(), name='convert'),
     path('testing', views.GenerateScoreView.as_view(), name='test'),
     path('plan-history/<int:id>', views.TestPlanHistoryView.as_view(), name='plan-history'),
     path('plan-history/<int:id>/<int:history_id>', views.HistoryPlanDetailsView.as_view(), name='plan-history'),
+    path('plan-history/<int:id>/version/<int:version>', views.PlanVersionView.as_view(), name='plan-version'),
     path('version/metrics/graph/<slug:session_id>/<int:version>', views.GetModuleGraph.as_view(), name='test-graph'),
+    path('diff/plans/<int:left>/<int:right>', views.PlanDiffView.as_view(), name='plan-diff'),
+    path('diff/plan-history/<int:id>/<int:left>/<int:right>', views.PlanVersionDiffView.as_view(),
+         name='plan-version-diff'),
+    path('diff/sessions/<slug:session_id>/<int:left>/<int:right>', views.SessionVersionDiffView.as_view(),
+         name='session-version-diff'),
 ]
\ No newline at end of file
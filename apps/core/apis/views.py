@@ -1,5 +1,6 @@
 import openpyxl
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework import generics
 from rest_framework.generics import get_object_or_404
 from rest_framework.validators import qs_filter
@@ -7,33 +8,40 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from apps.core.models import TestCaseMetric, TestCaseModel, Module, TestPlan, PriorityChoice, HistoryTestPlan, Project, \
-    TestPlanSession, TestScore
+    TestPlanSession, TestScore, SessionVersionTestcase
 from apps.core.utils import TestcaseImportExcel
 from apps.core.apis.serializers import TestcaseListSerializer, FileUploadSerializer, \
     TestMetrixSerializer, ModuleSerializer, TestPlanSerializer, TestScoreSerializer, \
     TestCaseNameSerializer, CreateTestPlanSerializer, TestPlanningSerializer, PlanSerializer, TestCaseOptionSerializer, \
     TestCaseScoreSerializer, PlanHistorySerializer, MetrixSerializer, HistoryPlanDetailsSerializer, \
     TestplanSessionSerializer, SessionSerializer, TestCaseSerializer, SearchTestCaseSerializer, PlanListSerializer, \
-    TestcaseSearchSerializer
+    TestcaseSearchSerializer, ExecutionResultsSerializer, PlanHeaderSerializer, PlanTestcaseSerializer, \
+    ClonePlanSerializer, SessionVersionTestcaseSerializer
 from apps.core.utils import QueryHelpers
 from django.db.models import Prefetch
-from django.db.models import Max, IntegerField
+from django.db.models import Max, IntegerField, F
 from drf_spectacular.utils import extend_schema
-from apps.core.pagination import CustomPagination, TestCasePagination
+from apps.core.pagination import CustomPagination, TestCasePagination, PlanTestcasePagination, \
+    SessionTestcasePagination
 from apps.core.apis.serializers import AITestPlanSerializer
 from sentriQA.helpers import custom_generics as c
 from django.db.models import Q
-from aimode.chatbot import get_llm_response
 from django.db.models.functions import Coalesce
-from apps.core.helpers import generate_score, generate_session_id
+from apps.core.helpers import generate_score, generate_session_id, annotate_plan_stats, annotate_version_status
 from django.contrib.postgres.search import SearchVector, SearchQuery
-from sentriQA.helpers.renders import ResponseInfo
+from sentriQA.helpers.renders import ResponseInfo, sse_message
 from apps.core.filters import TestcaseFilter
 from apps.core.helpers import generate_score
 from apps.core.helpers import generate_session_id
-from aimode.core.testplan_filter import run_filter_flow
+from aimode.loader import aload
 from django.db.models import Avg, Count
 from apps.core.ai_filter import get_filtered_data
+from apps.core.exports import Exporter, ExportError
+from apps.core.ingest import ingest_results
+from apps.core.history import reconstruct_plan_version
+from apps.core.archive import ArchiveError, ArchiveSchemaError, restore_plans
+from apps.core.clone import CloneError, clone_plan
+from apps.core.diff import DiffError, diff_plans, diff_plan_versions, diff_session_versions
 
 
 @extend_schema(tags=["Modules List API"])
@@ -150,6 +158,22 @@ class FileUploadView(generics.GenericAPIView):
         return ResponseInfo.error_response(error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
 
 
+@extend_schema(tags=["CI Results Ingestion API"])
+class ExecutionResultsView(generics.GenericAPIView):
+
+    serializer_class = ExecutionResultsSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if serializer.is_valid():
+            summary = ingest_results(
+                serializer.validated_data['results'],
+                recompute=serializer.validated_data['recompute_scores'],
+            )
+            return ResponseInfo.success_response(data=summary, message="Results Ingested Successfully")
+        return ResponseInfo.error_response(error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+
+
 @extend_schema(tags=["Testcase Plan Creation API"])
 class TestPlanningView(generics.GenericAPIView):
 
@@ -178,8 +202,9 @@ class GetTestVersionAPI(c.CustomGenericAPIView):
     def get_queryset(self):
         queryset = []
         if self.kwargs.get('token') != 'null':
-            queryset = (TestPlanSession.objects.only('id', 'version', 'status', 'created').
-                        filter(session__session_id=self.kwargs.get('token'))).order_by('-version')
+            queryset = annotate_version_status(
+                TestPlanSession.objects.only('id', 'version', 'created').filter(session__session_id=self.kwargs.get('token'))
+            ).order_by('-version')
         return queryset
 
     def get(self, request, *args, **kwargs):
@@ -196,13 +221,19 @@ class VersionDetailAPI(generics.GenericAPIView):
     serializer_class = TestplanSessionSerializer
 
     def get_queryset(self):
-        queryset = TestPlanSession.objects.filter(session__session_id=self.kwargs.get('token'),
-                                                  version=self.kwargs.get('version'))
+        queryset = annotate_version_status(TestPlanSession.objects.filter(session__session_id=self.kwargs.get('token'),
+                                                                          version=self.kwargs.get('version')))
         return queryset
 
     def get(self, requests, *args, **kwargs):
         try:
-            response = self.get_serializer(self.get_queryset(), many=True)
+            queryset = self.get_queryset()
+            include_testcases = requests.query_params.get('include_testcases', 'true').lower() != 'false'
+            if include_testcases:
+                queryset = queryset.select_related('testcase_blob')
+            else:
+                queryset = queryset.defer('testcase_data')
+            response = self.get_serializer(queryset, many=True, context={'include_testcases': include_testcases})
             if response.data:
                 if isinstance(response.data, list):
                     if len(response.data) == 1:
@@ -221,11 +252,15 @@ class CreateTestPlanView(generics.GenericAPIView):
         try:
             serializer = CreateTestPlanSerializer(data=request.data)
             if serializer.is_valid():
-                data = serializer.save()
-                if data:
-                    queryset = TestPlan.objects.get(id=data)
-                    serializer = PlanSerializer(queryset)
-                    return ResponseInfo.success_response(data=serializer.data, message="Test Plan Creation Successful")
+                testplan = serializer.save()
+                if testplan:
+                    queryset = TestPlan.objects.prefetch_related(
+                        Prefetch('scores', queryset=TestScore.objects.select_related(
+                            'testcases', 'testplan', 'testcases__module')), 'modules'
+                    ).get(id=testplan.id)
+                    data = PlanSerializer(queryset).data
+                    data['unknown_testcases'] = serializer.unknown_testcases
+                    return ResponseInfo.success_response(data=data, message="Test Plan Creation Successful")
                 return ResponseInfo.error_response(error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
             return ResponseInfo.error_response(error={f"error: {serializer.errors}"}, status_code=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
@@ -316,10 +351,10 @@ class TestcaseScore(generics.GenericAPIView):
 
 
 @extend_schema(tags=["AI Testcase Plan Creation API"])
-class AITestPlanningView(generics.GenericAPIView):
+class AITestPlanningView(c.AsyncAPIView):
     serializer_class = AITestPlanSerializer
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user_msg = serializer.validated_data['user_msg']
@@ -328,17 +363,51 @@ class AITestPlanningView(generics.GenericAPIView):
             tcs_list = serializer.validated_data.get('tcs_list', None)
             print('session_id:', session)
             if not session or session == "":
-                session = generate_session_id()
-            response_dict = get_llm_response(user_msg, session, add_data, tcs_list)
+                session = await sync_to_async(generate_session_id)()
+            chatbot = await aload('aimode.chatbot')
+            response_dict = await chatbot.aget_llm_response(user_msg, session, add_data, tcs_list)
             response_dict['session_id'] = session
             if response_dict.get('tcs_data', None):
                 response_dict['chat_generated'] = True
-            return Response(response_dict, status=status.HTTP_200_OK)
+            return self.json_response(response_dict)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self.json_response(serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
     
 
 
+@extend_schema(tags=["AI Testcase Plan Creation API"])
+class AITestPlanningStreamView(c.AsyncAPIView):
+    """Streaming ``AITestPlanningView``: progress and reply tokens as server-sent events."""
+
+    serializer_class = AITestPlanSerializer
+
+    async def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return self.json_response(serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+        session = serializer.validated_data.get('session_id')
+        if not session:
+            session = await sync_to_async(generate_session_id)()
+        chatbot = await aload('aimode.chatbot')
+        events = chatbot.astream_llm_response(
+            serializer.validated_data['user_msg'], session,
+            serializer.validated_data.get('add_data', None), serializer.validated_data.get('tcs_list', None),
+        )
+        response = StreamingHttpResponse(self.stream(events, session), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, events, session):
+        yield sse_message('session', {'session_id': session})
+        async for event, data in events:
+            if event == 'result':
+                data['session_id'] = session
+                if data.get('tcs_data', None):
+                    data['chat_generated'] = True
+            yield sse_message(event, data)
+
+
 # @extend_schema(tags=["Testcase Plan List API"])
 # class TestPlanView(APIView):
 
@@ -411,7 +480,7 @@ class GetScoreViewAPIView(generics.GenericAPIView):
 class TestPlanView(generics.ListAPIView):
 
     serializer_class = PlanListSerializer
-    queryset = TestPlan.objects.filter(is_active=True).order_by('-created').all()
+    queryset = annotate_plan_stats(TestPlan.objects.filter(is_active=True)).order_by('-created')
     pagination_class = CustomPagination
 
     # def get(self, request, *args, **kwargs):
@@ -457,13 +526,74 @@ class PlanDetailsView(c.CustomRetrieveUpdateDestroyAPIView):
         return ResponseInfo.success_response(data=None, message="Test Plan Deleted Successfully", status_code=status.HTTP_204_NO_CONTENT)
 
 
+class PlanHeaderView(generics.GenericAPIView):
+
+    serializer_class = PlanHeaderSerializer
+
+    def get(self, request, *args, **kwargs):
+        plan = get_object_or_404(annotate_plan_stats(TestPlan.objects.all()), id=self.kwargs['id'])
+        module_breakdown = TestScore.objects.filter(testplan=plan).values(
+            module=F('testcases__module__name')
+        ).annotate(count=Count('id'), average_score=Avg('testscore')).order_by('-count', 'module')
+        serializer = self.get_serializer(plan, context={'module_breakdown': module_breakdown})
+        return ResponseInfo.success_response(data=serializer.data, message="Plan Header")
+
+
+class PlanTestcasesView(generics.ListAPIView):
+
+    serializer_class = PlanTestcaseSerializer
+    pagination_class = PlanTestcasePagination
+    filter_backends = []
+
+    def get_queryset(self):
+        get_object_or_404(TestPlan.objects.only('id'), id=self.kwargs['id'])
+        return TestScore.objects.filter(testplan_id=self.kwargs['id']).values(
+            'id', 'mode', 'testscore', 'reasoning',
+            testcase_id=F('testcases_id'),
+            name=F('testcases__name'),
+            modules=F('testcases__module__name'),
+            priority=F('testcases__priority'),
+            testcase_type=F('testcases__testcase_type'),
+        )
+
+
+class ClonePlanView(generics.GenericAPIView):
+
+    serializer_class = ClonePlanSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
+            return ResponseInfo.error_response(error=serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
+        try:
+            plan, copied = clone_plan(self.kwargs['id'], **serializer.validated_data)
+        except CloneError as e:
+            return ResponseInfo.error_response(error={"error": str(e)}, status_code=status.HTTP_404_NOT_FOUND)
+        plan = annotate_plan_stats(TestPlan.objects.filter(id=plan.id)).get()
+        return ResponseInfo.success_response(data=PlanListSerializer(plan).data, message="Test Plan Cloned Successfully",
+                                             status_code=status.HTTP_201_CREATED)
+
+
+class RestorePlanView(APIView):
+
+    def post(self, request, *args, **kwargs):
+        try:
+            restore_plans([self.kwargs['id']])
+        except ArchiveSchemaError as e:
+            return ResponseInfo.error_response(error={"error": str(e)}, status_code=status.HTTP_409_CONFLICT)
+        except ArchiveError as e:
+            return ResponseInfo.error_response(error={"error": str(e)}, status_code=status.HTTP_404_NOT_FOUND)
+        plan = annotate_plan_stats(TestPlan.objects.filter(id=self.kwargs['id'])).get()
+        return ResponseInfo.success_response(data=PlanListSerializer(plan).data, message="Test Plan Restored Successfully")
+
+
 @extend_schema(tags=["AI Testcase Plan Creation API"])
-class AITestCaseFilterChat(generics.GenericAPIView):
+class AITestCaseFilterChat(c.AsyncAPIView):
 
     pagination_class = TestCasePagination
     serializer_class = AITestPlanSerializer
 
-    def post(self, request, *args, **kwargs):
+    async def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user_msg = serializer.validated_data.get('user_msg')
@@ -471,7 +601,8 @@ class AITestCaseFilterChat(generics.GenericAPIView):
             # if not session or session == "":
             #     session = generate_session_id()
 
-            response_dict = run_filter_flow(user_msg, session)
+            testplan_filter = await aload('aimode.core.testplan_filter')
+            response_dict = await testplan_filter.arun_filter_flow(user_msg, session)
             response_dict['session_id'] = session
 
             if response_dict.get('tcs_data', None):
@@ -498,9 +629,9 @@ class AITestCaseFilterChat(generics.GenericAPIView):
                         response_dict['tcs_data'].pop('tcs')
                     response_dict['tcs_data'] = serialized_data
 
-            return Response(response_dict, status=status.HTTP_200_OK)
+            return self.json_response(response_dict)
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return self.json_response(serializer.errors, status_code=status.HTTP_400_BAD_REQUEST)
 
 
 # class AITestCaseFilterChat(generics.GenericAPIView):
@@ -573,6 +704,19 @@ class GenerateScoreView(APIView):
         return Response(scores, status=status.HTTP_200_OK)
     
 
+@extend_schema(tags=["Export API"])
+class ExportView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        try:
+            exporter = Exporter(self.kwargs['dataset'], self.kwargs['file_format'], request.query_params)
+        except ExportError as e:
+            return ResponseInfo.error_response(error={"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(exporter.stream(), content_type=exporter.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{exporter.filename}"'
+        return response
+
+
 class TestPlanHistoryView(c.CustomListCreateAPIView):
 
     serializer_class = PlanHistorySerializer
@@ -580,7 +724,7 @@ class TestPlanHistoryView(c.CustomListCreateAPIView):
 
     def get_queryset(self):
         testplan_id = self.kwargs['id']
-        queryset = HistoryTestPlan.objects.filter(testplan_id=testplan_id).order_by('-created')
+        queryset = HistoryTestPlan.objects.filter(testplan_id=testplan_id).select_related('changes_blob').order_by('-version_number')
         return queryset
         
 
@@ -593,38 +737,62 @@ class HistoryPlanDetailsView(c.CustomRetrieveAPIVIew):
         return queryset
 
 
+class PlanVersionView(APIView):
+
+    def get(self, request, *args, **kwargs):
+        plan_version = reconstruct_plan_version(self.kwargs['id'], self.kwargs['version'])
+        if plan_version is None:
+            return ResponseInfo.error_response(error={"error": "Plan version not found"},
+                                               status_code=status.HTTP_404_NOT_FOUND)
+        return ResponseInfo.success_response(data=plan_version, message="Plan Version")
+
+
+@extend_schema(tags=["Diff API"])
+class PlanDiffView(APIView):
+
+    def get_diff(self):
+        return diff_plans(self.kwargs['left'], self.kwargs['right'])
+
+    def get(self, request, *args, **kwargs):
+        try:
+            diff = self.get_diff()
+        except DiffError as e:
+            return ResponseInfo.error_response(error={"error": str(e)}, status_code=status.HTTP_404_NOT_FOUND)
+        return ResponseInfo.success_response(data=diff, message="Diff")
+
+
+class PlanVersionDiffView(PlanDiffView):
+
+    def get_diff(self):
+        return diff_plan_versions(self.kwargs['id'], self.kwargs['left'], self.kwargs['right'])
+
+
+class SessionVersionDiffView(PlanDiffView):
+
+    def get_diff(self):
+        return diff_session_versions(self.kwargs['session_id'], self.kwargs['left'], self.kwargs['right'])
+
+
 class GetModuleGraph(APIView):
 
     def get(self, request, *args, **kwargs):
         session_id = self.kwargs.get('session_id', None)
         version_id = self.kwargs.get('version', None)
         queryset = get_object_or_404(
-            TestPlanSession,
+            TestPlanSession.objects.only('id', 'version_info'),
             session_id=session_id,
             version=version_id
         )
-        modules_data = {}
-        priority_data = {}
-        version_info = queryset.version_info
-        print('version_info', version_info)
-        # serializer = TestplanSessionSerializer(queryset)
-        for data in queryset.testcase_data:
-            for key, value in data.items():
-                if key == 'modules':
-                    if modules_data.get(value) is None:
-                        modules_data[value] = 1
-                    else:
-                        modules_data[value] += 1
-                if key == 'priority':
-                    if priority_data.get(value, None) is None:
-                        priority_data[value] = 1
-                    else:
-                        priority_data[value] += 1
+        testcases = SessionVersionTestcase.objects.filter(version=queryset).order_by()
+        modules_data = dict(testcases.values_list('module').annotate(count=Count('id')).values_list('module', 'count'))
+        priority_data = dict(
+            testcases.values_list('priority').annotate(count=Count('id')).values_list('priority', 'count')
+        )
         return Response(
             {
                 "success": True,
                 "data": {
-                    "version_info": version_info,
+                    "version_info": queryset.version_info,
                     "modules": modules_data,
                     "priority": priority_data,
                 },
@@ -632,3 +800,25 @@ class GetModuleGraph(APIView):
                 "message": "Success"
             }
         )
+
+
+class SessionVersionTestcasesView(generics.ListAPIView):
+
+    serializer_class = SessionVersionTestcaseSerializer
+    pagination_class = SessionTestcasePagination
+    filter_backends = []
+    filter_params = ('module', 'priority', 'mode')
+
+    def get_queryset(self):
+        version = get_object_or_404(
+            TestPlanSession.objects.only('id'),
+            session__session_id=self.kwargs.get('token'),
+            version=self.kwargs.get('version'),
+        )
+        queryset = SessionVersionTestcase.objects.filter(version=version)
+        for param in self.filter_params:
+            if self.request.query_params.get(param):
+                queryset = queryset.filter(**{f'{param}__in': self.request.query_params.get(param).split(',')})
+        if self.request.query_params.get('name'):
+            queryset = queryset.filter(name__icontains=self.request.query_params.get('name'))
+        return queryset
@@ -4,4 +4,5 @@ class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.core"
 
-
+    def ready(self):
+        from apps.core import signals  # noqa: F401
@@ -0,0 +1,224 @@
+"""
+Cold storage archival of inactive and stale test plans.
+
+Archiving moves a plan, its modules, ``TestScore`` rows and ``HistoryTestPlan``
+rows into a single ``ArchivedTestPlan`` row (``to_jsonb``) and deletes them
+from the hot tables, batch by batch, entirely in SQL. Restoring rebuilds the
+original rows with the same ids through ``jsonb_populate_record``.
+
+Archives outlive schema changes, so restoring inserts explicit column lists of
+today's models: a column added since archiving gets its model default, and an
+archived column that no longer exists (dropped or renamed) stops the restore
+with an ``ArchiveSchemaError`` instead of being lost silently.
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from apps.core.models import ArchivedTestPlan, HistoryTestPlan, Module, TestCaseModel, TestPlan, TestScore
+
+ARCHIVE_BATCH_SIZE = 200
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class ArchiveSchemaError(ArchiveError):
+    pass
+
+
+def _tables(ops):
+    return {
+        'plan': ops.quote_name(TestPlan._meta.db_table),
+        'modules': ops.quote_name(TestPlan.modules.through._meta.db_table),
+        'score': ops.quote_name(TestScore._meta.db_table),
+        'history': ops.quote_name(HistoryTestPlan._meta.db_table),
+        'archive': ops.quote_name(ArchivedTestPlan._meta.db_table),
+        'module': ops.quote_name(Module._meta.db_table),
+        'testcase': ops.quote_name(TestCaseModel._meta.db_table),
+    }
+
+
+def get_archivable_plans(inactive_days=None, stale_days=None):
+    """
+    Ids of plans to archive: inactive plans untouched for ``inactive_days`` and,
+    if ``stale_days`` is set, any plan untouched for that long.
+    """
+    if inactive_days is None:
+        inactive_days = settings.PLAN_ARCHIVE_INACTIVE_DAYS
+    if stale_days is None:
+        stale_days = settings.PLAN_ARCHIVE_STALE_DAYS
+    now = timezone.now()
+    queryset = TestPlan.objects.filter(is_active=False, modified__lte=now - timedelta(days=inactive_days))
+    if stale_days:
+        queryset = queryset | TestPlan.objects.filter(modified__lte=now - timedelta(days=stale_days))
+    return queryset.order_by('id').values_list('id', flat=True)
+
+
+def archive_plans(plan_ids):
+    """Move the given plans to cold storage and return the number archived."""
+    using = router.db_for_write(TestPlan)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        t = _tables(connections[using].ops)
+        # plans being edited right now are skipped and picked up by the next run
+        cursor.execute(
+            f"SELECT id FROM {t['plan']} WHERE id = ANY(%s) ORDER BY id FOR UPDATE SKIP LOCKED",
+            [list(plan_ids)],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return 0
+        cursor.execute(
+            f"""
+            INSERT INTO {t['archive']} (created, modified, plan_id, name, reason, plan, modules, scores, history)
+            SELECT NOW(), NOW(), p.id, p.name,
+                   CASE WHEN p.is_active IS FALSE THEN %s ELSE %s END,
+                   to_jsonb(p),
+                   COALESCE((SELECT jsonb_agg(m.module_id ORDER BY m.id) FROM {t['modules']} m
+                             WHERE m.testplan_id = p.id), '[]'::jsonb),
+                   COALESCE((SELECT jsonb_agg(to_jsonb(s) ORDER BY s.id) FROM {t['score']} s
+                             WHERE s.testplan_id = p.id), '[]'::jsonb),
+                   COALESCE((SELECT jsonb_agg(to_jsonb(h) ORDER BY h.id) FROM {t['history']} h
+                             WHERE h.testplan_id = p.id), '[]'::jsonb)
+            FROM {t['plan']} p
+            WHERE p.id = ANY(%s)
+            """,
+            [ArchivedTestPlan.ReasonChoices.INACTIVE, ArchivedTestPlan.ReasonChoices.STALE, ids],
+        )
+        for table in ('modules', 'score', 'history'):
+            cursor.execute(f"DELETE FROM {t[table]} WHERE testplan_id = ANY(%s)", [ids])
+        cursor.execute(f"DELETE FROM {t['plan']} WHERE id = ANY(%s)", [ids])
+    return len(ids)
+
+
+def archive_stale_plans(inactive_days=None, stale_days=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive every archivable plan in batches of ``batch_size``, one transaction each."""
+    candidates = list(get_archivable_plans(inactive_days, stale_days))
+    archived = 0
+    for start in range(0, len(candidates), batch_size):
+        archived += archive_plans(candidates[start:start + batch_size])
+    return archived
+
+
+def _columns(model):
+    return [field.column for field in model._meta.concrete_fields]
+
+
+def _defaults(model):
+    """JSON object of the model defaults, merged under archived rows missing newer columns."""
+    return json.dumps({
+        field.column: field.get_default() for field in model._meta.concrete_fields if field.has_default()
+    }, cls=DjangoJSONEncoder)
+
+
+def _select_columns(alias, model, ops):
+    return ', '.join(f'{alias}.{ops.quote_name(column)}' for column in _columns(model))
+
+
+def _insert_columns(model, ops):
+    return ', '.join(ops.quote_name(column) for column in _columns(model))
+
+
+def _check_columns(cursor, t, ids):
+    """Raise ``ArchiveSchemaError`` if the archives hold columns today's tables do not have."""
+    sources = (
+        (TestPlan, "CROSS JOIN LATERAL jsonb_object_keys(a.plan) AS k(name)"),
+        (TestScore, "CROSS JOIN LATERAL jsonb_array_elements(a.scores) AS e(row) "
+                    "CROSS JOIN LATERAL jsonb_object_keys(e.row) AS k(name)"),
+        (HistoryTestPlan, "CROSS JOIN LATERAL jsonb_array_elements(a.history) AS e(row) "
+                          "CROSS JOIN LATERAL jsonb_object_keys(e.row) AS k(name)"),
+    )
+    unknown = []
+    for model, keys in sources:
+        cursor.execute(
+            f"SELECT DISTINCT k.name FROM {t['archive']} a {keys} "
+            f"WHERE a.plan_id = ANY(%s) AND NOT k.name = ANY(%s) ORDER BY k.name",
+            [ids, _columns(model)],
+        )
+        unknown += [f"{model._meta.db_table}.{row[0]}" for row in cursor.fetchall()]
+    if unknown:
+        raise ArchiveSchemaError(f"Archived columns missing from the current schema: {', '.join(unknown)}")
+
+
+def restore_plans(plan_ids):
+    """
+    Move archived plans back into the hot tables with their original ids.
+    Modules and testcases deleted since archiving are left out.
+    """
+    using = router.db_for_write(TestPlan)
+    ops = connections[using].ops
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        t = _tables(ops)
+        cursor.execute(
+            f"SELECT plan_id FROM {t['archive']} WHERE plan_id = ANY(%s) ORDER BY plan_id FOR UPDATE",
+            [list(plan_ids)],
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+        missing = set(plan_ids) - set(ids)
+        if missing:
+            raise ArchiveError(f"Archived plans not found: {', '.join(map(str, sorted(missing)))}")
+        _check_columns(cursor, t, ids)
+        try:
+            cursor.execute(
+                f"""
+                INSERT INTO {t['plan']} ({_insert_columns(TestPlan, ops)})
+                SELECT {_select_columns('p', TestPlan, ops)}
+                FROM {t['archive']} a
+                CROSS JOIN LATERAL jsonb_populate_record(NULL::{t['plan']}, %s::jsonb || a.plan) AS p
+                WHERE a.plan_id = ANY(%s)
+                """,
+                [_defaults(TestPlan), ids],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {t['modules']} (testplan_id, module_id)
+                SELECT a.plan_id, m.id
+                FROM {t['archive']} a
+                CROSS JOIN LATERAL jsonb_array_elements_text(a.modules) AS e(module_id)
+                JOIN {t['module']} m ON m.id = e.module_id::bigint
+                WHERE a.plan_id = ANY(%s)
+                """,
+                [ids],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {t['score']} ({_insert_columns(TestScore, ops)})
+                SELECT {_select_columns('s', TestScore, ops)}
+                FROM {t['archive']} a
+                CROSS JOIN LATERAL jsonb_array_elements(a.scores) AS e(row)
+                CROSS JOIN LATERAL jsonb_populate_record(NULL::{t['score']}, %s::jsonb || e.row) AS s
+                WHERE a.plan_id = ANY(%s)
+                  AND (s.testcases_id IS NULL OR EXISTS (SELECT 1 FROM {t['testcase']} tc WHERE tc.id = s.testcases_id))
+                """,
+                [_defaults(TestScore), ids],
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {t['history']} ({_insert_columns(HistoryTestPlan, ops)})
+                SELECT {_select_columns('h', HistoryTestPlan, ops)}
+                FROM {t['archive']} a
+                CROSS JOIN LATERAL jsonb_array_elements(a.history) AS e(row)
+                CROSS JOIN LATERAL jsonb_populate_record(NULL::{t['history']}, %s::jsonb || e.row) AS h
+                WHERE a.plan_id = ANY(%s)
+                """,
+                [_defaults(HistoryTestPlan), ids],
+            )
+        except IntegrityError as e:
+            raise ArchiveSchemaError(f"Archived plans do not fit the current schema: {e}") from e
+        cursor.execute(f"DELETE FROM {t['archive']} WHERE plan_id = ANY(%s)", [ids])
+    return len(ids)
+
+
+def vacuum_hot_tables():
+    """Reclaim space and refresh statistics on the hot tables after a large archive run."""
+    using = router.db_for_write(TestPlan)
+    connection = connections[using]
+    t = _tables(connection.ops)
+    with connection.cursor() as cursor:
+        for table in ('plan', 'modules', 'score', 'history'):
+            cursor.execute(f"VACUUM (ANALYZE) {t[table]}")
@@ -0,0 +1,104 @@
+"""
+Content addressed, compressed storage of large JSON payloads.
+
+``TestPlanSession.testcase_data`` and ``HistoryTestPlan.other_changes`` are
+stored as ``PayloadBlob`` rows keyed by the SHA-256 of their canonical JSON, so
+identical payloads (re-saved sessions, unchanged plan snapshots) are kept once.
+Payloads are zstd compressed when ``zstandard`` is installed. ``ref_count``
+counts the rows pointing at a blob; a blob is deleted once it drops to zero.
+"""
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, router, transaction
+
+from apps.core.models import PayloadBlob
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+ZSTD_LEVEL = 3
+
+
+def canonical_json(payload):
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder).encode()
+
+
+def encode_payload(raw):
+    """Compress canonical JSON bytes; returns ``(codec, data)``."""
+    if zstandard is None:
+        return PayloadBlob.CodecChoices.RAW, raw
+    return PayloadBlob.CodecChoices.ZSTD, zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+
+
+def decode_payload(data, codec):
+    data = bytes(data)
+    if codec == PayloadBlob.CodecChoices.ZSTD:
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read compressed payloads")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    return json.loads(data)
+
+
+def store_blob(payload):
+    """
+    Add a reference to the blob holding ``payload``, creating it if needed, and
+    return its id. An existing blob is found by digest without compressing the
+    payload again.
+    """
+    if payload is None:
+        return None
+    raw = canonical_json(payload)
+    digest = hashlib.sha256(raw).hexdigest()
+    using = router.db_for_write(PayloadBlob)
+    table = connections[using].ops.quote_name(PayloadBlob._meta.db_table)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET ref_count = ref_count + 1, modified = NOW() WHERE digest = %s RETURNING id",
+            [digest],
+        )
+        row = cursor.fetchone()
+        if row:
+            return row[0]
+        codec, data = encode_payload(raw)
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (created, modified, digest, codec, data, size, ref_count)
+            VALUES (NOW(), NOW(), %s, %s, %s, %s, 1)
+            ON CONFLICT (digest) DO UPDATE SET ref_count = {table}.ref_count + 1, modified = NOW()
+            RETURNING id
+            """,
+            [digest, codec, data, len(raw)],
+        )
+        return cursor.fetchone()[0]
+
+
+def load_blob(blob_id):
+    blob = PayloadBlob.objects.filter(id=blob_id).values_list('data', 'codec').first()
+    return decode_payload(*blob) if blob else None
+
+
+def release_blobs(blob_ids):
+    """
+    Drop one reference per entry of ``blob_ids`` (ids may repeat) and delete
+    blobs no longer referenced. Returns the number of blobs deleted.
+    """
+    blob_ids = [blob_id for blob_id in blob_ids if blob_id is not None]
+    if not blob_ids:
+        return 0
+    using = router.db_for_write(PayloadBlob)
+    table = connections[using].ops.quote_name(PayloadBlob._meta.db_table)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {table} AS b SET ref_count = GREATEST(b.ref_count - r.refs, 0), modified = NOW()
+            FROM (SELECT id, COUNT(*) AS refs FROM unnest(%s::bigint[]) AS id GROUP BY id) AS r
+            WHERE b.id = r.id
+            """,
+            [blob_ids],
+        )
+        cursor.execute(f"DELETE FROM {table} WHERE id = ANY(%s::bigint[]) AND ref_count = 0", [blob_ids])
+        return cursor.rowcount
@@ -0,0 +1,75 @@
+"""
+Server side cloning of test plans.
+
+The plan row is copied through the ORM, while its modules and ``TestScore``
+rows are copied with ``INSERT ... SELECT`` so no testcase rows travel through
+Python regardless of the plan size.
+"""
+from django.db import connections, router, transaction
+
+from apps.core.models import TestCaseScoreModel, TestPlan, TestScore
+
+CLONED_FIELDS = ('description', 'priority', 'output_counts', 'testcase_type', 'modes', 'is_active')
+
+
+class CloneError(Exception):
+    pass
+
+
+def _copy_modules(cursor, ops, source_id, target_id):
+    through = TestPlan.modules.through
+    cursor.execute(
+        f"""
+        INSERT INTO {ops.quote_name(through._meta.db_table)} (testplan_id, module_id)
+        SELECT %s, module_id FROM {ops.quote_name(through._meta.db_table)} WHERE testplan_id = %s
+        """,
+        [target_id, source_id],
+    )
+
+
+def _copy_scores(cursor, ops, source_id, target_id, refresh_scores):
+    if refresh_scores:
+        # latest materialised score of the testcase, falling back to the copied one
+        testscore = "COALESCE(latest.score, ts.testscore)"
+        latest = f"""
+        LEFT JOIN LATERAL (
+            SELECT s.score FROM {ops.quote_name(TestCaseScoreModel._meta.db_table)} AS s
+            WHERE s.testcases_id = ts.testcases_id
+            ORDER BY s.created DESC LIMIT 1
+        ) AS latest ON TRUE"""
+    else:
+        testscore, latest = "ts.testscore", ""
+    cursor.execute(
+        f"""
+        INSERT INTO {ops.quote_name(TestScore._meta.db_table)}
+            (created, modified, testplan_id, testcases_id, reasoning, mode, testscore)
+        SELECT NOW(), NOW(), %s, ts.testcases_id, ts.reasoning, ts.mode, {testscore}
+        FROM {ops.quote_name(TestScore._meta.db_table)} AS ts{latest}
+        WHERE ts.testplan_id = %s
+        ORDER BY ts.id
+        """,
+        [target_id, source_id],
+    )
+    return cursor.rowcount
+
+
+def clone_plan(source_id, name=None, refresh_scores=False):
+    """
+    Copy the plan ``source_id`` with its modules and testcases; with
+    ``refresh_scores`` the copied testscores are replaced by the current
+    ``TestCaseScoreModel`` scores. Returns ``(plan, copied_testcases)``.
+    """
+    using = router.db_for_write(TestPlan)
+    with transaction.atomic(using=using):
+        source = TestPlan.objects.filter(id=source_id).first()
+        if source is None:
+            raise CloneError("Test plan not found")
+        plan = TestPlan.objects.create(
+            name=name or f"{source.name} (copy)",
+            **{field: getattr(source, field) for field in CLONED_FIELDS},
+        )
+        ops = connections[using].ops
+        with connections[using].cursor() as cursor:
+            _copy_modules(cursor, ops, source.id, plan.id)
+            copied = _copy_scores(cursor, ops, source.id, plan.id, refresh_scores)
+    return plan, copied
@@ -62,7 +62,7 @@ class Session(BaseModel):
 
     session: uuid.UUID
     context: str
-    version: str
+    version: Optional[int] = None
     name: str
     description: str
     modules: List[str]
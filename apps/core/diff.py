@@ -0,0 +1,142 @@
+"""
+Server side diffs between two test plans, two plan history versions or two
+AI session versions.
+
+Plan and session diffs are a single grouped query over the ``TestScore`` or
+``SessionVersionTestcase`` rows of both sides, so only the compact diff is sent
+to the client instead of both full plans.
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max, Q
+
+from apps.core.history import reconstruct_plan_version
+from apps.core.models import SessionVersionTestcase, TestCaseModel, TestPlan, TestPlanSession, TestScore
+
+
+class DiffError(Exception):
+    pass
+
+
+def _score(value):
+    return round(float(value), 4) if value is not None else None
+
+
+def build_diff(left, right, rows):
+    """
+    Build the diff payload from rows holding ``testcase_id``, ``name``, ``module``,
+    ``left_score``, ``right_score``, ``in_left`` and ``in_right``.
+    """
+    added, removed, changed = [], [], []
+    common = 0
+    modules = {}
+    for row in rows:
+        module = modules.setdefault(row['module'] or '', {'left': 0, 'right': 0})
+        module['left'] += 1 if row['in_left'] else 0
+        module['right'] += 1 if row['in_right'] else 0
+        entry = {'testcase_id': row['testcase_id'], 'name': row['name'], 'module': row['module']}
+        left_score, right_score = _score(row['left_score']), _score(row['right_score'])
+        if row['in_left'] and row['in_right']:
+            common += 1
+            if left_score != right_score:
+                changed.append({**entry, 'left_score': left_score, 'right_score': right_score,
+                                'delta': round((right_score or 0) - (left_score or 0), 4)})
+        elif row['in_right']:
+            added.append({**entry, 'score': right_score})
+        else:
+            removed.append({**entry, 'score': left_score})
+    return {
+        'left': left,
+        'right': right,
+        'summary': {'added': len(added), 'removed': len(removed), 'common': common, 'changed': len(changed)},
+        'added': added,
+        'removed': removed,
+        'changed': changed,
+        'modules': [
+            {'module': name, 'left': counts['left'], 'right': counts['right'],
+             'change': counts['right'] - counts['left']}
+            for name, counts in sorted(modules.items())
+        ],
+    }
+
+
+def diff_plans(left_id, right_id):
+    found = set(TestPlan.objects.filter(id__in=[left_id, right_id]).values_list('id', flat=True))
+    if {left_id, right_id} - found:
+        raise DiffError("Test plan not found")
+    in_left, in_right = Q(testplan_id=left_id), Q(testplan_id=right_id)
+    rows = TestScore.objects.filter(in_left | in_right, testcases__isnull=False).values(
+        'testcases_id', 'testcases__name', 'testcases__module__name',
+    ).annotate(
+        left_score=Max('testscore', filter=in_left),
+        right_score=Max('testscore', filter=in_right),
+        left_count=Count('id', filter=in_left),
+        right_count=Count('id', filter=in_right),
+    ).order_by('testcases_id')
+    return build_diff(left_id, right_id, (
+        {
+            'testcase_id': row['testcases_id'],
+            'name': row['testcases__name'],
+            'module': row['testcases__module__name'],
+            'left_score': row['left_score'],
+            'right_score': row['right_score'],
+            'in_left': row['left_count'] > 0,
+            'in_right': row['right_count'] > 0,
+        } for row in rows
+    ))
+
+
+def diff_plan_versions(testplan_id, left_version, right_version):
+    """History rows are delta encoded, so both versions are rebuilt before diffing."""
+    left = reconstruct_plan_version(testplan_id, left_version)
+    right = reconstruct_plan_version(testplan_id, right_version)
+    if left is None or right is None:
+        raise DiffError("Plan version not found")
+    left_scores = {tc['testcases_id']: tc for tc in left['testcases']}
+    right_scores = {tc['testcases_id']: tc for tc in right['testcases']}
+    testcase_ids = sorted(left_scores.keys() | right_scores.keys(), key=lambda x: (x is None, x))
+    module_names = dict(TestCaseModel.objects.filter(id__in=testcase_ids).values_list('id', 'module__name'))
+    return build_diff(left_version, right_version, (
+        {
+            'testcase_id': testcase_id,
+            'name': (right_scores.get(testcase_id) or left_scores.get(testcase_id)).get('testcases_name'),
+            'module': module_names.get(testcase_id),
+            'left_score': left_scores.get(testcase_id, {}).get('testscore'),
+            'right_score': right_scores.get(testcase_id, {}).get('testscore'),
+            'in_left': testcase_id in left_scores,
+            'in_right': testcase_id in right_scores,
+        } for testcase_id in testcase_ids
+    ))
+
+
+def diff_session_versions(session_id, left_version, right_version):
+    """Session versions are diffed from their normalised ``SessionVersionTestcase`` rows."""
+    try:
+        versions = dict(TestPlanSession.objects.filter(
+            session_id=session_id, version__in=[left_version, right_version]
+        ).values_list('version', 'id'))
+    except ValidationError:
+        raise DiffError("Invalid session id")
+    if left_version not in versions or right_version not in versions:
+        raise DiffError("Session version not found")
+    in_left, in_right = Q(version_id=versions[left_version]), Q(version_id=versions[right_version])
+    rows = SessionVersionTestcase.objects.filter(in_left | in_right, testcase_id__isnull=False).values(
+        'testcase_id',
+    ).annotate(
+        testcase_name=Max('name'),
+        module_name=Max('module'),
+        left_score=Max('testscore', filter=in_left),
+        right_score=Max('testscore', filter=in_right),
+        left_count=Count('id', filter=in_left),
+        right_count=Count('id', filter=in_right),
+    ).order_by('testcase_id')
+    return build_diff(left_version, right_version, (
+        {
+            'testcase_id': row['testcase_id'],
+            'name': row['testcase_name'],
+            'module': row['module_name'],
+            'left_score': row['left_score'],
+            'right_score': row['right_score'],
+            'in_left': row['left_count'] > 0,
+            'in_right': row['right_count'] > 0,
+        } for row in rows
+    ))
@@ -0,0 +1,316 @@
+"""
+Streaming exports of the testcase repository, test plans and AI session versions.
+
+Rows are read with ``QuerySet.iterator()`` (server-side cursors on PostgreSQL)
+and encoded chunk by chunk, so memory stays flat however large the export is.
+"""
+import csv
+import json
+from abc import ABC, abstractmethod
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+
+from apps.core.blobs import decode_payload
+from apps.core.filters import TestcaseFilter
+from apps.core.helpers import annotate_version_status
+from apps.core.models import TestCaseModel, TestCaseMetric, TestCaseScoreModel, TestScore, TestPlanSession
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = ('csv', 'ndjson', 'parquet')
+TESTCASE_FILTER_PARAMS = ('name', 'priority', 'testcase_type', 'feature')
+METRIC_FIELDS = (
+    'likelihood', 'impact', 'failure_rate', 'failure', 'total_runs', 'direct_impact',
+    'defects', 'severity', 'feature_size', 'execution_time',
+)
+
+
+class ExportError(Exception):
+    pass
+
+
+class _Echo:
+    """File-like object that hands back whatever is written to it."""
+
+    def write(self, value):
+        return value
+
+
+class _ParquetSink:
+    """Write-only buffer that the parquet writer fills and the stream drains."""
+
+    closed = False
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def filter_testcases(params):
+    """Apply the repository ``TestcaseFilter`` to the given query params."""
+    data = {key: params.get(key) for key in TESTCASE_FILTER_PARAMS if params.get(key)}
+    if not data:
+        return None
+    filterset = TestcaseFilter(data=data, queryset=TestCaseModel.objects.all())
+    if not filterset.is_valid():
+        raise ExportError(filterset.errors)
+    return filterset.qs
+
+
+class ExportDataset(ABC):
+    """Base class for an exportable dataset; ``columns`` is a list of (name, kind)."""
+
+    name = None
+    columns = []
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    @property
+    def fields(self):
+        return [name for name, _ in self.columns]
+
+    @abstractmethod
+    def iter_rows(self):
+        pass
+
+
+class RepositoryExport(ExportDataset):
+
+    name = 'repository'
+    columns = [
+        ('id', 'int'), ('name', 'str'), ('priority', 'str'), ('feature', 'str'),
+        ('testcase_type', 'str'), ('status', 'str'), ('project', 'str'),
+        ('likelihood', 'int'), ('impact', 'int'), ('failure_rate', 'float'),
+        ('failure', 'int'), ('total_runs', 'int'), ('direct_impact', 'int'),
+        ('defects', 'int'), ('severity', 'int'), ('feature_size', 'int'),
+        ('execution_time', 'float'), ('score', 'float'), ('rpn_value', 'float'),
+        ('modified', 'datetime'),
+    ]
+
+    def get_queryset(self):
+        queryset = filter_testcases(self.params)
+        if queryset is None:
+            queryset = TestCaseModel.objects.all()
+        latest_score = TestCaseScoreModel.objects.filter(testcases=OuterRef('pk')).order_by('-created')
+        # A testcase can carry several metric rows; joining them would repeat the
+        # testcase once per row, so only the latest one is exported.
+        latest_metric = TestCaseMetric.objects.filter(testcase=OuterRef('pk')).order_by('-modified', '-id')
+        return queryset.annotate(
+            score=Subquery(latest_score.values('score')[:1]),
+            rpn_value=Subquery(latest_score.values('rpn_value')[:1]),
+            **{field: Subquery(latest_metric.values(field)[:1]) for field in METRIC_FIELDS},
+        ).values(
+            'id', 'name', 'priority', 'testcase_type', 'status', 'modified', 'score', 'rpn_value',
+            'module__name', 'project__name', *METRIC_FIELDS,
+        ).order_by('id')
+
+    def iter_rows(self):
+        for row in self.get_queryset().iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            row['feature'] = row.pop('module__name')
+            row['project'] = row.pop('project__name')
+            yield row
+
+
+class PlanExport(ExportDataset):
+
+    name = 'plans'
+    columns = [
+        ('plan_id', 'int'), ('plan_name', 'str'), ('plan_modes', 'str'), ('plan_is_active', 'bool'),
+        ('testcase_id', 'int'), ('testcase_name', 'str'), ('feature', 'str'), ('priority', 'str'),
+        ('mode', 'str'), ('testscore', 'float'), ('reasoning', 'str'), ('created', 'datetime'),
+    ]
+
+    def get_queryset(self):
+        queryset = TestScore.objects.all()
+        plan_ids = self.params.get('plan')
+        if plan_ids:
+            queryset = queryset.filter(testplan_id__in=[i for i in plan_ids.split(',') if i.isdigit()])
+        if self.params.get('is_active') is not None:
+            queryset = queryset.filter(testplan__is_active=self.params.get('is_active') in ('true', 'True', '1'))
+        testcases = filter_testcases(self.params)
+        if testcases is not None:
+            queryset = queryset.filter(testcases__in=testcases.values('id'))
+        return queryset.values(
+            'testplan_id', 'testplan__name', 'testplan__modes', 'testplan__is_active', 'testcases_id',
+            'testcases__name', 'testcases__module__name', 'testcases__priority', 'mode', 'testscore',
+            'reasoning', 'created',
+        ).order_by('testplan_id', 'id')
+
+    def iter_rows(self):
+        for row in self.get_queryset().iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield {
+                'plan_id': row['testplan_id'],
+                'plan_name': row['testplan__name'],
+                'plan_modes': row['testplan__modes'],
+                'plan_is_active': row['testplan__is_active'],
+                'testcase_id': row['testcases_id'],
+                'testcase_name': row['testcases__name'],
+                'feature': row['testcases__module__name'],
+                'priority': row['testcases__priority'],
+                'mode': row['mode'],
+                'testscore': row['testscore'],
+                'reasoning': row['reasoning'],
+                'created': row['created'],
+            }
+
+
+class SessionExport(ExportDataset):
+
+    name = 'sessions'
+    columns = [
+        ('session_id', 'str'), ('version', 'int'), ('name', 'str'), ('status', 'str'),
+        ('output_counts', 'int'), ('testcase_id', 'int'), ('testcase_name', 'str'),
+        ('feature', 'str'), ('priority', 'str'), ('mode', 'str'), ('testscore', 'float'),
+        ('created', 'datetime'),
+    ]
+
+    def get_queryset(self):
+        queryset = TestPlanSession.objects.all()
+        if self.params.get('session'):
+            queryset = queryset.filter(session_id=self.params.get('session'))
+        return annotate_version_status(queryset).values(
+            'session_id', 'version', 'name', 'version_status', 'output_counts', 'testcase_data',
+            'testcase_blob__data', 'testcase_blob__codec', 'created',
+        ).order_by('session_id', 'id')
+
+    def iter_rows(self):
+        testcases = filter_testcases(self.params)
+        allowed_ids = set(testcases.values_list('id', flat=True)) if testcases is not None else None
+        for row in self.get_queryset().iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            if row['testcase_blob__data'] is not None:
+                row['testcase_data'] = decode_payload(row['testcase_blob__data'], row['testcase_blob__codec'])
+            for testcase in row['testcase_data'] or []:
+                if not isinstance(testcase, dict):
+                    continue
+                testcase_id = _as_int(testcase.get('id'))
+                if allowed_ids is not None and testcase_id not in allowed_ids:
+                    continue
+                yield {
+                    'session_id': str(row['session_id']) if row['session_id'] else None,
+                    'version': row['version'],
+                    'name': row['name'],
+                    'status': row['version_status'],
+                    'output_counts': row['output_counts'],
+                    'testcase_id': testcase_id,
+                    'testcase_name': testcase.get('name') or testcase.get('testcase'),
+                    'feature': testcase.get('modules'),
+                    'priority': testcase.get('priority'),
+                    'mode': testcase.get('mode'),
+                    'testscore': testcase.get('testscore'),
+                    'created': row['created'],
+                }
+
+
+EXPORT_DATASETS = {
+    RepositoryExport.name: RepositoryExport,
+    PlanExport.name: PlanExport,
+    SessionExport.name: SessionExport,
+}
+
+
+def stream_csv(dataset):
+    writer = csv.DictWriter(_Echo(), fieldnames=dataset.fields, extrasaction='ignore')
+    yield writer.writeheader()
+    for batch in _batched(dataset.iter_rows(), EXPORT_CHUNK_SIZE):
+        yield ''.join(writer.writerow(row) for row in batch)
+
+
+def stream_ndjson(dataset):
+    for batch in _batched(dataset.iter_rows(), EXPORT_CHUNK_SIZE):
+        yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in batch)
+
+
+def stream_parquet(dataset):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        'int': pa.int64(),
+        'float': pa.float64(),
+        'str': pa.string(),
+        'bool': pa.bool_(),
+        'datetime': pa.timestamp('us', tz='UTC'),
+    }
+    schema = pa.schema([(name, arrow_types[kind]) for name, kind in dataset.columns])
+    sink = _ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in _batched(dataset.iter_rows(), EXPORT_CHUNK_SIZE):
+        columns = {name: [_plain(row.get(name)) for row in batch] for name in dataset.fields}
+        writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+EXPORT_WRITERS = {
+    'csv': (stream_csv, 'text/csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson'),
+    'parquet': (stream_parquet, 'application/vnd.apache.parquet'),
+}
+
+
+class Exporter:
+
+    def __init__(self, dataset, file_format, params=None):
+        if dataset not in EXPORT_DATASETS:
+            raise ExportError(f"Unknown dataset '{dataset}', expected one of {', '.join(EXPORT_DATASETS)}")
+        if file_format not in EXPORT_WRITERS:
+            raise ExportError(f"Unknown format '{file_format}', expected one of {', '.join(EXPORT_FORMATS)}")
+        if file_format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ExportError("Parquet export requires the 'pyarrow' package")
+        self.dataset = EXPORT_DATASETS[dataset](params)
+        self.file_format = file_format
+        self.writer, self.content_type = EXPORT_WRITERS[file_format]
+
+    @property
+    def filename(self):
+        return f"{self.dataset.name}_{datetime.now():%Y%m%d%H%M%S}.{self.file_format}"
+
+    def stream(self):
+        return self.writer(self.dataset)
@@ -1,14 +1,19 @@
 import uuid
 import time
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from datetime import datetime
 from jsonschema import ValidationError
 from rest_framework.generics import get_object_or_404
 from django.http import Http404
 from apps.core.models import TestCaseModel, Module, TestCaseMetric, Project, AISessionStore, TestPlanSession, TestScore, \
-    TestCaseScoreModel
-from django.db.models import Q
+    TestCaseScoreModel, TestPlan, SessionVersionTestcase
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import connections, router, transaction
+from django.db.models import Q, Avg, Count, Max, Case, When, F, Value, CharField
 from django.utils.crypto import get_random_string
+from django.utils import timezone
 from apps.core.testscore import TestCaseScore
+from apps.core.blobs import store_blob
 from rest_framework import status
 from .datacls import Session
 # from .pagination import CustomPagination
@@ -119,6 +124,37 @@ def save_score(data=None):
     return True
 
 
+def refresh_scores(testcase_ids):
+    """Recalculate the stored score of the given testcases only, reusing their latest score row."""
+    queryset = TestCaseMetric.objects.filter(testcase__id__in=testcase_ids).select_related('testcase__module')
+    if not queryset.exists():
+        return []
+    results = {}
+    for sc in TestCaseScore().calculate_scores(queryset):
+        results.setdefault(sc.testcase_id, sc)
+    latest = {
+        obj.testcases_id: obj for obj in TestCaseScoreModel.objects.filter(
+            testcases__id__in=list(results)
+        ).order_by('testcases_id', '-created').distinct('testcases_id')
+    }
+    to_update, to_create = [], []
+    for testcase_id, sc in results.items():
+        instance = latest.get(testcase_id) or TestCaseScoreModel(testcases_id=testcase_id)
+        instance.rpn_value = sc.risk_component
+        instance.failure_rate = sc.failure_rate_component
+        instance.code_change = sc.change_impact_component
+        instance.defect_density = sc.defect_component
+        instance.penality = sc.execution_penalty_component
+        instance.score = sc.total_score
+        instance.modified = timezone.now()
+        (to_update if instance.pk else to_create).append(instance)
+    TestCaseScoreModel.objects.bulk_update(
+        to_update, ['rpn_value', 'failure_rate', 'code_change', 'defect_density', 'penality', 'score', 'modified']
+    )
+    TestCaseScoreModel.objects.bulk_create(to_create)
+    return list(results.values())
+
+
 def generate_score(data):
     print('data', data)
     start = time.time()
@@ -175,18 +211,83 @@ def generate_score(data):
     return response_format
 
 
-def get_prev_version(session):
+def annotate_version_status(queryset):
+    """Derive ``version_status`` of ``TestPlanSession`` rows from the session's current version."""
+    return queryset.annotate(version_status=Case(
+        When(session__current_version=F('pk'), then=Value(TestPlanSession.StatusChoices.SAVED)),
+        default=Value(TestPlanSession.StatusChoices.DRAFT),
+        output_field=CharField(),
+    ))
+
+
+def set_current_version(instance):
+    """Make ``instance`` the saved version of its session; a single-row update."""
+    return AISessionStore.objects.filter(pk=instance.session_id).update(current_version=instance)
+
+
+def _version_score(value):
+    """
+    ``value`` as a ``SessionVersionTestcase.testscore``: rounded to the column's
+    decimal places and clamped to its digits. Missing, non-numeric, NaN and
+    infinite scores are stored as 0.
+    """
+    field = SessionVersionTestcase._meta.get_field('testscore')
+    if value is None or isinstance(value, bool):
+        return Decimal(0)
     try:
-        instance = TestPlanSession.objects.filter(session=session).order_by('-created')
-        print(len(instance))
-        instance.update(status='draft')
-        print('instance', instance.satus)
-        return None
-    except Exception as e:
-        print("error", str(e))
-        return None
+        score = Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+    if not score.is_finite():
+        return Decimal(0)
+    step = Decimal(1).scaleb(-field.decimal_places)
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places) - step
+    score = min(max(score, -limit), limit).quantize(step, rounding=ROUND_HALF_UP)
+    return min(max(score, -limit), limit)
+
+
+def _version_testcase(version, position, entry):
+    testcase_id = entry.get('id')
+    module = entry.get('modules', entry.get('module'))
+    return SessionVersionTestcase(
+        version=version,
+        position=position,
+        testcase_id=int(testcase_id) if str(testcase_id).isdigit() else None,
+        name=(entry.get('testcase') or entry.get('name') or '')[:500],
+        module=(", ".join(module) if isinstance(module, list) else module or '')[:255],
+        priority=(entry.get('priority') or '')[:20],
+        mode=(entry.get('mode') or '')[:20],
+        testscore=_version_score(entry.get('testscore')),
+    )
 
 
+def store_version_testcases(instance, testcase_data=None):
+    """Write the rows of the version's testcase data to ``SessionVersionTestcase``."""
+    if testcase_data is None:
+        testcase_data = instance.get_testcase_data()
+    testcase_data = testcase_data if isinstance(testcase_data, list) else []
+    return SessionVersionTestcase.objects.bulk_create([
+        _version_testcase(instance, position, entry)
+        for position, entry in enumerate(testcase_data) if isinstance(entry, dict)
+    ])
+
+
+def allocate_version(session):
+    """
+    Reserve the next version number of ``session`` with a single
+    ``UPDATE ... RETURNING``; the row lock it takes serialises concurrent saves.
+    """
+    using = router.db_for_write(AISessionStore)
+    table = connections[using].ops.quote_name(AISessionStore._meta.db_table)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {table} SET version_counter = version_counter + 1, modified = NOW() "
+            f"WHERE session_id = %s RETURNING version_counter",
+            [str(session.pk)],
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
 
 def save_version(data):
     try:
@@ -197,16 +298,51 @@ def save_version(data):
     print('testing', data)
     session = str(data.pop('session'))
     modules = data.pop('modules')
-    status = data.pop('status') if data.get('status') else 'saved'
+    status = data.pop('status', None) or 'saved'
     get_modules = Module.objects.filter(name__in=modules)
     print('get_modules', get_modules)
     try:
         get_session = AISessionStore.objects.get(session_id=session)
     except AISessionStore.DoesNotExist:
         return False
+    data.pop('version', None)
+    testcase_data = data.pop('testcase_data', None)
     if get_session:
-        get_prev_version(get_session)
-        instance = TestPlanSession.objects.create(session=get_session, status=status, **data)
-        instance.modules.set(get_modules)
+        with transaction.atomic(using=router.db_for_write(TestPlanSession)):
+            instance = TestPlanSession.objects.create(
+                session=get_session, status=status, version=allocate_version(get_session),
+                testcase_blob_id=store_blob(testcase_data), **data
+            )
+            instance.modules.set(get_modules)
+            store_version_testcases(instance, testcase_data)
+            if status == TestPlanSession.StatusChoices.SAVED:
+                set_current_version(instance)
         return instance
     return False
+
+
+def annotate_plan_stats(queryset):
+    """
+    Annotate a ``TestPlan`` queryset with testcase counts, score summary and
+    module names in the same grouped query. Counts are distinct because the
+    modules join repeats every score row once per module.
+    """
+    mode_count = lambda mode: Count('scores', filter=Q(scores__mode=mode), distinct=True)
+    return queryset.annotate(
+        testcase_total=Count('scores', distinct=True),
+        average_score=Avg('scores__testscore'),
+        max_score=Max('scores__testscore'),
+        ai_count=mode_count(TestPlan.ModeChoices.AI),
+        manual_count=mode_count(TestPlan.ModeChoices.MANUAL),
+        classic_count=mode_count(TestPlan.ModeChoices.CLASSIC),
+        module_names=ArrayAgg('modules__name', distinct=True, filter=Q(modules__isnull=False)),
+    )
+
+
+def get_plan_stats_repr(instance):
+    return {
+        'testcase_count': instance.testcase_total,
+        'average_score': round(float(instance.average_score), 4) if instance.average_score else 0,
+        'max_score': float(instance.max_score) if instance.max_score else 0,
+        'mode_counts': {'ai': instance.ai_count, 'manual': instance.manual_count, 'classic': instance.classic_count},
+    }
@@ -0,0 +1,163 @@
+"""
+Delta encoded test plan history.
+
+Every edit of a plan stores a ``HistoryTestPlan`` row holding only what changed
+(added, removed and rescored testcases plus changed plan fields). Every
+``PLAN_HISTORY_SNAPSHOT_INTERVAL`` versions a full snapshot is written instead,
+so rebuilding any version replays at most that many deltas.
+"""
+from django.conf import settings
+from django.db.models import Max
+
+from apps.core.blobs import decode_payload, store_blob
+from apps.core.models import HistoryTestPlan, TestScore
+
+TRACKED_FIELDS = ('name', 'description', 'priority', 'output_counts', 'testcase_type', 'modes', 'is_active')
+LEGACY_KEYS = ('testcases', 'modules', 'fields', 'added', 'removed', 'rescored')
+
+
+def get_snapshot_interval():
+    return max(int(getattr(settings, 'PLAN_HISTORY_SNAPSHOT_INTERVAL', 10)), 1)
+
+
+def get_plan_fields(instance):
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS}
+
+
+def next_version_number(testplan):
+    latest = HistoryTestPlan.objects.filter(testplan=testplan).aggregate(latest=Max('version_number'))['latest']
+    return (latest or 0) + 1
+
+
+def is_snapshot_version(version_number):
+    return version_number == 1 or (version_number - 1) % get_snapshot_interval() == 0
+
+
+def _score_entry(testplan, testcase_id, testcase_name, mode, testscore):
+    return {
+        "testcases_id": testcase_id,
+        "testcases_name": testcase_name or "",
+        "testplan_id": testplan.id,
+        "testplan_name": testplan.name,
+        "mode": mode or 'ai',
+        "testscore": float(testscore) if testscore else 0.0,
+    }
+
+
+def build_snapshot(testplan, modules):
+    scores = TestScore.objects.filter(testplan=testplan).values_list(
+        'testcases_id', 'testcases__name', 'mode', 'testscore'
+    ).order_by('id')
+    return {
+        "fields": get_plan_fields(testplan),
+        "modules": modules,
+        "testcases": [_score_entry(testplan, *score) for score in scores],
+    }
+
+
+def build_delta(testplan, modules, previous_fields, diff):
+    current_fields = get_plan_fields(testplan)
+    delta = {
+        "fields": {
+            field: value for field, value in current_fields.items() if previous_fields.get(field) != value
+        },
+        "modules": modules,
+    }
+    if diff:
+        delta["added"] = [
+            _score_entry(testplan, score.testcases.id, score.testcases.name, score.mode, score.testscore)
+            for score in diff['added']
+        ]
+        removed_ids = {score.testcases_id for score in diff['removed']}
+        if removed_ids:
+            # a deleted duplicate row does not remove its testcase from the plan
+            removed_ids -= set(TestScore.objects.filter(
+                testplan=testplan, testcases_id__in=removed_ids,
+            ).values_list('testcases_id', flat=True))
+        delta["removed"] = list(removed_ids)
+        delta["rescored"] = [
+            {"testcases_id": score.testcases_id, "mode": score.mode,
+             "testscore": float(score.testscore) if score.testscore else 0.0}
+            for score in diff['changed']
+        ]
+    return delta
+
+
+def record_plan_history(testplan, previous_fields, diff=None):
+    """
+    Store the next history version of ``testplan``; ``diff`` is the result of
+    ``PlanSerializer.apply_testcase_diff`` or ``None`` when testcases did not change.
+    Must run inside the transaction that locked the plan row.
+    """
+    version_number = next_version_number(testplan)
+    modules = list(testplan.modules.values_list('name', flat=True))
+    # history recorded before snapshots existed holds only deltas, so the first
+    # new version of such a plan is a snapshot to give later deltas a base
+    is_snapshot = is_snapshot_version(version_number) or not HistoryTestPlan.objects.filter(
+        testplan=testplan, is_snapshot=True
+    ).exists()
+    if is_snapshot:
+        other_changes = build_snapshot(testplan, modules)
+    else:
+        other_changes = build_delta(testplan, modules, previous_fields, diff)
+    return HistoryTestPlan.objects.create(
+        testplan=testplan,
+        version=f"{testplan.name} - v{version_number}",
+        version_number=version_number,
+        is_snapshot=is_snapshot,
+        changes_blob_id=store_blob(other_changes),
+    )
+
+
+def _apply_changes(state, changes, is_snapshot):
+    changes = changes or {}
+    fields = changes.get('fields')
+    if fields is None:
+        fields = {key: value for key, value in changes.items() if key not in LEGACY_KEYS}
+    if is_snapshot:
+        state['fields'] = dict(fields)
+        state['testcases'] = {tc.get('testcases_id'): dict(tc) for tc in changes.get('testcases', [])}
+    else:
+        state['fields'].update(fields)
+        for testcase_id in changes.get('removed', []):
+            state['testcases'].pop(testcase_id, None)
+        for tc in changes.get('added', []):
+            state['testcases'][tc.get('testcases_id')] = dict(tc)
+        for tc in changes.get('rescored', []):
+            entry = state['testcases'].get(tc.get('testcases_id'))
+            if entry is not None:
+                entry.update(mode=tc.get('mode'), testscore=tc.get('testscore'))
+    if 'modules' in changes:
+        state['modules'] = changes['modules']
+    return state
+
+
+def reconstruct_plan_version(testplan_id, version_number):
+    """
+    Rebuild the full plan state at ``version_number`` from the nearest snapshot
+    and the deltas after it. Returns ``None`` if the version does not exist.
+    """
+    history = HistoryTestPlan.objects.filter(testplan_id=testplan_id)
+    target = history.filter(version_number=version_number).only('id', 'version', 'created').first()
+    if target is None:
+        return None
+    snapshot = history.filter(
+        is_snapshot=True, version_number__lte=version_number
+    ).order_by('-version_number').values_list('version_number', flat=True).first()
+    rows = history.filter(
+        version_number__gte=snapshot or 1, version_number__lte=version_number
+    ).order_by('version_number').values_list('other_changes', 'changes_blob__data', 'changes_blob__codec', 'is_snapshot')
+    state = {'fields': {}, 'modules': [], 'testcases': {}}
+    for other_changes, blob, codec, is_snapshot in rows:
+        if blob is not None:
+            other_changes = decode_payload(blob, codec)
+        _apply_changes(state, other_changes, is_snapshot)
+    return {
+        "testplan_id": testplan_id,
+        "version": target.version,
+        "version_number": version_number,
+        "created": target.created,
+        **state['fields'],
+        "modules": state['modules'],
+        "testcases": list(state['testcases'].values()),
+    }
@@ -0,0 +1,200 @@
+"""
+Bulk ingestion of CI execution results into ``TestCaseMetric``.
+
+Results are aggregated per testcase in memory and applied with a single
+set-based ``UPDATE ... FROM (VALUES ...)`` per chunk. Rows are locked in id
+order first so concurrent ingestions cannot deadlock each other, and only the
+touched metric rows are locked, never the table.
+
+The average execution time is capped at the largest value the
+``execution_time`` column holds (99.99); testcases whose average was capped are
+reported back in ``clamped_testcases`` rather than silently truncated.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+
+from django.db import connections, router, transaction
+
+from apps.core.helpers import refresh_scores
+from apps.core.models import TestCaseMetric, TestCaseModel
+
+INGEST_CHUNK_SIZE = 5000
+PASS_VALUES = {'pass', 'passed', 'success', 'ok'}
+FAIL_VALUES = {'fail', 'failed', 'failure', 'error'}
+MAX_EXECUTION_TIME = Decimal('99.99')
+
+
+@dataclass
+class ResultAggregate:
+    runs: int = 0
+    failures: int = 0
+    duration: Decimal = Decimal(0)
+
+
+def _parse_outcome(result):
+    if isinstance(result.get('passed'), bool):
+        return result['passed']
+    outcome = str(result.get('status', '')).strip().lower()
+    if outcome in PASS_VALUES:
+        return True
+    if outcome in FAIL_VALUES:
+        return False
+    return None
+
+
+def _parse_duration(result):
+    """The entry's duration as a ``Decimal``, or ``None`` if it is malformed, NaN, infinite or negative."""
+    duration = result.get('duration') or 0
+    if isinstance(duration, bool):
+        return None
+    try:
+        duration = Decimal(str(duration).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    if not duration.is_finite() or duration < 0:
+        return None
+    return duration
+
+
+def aggregate_results(results):
+    """
+    Group raw results by testcase reference.
+
+    Returns ``(by_id, by_name, invalid)`` where the first two map a testcase id or
+    name to its ``ResultAggregate`` and ``invalid`` counts unusable entries:
+    unknown outcomes, missing references and malformed, non-finite or negative
+    durations.
+    """
+    by_id = defaultdict(ResultAggregate)
+    by_name = defaultdict(ResultAggregate)
+    invalid = 0
+    for result in results:
+        passed = _parse_outcome(result)
+        duration = _parse_duration(result)
+        reference = result.get('testcase_id', result.get('testcase'))
+        if passed is None or duration is None or reference in (None, ''):
+            invalid += 1
+            continue
+        if 'testcase_id' in result or isinstance(reference, int):
+            if not str(reference).isdigit():
+                invalid += 1
+                continue
+            aggregate = by_id[int(reference)]
+        else:
+            aggregate = by_name[str(reference)]
+        aggregate.runs += 1
+        aggregate.failures += 0 if passed else 1
+        aggregate.duration += duration
+    return by_id, by_name, invalid
+
+
+def resolve_testcases(by_id, by_name):
+    """Merge name keyed aggregates into id keyed ones with one ``IN`` query per kind."""
+    aggregates = {}
+    known_ids = set(TestCaseModel.objects.filter(id__in=list(by_id)).values_list('id', flat=True))
+    unknown = [testcase_id for testcase_id in by_id if testcase_id not in known_ids]
+    for testcase_id in known_ids:
+        aggregates[testcase_id] = by_id[testcase_id]
+    name_to_id = dict(TestCaseModel.objects.filter(name__in=list(by_name)).values_list('name', 'id'))
+    for name, aggregate in by_name.items():
+        testcase_id = name_to_id.get(name)
+        if testcase_id is None:
+            unknown.append(name)
+            continue
+        merged = aggregates.setdefault(testcase_id, ResultAggregate())
+        merged.runs += aggregate.runs
+        merged.failures += aggregate.failures
+        merged.duration += aggregate.duration
+    return aggregates, unknown
+
+
+def _update_metrics(cursor, table, rows):
+    """Returns ``(updated, clamped)`` testcase ids; ``clamped`` had their execution time capped."""
+    values = ', '.join(['(%s, %s, %s, %s)'] * len(rows))
+    params = [value for row in rows for value in row] + [MAX_EXECUTION_TIME, MAX_EXECUTION_TIME]
+    cursor.execute(
+        f"""
+        WITH v (testcase_id, runs, failures, duration) AS (VALUES {values}),
+        locked AS (
+            SELECT m.id, ROUND(
+                (COALESCE(m.execution_time, 0) * COALESCE(m.total_runs, 0) + v.duration::numeric)
+                / NULLIF(COALESCE(m.total_runs, 0) + v.runs::integer, 0), 2
+            ) AS execution_time
+            FROM {table} AS m
+            JOIN v ON m.testcase_id = v.testcase_id::bigint
+            ORDER BY m.id
+            FOR UPDATE OF m
+        )
+        UPDATE {table} AS m SET
+            total_runs = COALESCE(m.total_runs, 0) + v.runs::integer,
+            failure = COALESCE(m.failure, 0) + v.failures::integer,
+            failure_rate = ROUND(
+                100.0 * (COALESCE(m.failure, 0) + v.failures::integer)
+                / NULLIF(COALESCE(m.total_runs, 0) + v.runs::integer, 0), 2
+            ),
+            execution_time = LEAST(locked.execution_time, %s),
+            modified = NOW()
+        FROM v, locked
+        WHERE m.testcase_id = v.testcase_id::bigint AND m.id = locked.id
+        RETURNING m.testcase_id, COALESCE(locked.execution_time > %s, FALSE)
+        """,
+        params,
+    )
+    rows = cursor.fetchall()
+    return {row[0] for row in rows}, {row[0] for row in rows if row[1]}
+
+
+def apply_results(aggregates):
+    """
+    Apply aggregated results to ``TestCaseMetric``.
+
+    Returns ``(touched, clamped)``: the updated or created testcase ids and those
+    whose average execution time was capped at ``MAX_EXECUTION_TIME``.
+    """
+    if not aggregates:
+        return set(), set()
+    using = router.db_for_write(TestCaseMetric)
+    table = connections[using].ops.quote_name(TestCaseMetric._meta.db_table)
+    rows = [
+        (testcase_id, aggregate.runs, aggregate.failures, aggregate.duration)
+        for testcase_id, aggregate in sorted(aggregates.items())
+    ]
+    updated, clamped = set(), set()
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            for start in range(0, len(rows), INGEST_CHUNK_SIZE):
+                chunk_updated, chunk_clamped = _update_metrics(cursor, table, rows[start:start + INGEST_CHUNK_SIZE])
+                updated |= chunk_updated
+                clamped |= chunk_clamped
+        missing = [testcase_id for testcase_id, *_ in rows if testcase_id not in updated]
+        metrics = []
+        for testcase_id in missing:
+            aggregate = aggregates[testcase_id]
+            execution_time = round(aggregate.duration / aggregate.runs, 2)
+            if execution_time > MAX_EXECUTION_TIME:
+                clamped.add(testcase_id)
+            metrics.append(TestCaseMetric(
+                testcase_id=testcase_id,
+                total_runs=aggregate.runs,
+                failure=aggregate.failures,
+                failure_rate=round(Decimal(100 * aggregate.failures) / aggregate.runs, 2),
+                execution_time=min(execution_time, MAX_EXECUTION_TIME),
+            ))
+        TestCaseMetric.objects.bulk_create(metrics)
+    return updated | set(missing), clamped
+
+
+def ingest_results(results, recompute=True):
+    by_id, by_name, invalid = aggregate_results(results)
+    aggregates, unknown = resolve_testcases(by_id, by_name)
+    touched, clamped = apply_results(aggregates)
+    if recompute and touched:
+        refresh_scores(touched)
+    return {
+        "received": len(results),
+        "invalid": invalid,
+        "testcases_updated": len(touched),
+        "unknown_testcases": unknown,
+        "clamped_testcases": sorted(clamped),
+    }
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.archive import ArchiveError, ARCHIVE_BATCH_SIZE, archive_stale_plans, get_archivable_plans, \
+    restore_plans, vacuum_hot_tables
+
+
+class Command(BaseCommand):
+
+    help = "Move inactive and stale test plans to cold storage, or restore archived plans."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inactive-days', type=int, help="Archive inactive plans untouched for this many days")
+        parser.add_argument('--stale-days', type=int, help="Archive any plan untouched for this many days")
+        parser.add_argument('--batch-size', type=int, default=ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only list the plans that would be archived")
+        parser.add_argument('--vacuum', action='store_true', help="VACUUM ANALYZE the hot tables afterwards")
+        parser.add_argument('--restore', type=int, nargs='+', metavar='PLAN_ID', help="Restore archived plans")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                restored = restore_plans(options['restore'])
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Restored {restored} plan(s)"))
+            return
+        if options['dry_run']:
+            plan_ids = list(get_archivable_plans(options['inactive_days'], options['stale_days']))
+            self.stdout.write(f"{len(plan_ids)} plan(s) to archive: {', '.join(map(str, plan_ids))}")
+            return
+        archived = archive_stale_plans(options['inactive_days'], options['stale_days'], options['batch_size'])
+        if options['vacuum'] and archived:
+            vacuum_hot_tables()
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} plan(s)"))
@@ -0,0 +1,65 @@
+import asyncio
+import statistics
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+
+    help = ("Fire concurrent requests at the AI chat endpoint of a running server and report "
+            "throughput and latency, e.g. to compare a WSGI deployment with an ASGI one.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help="Chat endpoint, e.g. http://127.0.0.1:8000/api/ai-test-plan")
+        parser.add_argument('--requests', type=int, default=100, help="Total number of requests")
+        parser.add_argument('--concurrency', type=int, default=50, help="Requests in flight at once")
+        parser.add_argument('--message', default="Create a test plan for Login with 5 testcases")
+        parser.add_argument('--timeout', type=float, default=120.0)
+
+    async def _run(self, options):
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies, rejected, errors = [], Counter(), Counter()
+
+        async def send(client):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    # a fresh session per request, as sessions are UUID keyed and a turn saves to its session
+                    response = await client.post(options['url'], json={
+                        "user_msg": options['message'], "session_id": str(uuid.uuid4()),
+                    })
+                except httpx.HTTPError as e:
+                    errors[type(e).__name__] += 1
+                    return
+                if not response.is_success:
+                    rejected[response.status_code] += 1
+                    return
+                latencies.append(time.perf_counter() - started)
+
+        limits = httpx.Limits(max_connections=options['concurrency'])
+        async with httpx.AsyncClient(timeout=options['timeout'], limits=limits) as client:
+            started = time.perf_counter()
+            await asyncio.gather(*(send(client) for _ in range(options['requests'])))
+            return latencies, rejected, errors, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError("--requests and --concurrency must be positive")
+        latencies, rejected, errors, elapsed = asyncio.run(self._run(options))
+        self.stdout.write(f"{len(latencies)} succeeded, {sum(rejected.values())} rejected, "
+                          f"{sum(errors.values())} transport error(s) in {elapsed:.2f}s "
+                          f"({len(latencies) / elapsed:.2f} req/s)")
+        if rejected:
+            self.stdout.write("rejected: " + ", ".join(
+                f"HTTP {code} x{count}" for code, count in sorted(rejected.items())))
+        if errors:
+            self.stdout.write("transport errors: " + ", ".join(
+                f"{name} x{count}" for name, count in sorted(errors.items())))
+        if latencies:
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            self.stdout.write(f"latency p50 {statistics.median(latencies):.2f}s, p95 {p95:.2f}s, "
+                              f"max {max(latencies):.2f}s")
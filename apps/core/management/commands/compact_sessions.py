@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from apps.core.retention import RETENTION_BATCH_SIZE, compact_sessions, get_expired_drafts, get_idle_sessions, \
+    get_idle_threads
+
+
+class Command(BaseCommand):
+
+    help = ("Delete idle AI chat sessions and expired draft versions in bounded batches. "
+            "Meant to run on a schedule, e.g. nightly from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-days', type=int, help="Delete sessions idle for this many days")
+        parser.add_argument('--version-ttl-days', type=int, help="Delete draft versions older than this many days")
+        parser.add_argument('--checkpoint-ttl-days', type=int, help="Evict chat checkpoints idle for this many days")
+        parser.add_argument('--batch-size', type=int, default=RETENTION_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be deleted")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            sessions = get_idle_sessions(options['ttl_days']).count()
+            drafts = get_expired_drafts(options['version_ttl_days']).count()
+            threads = get_idle_threads(options['checkpoint_ttl_days']).count()
+            self.stdout.write(f"{sessions} idle session(s), {drafts} expired draft version(s) "
+                              f"and {threads} idle chat thread(s) to delete")
+            return
+        summary = compact_sessions(options['ttl_days'], options['version_ttl_days'], options['batch_size'],
+                                   options['checkpoint_ttl_days'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {summary['sessions']} session(s) with {summary['versions']} version(s), "
+            f"{summary['drafts']} expired draft version(s) and {summary['checkpoints']} chat checkpoint(s)"
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.core.exports import Exporter, ExportError, EXPORT_DATASETS, EXPORT_FORMATS, TESTCASE_FILTER_PARAMS
+
+
+class Command(BaseCommand):
+
+    help = "Stream the testcase repository, test plans or AI session versions to CSV, NDJSON or Parquet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(EXPORT_DATASETS))
+        parser.add_argument('--format', dest='file_format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--output', help="Output file path, defaults to stdout for text formats")
+        parser.add_argument('--plan', help="Comma separated test plan ids (plans dataset)")
+        parser.add_argument('--session', help="AI session id (sessions dataset)")
+        for param in TESTCASE_FILTER_PARAMS:
+            parser.add_argument(f'--{param.replace("_", "-")}', dest=param, help=f"Testcase filter on {param}")
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in ('plan', 'session', *TESTCASE_FILTER_PARAMS) if options.get(key)}
+        try:
+            exporter = Exporter(options['dataset'], options['file_format'], params)
+        except ExportError as e:
+            raise CommandError(str(e))
+        binary = options['file_format'] == 'parquet'
+        if binary and not options['output']:
+            raise CommandError("--output is required for parquet exports")
+        if options['output']:
+            with open(options['output'], 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as file:
+                for chunk in exporter.stream():
+                    file.write(chunk)
+            self.stdout.write(self.style.SUCCESS(f"Exported {options['dataset']} to {options['output']}"))
+        else:
+            for chunk in exporter.stream():
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from apps.core.models import LLMCacheEntry
+
+
+class Command(BaseCommand):
+
+    help = "Show the LLM response cache per prompt stage, evict expired entries or clear it."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true',
+                            help="Delete expired and least recently used entries beyond the size limit")
+        parser.add_argument('--clear', action='store_true', help="Delete every entry")
+        parser.add_argument('--stage', help="Only clear the entries of this stage")
+
+    def handle(self, *args, **options):
+        from aimode.core.llm_cache import cache_stats, evict_entries
+
+        if options['clear']:
+            queryset = LLMCacheEntry.objects.all()
+            if options['stage']:
+                queryset = queryset.filter(stage=options['stage'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {queryset.delete()[0]} cache entry(ies)"))
+        elif options['evict']:
+            self.stdout.write(self.style.SUCCESS(f"Evicted {evict_entries()} cache entry(ies)"))
+        for stage, stats in cache_stats().items():
+            self.stdout.write(f"{stage}: {stats['entries']} entry(ies), {stats['bytes']} bytes, "
+                              f"{stats['stored_hits']} hit(s)")
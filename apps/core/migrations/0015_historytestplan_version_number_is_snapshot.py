@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:19
+
+from django.db import migrations, models
+
+
+def number_existing_history(apps, schema_editor):
+    HistoryTestPlan = apps.get_model('core', 'HistoryTestPlan')
+    db_alias = schema_editor.connection.alias
+    counters = {}
+    rows = []
+    for history in HistoryTestPlan.objects.using(db_alias).order_by('testplan_id', 'created', 'id'):
+        counters[history.testplan_id] = counters.get(history.testplan_id, 0) + 1
+        history.version_number = counters[history.testplan_id]
+        history.is_snapshot = isinstance(history.other_changes, dict) and 'testcases' in history.other_changes
+        rows.append(history)
+    HistoryTestPlan.objects.using(db_alias).bulk_update(rows, ['version_number', 'is_snapshot'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_testplansession_version_info'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historytestplan',
+            name='is_snapshot',
+            field=models.BooleanField(default=False, help_text='Full copy of the plan instead of a delta'),
+        ),
+        migrations.AddField(
+            model_name='historytestplan',
+            name='version_number',
+            field=models.PositiveIntegerField(default=1, verbose_name='Version Number'),
+        ),
+        migrations.RunPython(number_existing_history, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='historytestplan',
+            constraint=models.UniqueConstraint(fields=('testplan', 'version_number'), name='unique_history_version_per_plan'),
+        ),
+    ]
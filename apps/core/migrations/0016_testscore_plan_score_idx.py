@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_historytestplan_version_number_is_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testscore',
+            index=models.Index(fields=['testplan', 'testscore', 'id'], name='testscore_plan_score_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:25
+
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_testscore_plan_score_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTestPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('plan_id', models.BigIntegerField(unique=True, verbose_name='Plan ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Name')),
+                ('reason', models.CharField(choices=[('inactive', 'Inactive'), ('stale', 'Stale')], default='inactive', max_length=20)),
+                ('plan', models.JSONField(default=dict)),
+                ('modules', models.JSONField(default=list)),
+                ('scores', models.JSONField(default=list)),
+                ('history', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Archived Test Plan',
+                'verbose_name_plural': 'Archived Test Plans',
+                'get_latest_by': 'modified',
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:27
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+def backfill_version_testcases(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    TestPlanSession = apps.get_model('core', 'TestPlanSession')
+    SessionVersionTestcase = apps.get_model('core', 'SessionVersionTestcase')
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(f"""
+        INSERT INTO {quote(SessionVersionTestcase._meta.db_table)}
+            (created, modified, version_id, position, testcase_id, name, module, priority, mode, testscore)
+        SELECT NOW(), NOW(), s.id, e.ord - 1,
+               CASE WHEN e.elem->>'id' ~ '^[0-9]+$' THEN (e.elem->>'id')::bigint END,
+               LEFT(COALESCE(e.elem->>'testcase', e.elem->>'name', ''), 500),
+               LEFT(CASE WHEN jsonb_typeof(e.elem->'modules') = 'array'
+                         THEN (SELECT string_agg(m, ', ') FROM jsonb_array_elements_text(e.elem->'modules') m)
+                         ELSE COALESCE(e.elem->>'modules', e.elem->>'module', '') END, 255),
+               LEFT(COALESCE(e.elem->>'priority', ''), 20),
+               LEFT(COALESCE(e.elem->>'mode', ''), 20),
+               CASE WHEN e.elem->>'testscore' ~ '^-?[0-9]{{1,6}}(\\.[0-9]+)?$'
+                    THEN (e.elem->>'testscore')::numeric ELSE 0 END
+        FROM {quote(TestPlanSession._meta.db_table)} s
+        CROSS JOIN LATERAL jsonb_array_elements(
+            CASE WHEN jsonb_typeof(s.testcase_data) = 'array' THEN s.testcase_data ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS e(elem, ord)
+        WHERE jsonb_typeof(e.elem) = 'object'
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_archivedtestplan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionVersionTestcase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('position', models.PositiveIntegerField(default=0)),
+                ('testcase_id', models.BigIntegerField(blank=True, null=True, verbose_name='Testcase ID')),
+                ('name', models.CharField(blank=True, max_length=500, null=True, verbose_name='Name')),
+                ('module', models.CharField(blank=True, max_length=255, null=True, verbose_name='Module')),
+                ('priority', models.CharField(blank=True, max_length=20, null=True)),
+                ('mode', models.CharField(blank=True, max_length=20, null=True)),
+                ('testscore', models.DecimalField(blank=True, decimal_places=4, default=0, max_digits=10, null=True)),
+                ('version', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='version_testcases', to='core.testplansession')),
+            ],
+            options={
+                'ordering': ('version', 'position'),
+                'get_latest_by': 'modified',
+                'abstract': False,
+                'indexes': [models.Index(fields=['version', 'module'], name='session_tc_version_module_idx'), models.Index(fields=['version', 'priority'], name='session_tc_version_prio_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_version_testcases, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:29
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def renumber_non_integer_versions(apps, schema_editor):
+    """Give versions like '1.0.0' the next free integer of their session so the column can be cast."""
+    TestPlanSession = apps.get_model('core', 'TestPlanSession')
+    db_alias = schema_editor.connection.alias
+    latest = {}
+    pending = []
+    for version in TestPlanSession.objects.using(db_alias).order_by('session_id', 'created', 'id'):
+        value = (version.version or '').strip()
+        if value.isdigit():
+            latest[version.session_id] = max(latest.get(version.session_id, 0), int(value))
+        else:
+            pending.append(version)
+    for version in pending:
+        if not (version.version or '').strip():
+            version.version = None
+            continue
+        latest[version.session_id] = latest.get(version.session_id, 0) + 1
+        version.version = str(latest[version.session_id])
+    TestPlanSession.objects.using(db_alias).bulk_update(pending, ['version'], batch_size=500)
+
+
+def set_version_counters(apps, schema_editor):
+    AISessionStore = apps.get_model('core', 'AISessionStore')
+    TestPlanSession = apps.get_model('core', 'TestPlanSession')
+    db_alias = schema_editor.connection.alias
+    latest = models.Subquery(
+        TestPlanSession.objects.using(db_alias).filter(session_id=models.OuterRef('pk'))
+        .values('session_id').annotate(latest=models.Max('version')).values('latest')[:1]
+    )
+    AISessionStore.objects.using(db_alias).update(version_counter=Coalesce(latest, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_sessionversiontestcase'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aisessionstore',
+            name='version_counter',
+            field=models.PositiveIntegerField(default=0, help_text='Last version number allocated'),
+        ),
+        migrations.RunPython(renumber_non_integer_versions, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='testplansession',
+            name='version',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Version'),
+        ),
+        migrations.RunPython(set_version_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_current_versions(apps, schema_editor):
+    """Point each session at its most recent saved version, matching the old status column."""
+    AISessionStore = apps.get_model('core', 'AISessionStore')
+    TestPlanSession = apps.get_model('core', 'TestPlanSession')
+    db_alias = schema_editor.connection.alias
+    latest_saved = TestPlanSession.objects.using(db_alias).filter(
+        session_id=models.OuterRef('pk'), status='saved'
+    ).order_by('-created', '-id').values('id')[:1]
+    AISessionStore.objects.using(db_alias).update(current_version=models.Subquery(latest_saved))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_session_version_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aisessionstore',
+            name='current_version',
+            field=models.ForeignKey(blank=True, help_text='The saved version; every other version is a draft', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.testplansession'),
+        ),
+        migrations.RunPython(set_current_versions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:36
+
+import hashlib
+import json
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def _move_to_blobs(model, column, blob_field, PayloadBlob, db_alias):
+    blobs = {}
+    pending = []
+    rows = model.objects.using(db_alias).filter(**{f'{column}__isnull': False}).only('id', column)
+    for row in rows.iterator(chunk_size=500):
+        raw = json.dumps(getattr(row, column), sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder).encode()
+        digest = hashlib.sha256(raw).hexdigest()
+        blob = blobs.get(digest)
+        if blob is None:
+            blob = PayloadBlob.objects.using(db_alias).filter(digest=digest).first() or PayloadBlob.objects.using(
+                db_alias
+            ).create(
+                digest=digest,
+                codec='zstd' if zstandard else 'raw',
+                data=zstandard.ZstdCompressor(level=3).compress(raw) if zstandard else raw,
+                size=len(raw),
+            )
+            blobs[digest] = blob
+        blob.ref_count += 1
+        setattr(row, f'{blob_field}_id', blob.id)
+        setattr(row, column, None)
+        pending.append(row)
+    model.objects.using(db_alias).bulk_update(pending, [blob_field, column], batch_size=500)
+    PayloadBlob.objects.using(db_alias).bulk_update(blobs.values(), ['ref_count'], batch_size=500)
+
+
+def move_payloads_to_blobs(apps, schema_editor):
+    """Store existing session testcases and plan history changes as shared blobs."""
+    PayloadBlob = apps.get_model('core', 'PayloadBlob')
+    db_alias = schema_editor.connection.alias
+    _move_to_blobs(apps.get_model('core', 'TestPlanSession'), 'testcase_data', 'testcase_blob', PayloadBlob, db_alias)
+    _move_to_blobs(apps.get_model('core', 'HistoryTestPlan'), 'other_changes', 'changes_blob', PayloadBlob, db_alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_aisessionstore_current_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayloadBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('digest', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('codec', models.CharField(choices=[('zstd', 'Zstandard'), ('raw', 'Uncompressed')], default='zstd', max_length=10)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Uncompressed Size')),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'get_latest_by': 'modified',
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='historytestplan',
+            name='changes_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.payloadblob'),
+        ),
+        migrations.AddField(
+            model_name='testplansession',
+            name='testcase_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.payloadblob'),
+        ),
+        migrations.RunPython(move_payloads_to_blobs, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:53
+
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_agentcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='SHA-256')),
+                ('stage', models.CharField(max_length=50)),
+                ('codec', models.CharField(choices=[('zstd', 'Zstandard'), ('raw', 'Uncompressed')], default='zstd', max_length=10)),
+                ('data', models.BinaryField()),
+                ('size', models.PositiveIntegerField(default=0, verbose_name='Uncompressed Size')),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('expires', models.DateTimeField()),
+            ],
+            options={
+                'get_latest_by': 'modified',
+                'abstract': False,
+                'indexes': [models.Index(fields=['modified'], name='llm_cache_modified_idx'), models.Index(fields=['expires'], name='llm_cache_expires_idx')],
+            },
+        ),
+    ]
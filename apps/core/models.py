@@ -131,10 +131,37 @@ class RPNValue(SingletonModel, TimeStampedModel):
         return Decimal(str(self.max_value or 0))
 
 
+class PayloadBlob(TimeStampedModel):
+    """
+    Compressed JSON payload stored once per distinct content and shared by
+    every row that references it; ``ref_count`` tracks the number of references.
+    """
+
+    class CodecChoices(models.TextChoices):
+        ZSTD = 'zstd', _('Zstandard')
+        RAW = 'raw', _('Uncompressed')
+
+    digest = models.CharField(_('SHA-256'), max_length=64, unique=True)
+    codec = models.CharField(choices=CodecChoices.choices, max_length=10, default=CodecChoices.ZSTD)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField(_('Uncompressed Size'), default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.digest
+
+    def load(self):
+        from apps.core.blobs import decode_payload
+        return decode_payload(self.data, self.codec)
+
+
 class AISessionStore(TimeStampedModel):
 
     session_id = models.UUIDField(default=uuid.uuid4, primary_key=True, editable=False)
     is_active = models.BooleanField(default=True)
+    version_counter = models.PositiveIntegerField(default=0, help_text="Last version number allocated")
+    current_version = models.ForeignKey('TestPlanSession', on_delete=models.SET_NULL, blank=True, null=True,
+                                        related_name='+', help_text="The saved version; every other version is a draft")
 
     def __str__(self):
         return str(self.session_id)
@@ -150,22 +177,121 @@ class TestPlanSession(TimeStampedModel):
 
     session = models.ForeignKey(AISessionStore, on_delete=models.CASCADE, related_name='sessions', blank=True, null=True)
     context = models.TextField(_('Context'), blank=True, null=True)
-    version = models.CharField(_('Version'), max_length=255, blank=True, null=True)
+    version = models.PositiveIntegerField(_('Version'), blank=True, null=True)
     version_info = models.TextField(_('Version Info'), blank=True, null=True)
     name = models.CharField(_('Name'), max_length=255)
     description = models.TextField(_('Description'), blank=True, null=True)
     modules = models.ManyToManyField(Module, blank=True, related_name='generated_modules', null=True)
     output_counts = models.IntegerField(_('Number of Cases'), default=0, blank=True, null=True,)
     testcase_data = models.JSONField(_('Test Case Data'), blank=True, null=True)
+    testcase_blob = models.ForeignKey(PayloadBlob, on_delete=models.PROTECT, blank=True, null=True, related_name='+')
     status = models.CharField(choices=StatusChoices.choices, blank=True, null=True, default=StatusChoices.DRAFT)
 
     def __str__(self):
         return f'{self.name} - {self.version}'
 
+    def get_testcase_data(self):
+        return self.testcase_blob.load() if self.testcase_blob_id else self.testcase_data
+
     class Meta:
         unique_together = ('session', 'version')
 
 
+class SessionVersionTestcase(TimeStampedModel):
+    """One testcase of a saved AI session version, normalised out of ``testcase_data``."""
+
+    version = models.ForeignKey(TestPlanSession, on_delete=models.CASCADE, related_name='version_testcases')
+    position = models.PositiveIntegerField(default=0)
+    testcase_id = models.BigIntegerField(_('Testcase ID'), blank=True, null=True)
+    name = models.CharField(_('Name'), max_length=500, blank=True, null=True)
+    module = models.CharField(_('Module'), max_length=255, blank=True, null=True)
+    priority = models.CharField(max_length=20, blank=True, null=True)
+    mode = models.CharField(max_length=20, blank=True, null=True)
+    testscore = models.DecimalField(default=0, blank=True, null=True, decimal_places=4, max_digits=10)
+
+    def __str__(self):
+        return f"{self.version} - {self.name}"
+
+    class Meta(TimeStampedModel.Meta):
+        ordering = ('version', 'position')
+        indexes = [
+            models.Index(fields=['version', 'module'], name='session_tc_version_module_idx'),
+            models.Index(fields=['version', 'priority'], name='session_tc_version_prio_idx'),
+        ]
+
+
+class AgentCheckpoint(TimeStampedModel):
+    """LangGraph checkpoint of an AI chat thread; ``thread_id`` is the session id."""
+
+    thread_id = models.CharField(max_length=255)
+    checkpoint_ns = models.CharField(max_length=255, blank=True, default='')
+    checkpoint_id = models.CharField(max_length=64)
+    parent_checkpoint_id = models.CharField(max_length=64, blank=True, null=True)
+    checkpoint_type = models.CharField(max_length=50)
+    checkpoint = models.BinaryField()
+    metadata = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"{self.thread_id} - {self.checkpoint_id}"
+
+    class Meta(TimeStampedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['thread_id', 'checkpoint_ns', 'checkpoint_id'],
+                                    name='unique_agent_checkpoint'),
+        ]
+        indexes = [
+            models.Index(fields=['modified'], name='agent_checkpoint_modified_idx'),
+        ]
+
+
+class AgentCheckpointWrite(models.Model):
+    """Pending write of a task against an ``AgentCheckpoint``."""
+
+    thread_id = models.CharField(max_length=255)
+    checkpoint_ns = models.CharField(max_length=255, blank=True, default='')
+    checkpoint_id = models.CharField(max_length=64)
+    task_id = models.CharField(max_length=64)
+    task_path = models.CharField(max_length=255, blank=True, default='')
+    idx = models.IntegerField()
+    channel = models.CharField(max_length=255)
+    value_type = models.CharField(max_length=50)
+    value = models.BinaryField()
+
+    def __str__(self):
+        return f"{self.thread_id} - {self.checkpoint_id} - {self.channel}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['thread_id', 'checkpoint_ns', 'checkpoint_id', 'task_id', 'idx'],
+                                    name='unique_agent_checkpoint_write'),
+        ]
+
+
+class LLMCacheEntry(TimeStampedModel):
+    """
+    Cached LLM generations of a prompt stage; ``key`` hashes the model settings
+    and the messages. ``modified`` is bumped on every hit for LRU eviction.
+    """
+
+    key = models.CharField(_('SHA-256'), max_length=64, unique=True)
+    stage = models.CharField(max_length=50)
+    codec = models.CharField(choices=PayloadBlob.CodecChoices.choices, max_length=10,
+                             default=PayloadBlob.CodecChoices.ZSTD)
+    data = models.BinaryField()
+    size = models.PositiveIntegerField(_('Uncompressed Size'), default=0)
+    hits = models.PositiveIntegerField(default=0)
+    expires = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.stage} - {self.key}"
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['modified'], name='llm_cache_modified_idx'),
+            models.Index(fields=['expires'], name='llm_cache_expires_idx'),
+        ]
+
+
 class TestPlan(TimeStampedModel):
 
     class ModeChoices(models.TextChoices):
@@ -212,14 +338,25 @@ class TestCaseScoreModel(TimeStampedModel):
 class HistoryTestPlan(TimeStampedModel):
 
     version = models.CharField(_('Version'), max_length=100)
+    version_number = models.PositiveIntegerField(_('Version Number'), default=1)
+    is_snapshot = models.BooleanField(default=False, help_text="Full copy of the plan instead of a delta")
     testplan = models.ForeignKey(TestPlan, on_delete=models.CASCADE, related_name='history_plans', to_field='id')
     other_changes = JSONField(blank=True, null=True, help_text="Store other changes in JSON format")
+    changes_blob = models.ForeignKey(PayloadBlob, on_delete=models.PROTECT, blank=True, null=True, related_name='+')
 
     def __str__(self):
         return f"{self.testplan.name} - {self.version}"
     
     def get_version(self):
         return self.version
+
+    def get_other_changes(self):
+        return self.changes_blob.load() if self.changes_blob_id else self.other_changes
+
+    class Meta(TimeStampedModel.Meta):
+        constraints = [
+            models.UniqueConstraint(fields=['testplan', 'version_number'], name='unique_history_version_per_plan'),
+        ]
     
 
 # --------------------------------------------------------------
@@ -234,4 +371,35 @@ class TestScore(TimeStampedModel):
 
     def __str__(self): 
         return self.testplan.name
+
+    class Meta(TimeStampedModel.Meta):
+        indexes = [
+            models.Index(fields=['testplan', 'testscore', 'id'], name='testscore_plan_score_idx'),
+        ]
+
+
+class ArchivedTestPlan(TimeStampedModel):
+    """
+    Cold storage copy of a test plan moved out of the hot tables, holding the
+    plan row, its module ids, ``TestScore`` rows and ``HistoryTestPlan`` rows as JSON.
+    """
+
+    class ReasonChoices(models.TextChoices):
+        INACTIVE = 'inactive', _('Inactive')
+        STALE = 'stale', _('Stale')
+
+    plan_id = models.BigIntegerField(_('Plan ID'), unique=True)
+    name = models.CharField(_('Name'), max_length=255)
+    reason = models.CharField(choices=ReasonChoices.choices, max_length=20, default=ReasonChoices.INACTIVE)
+    plan = JSONField(default=dict)
+    modules = JSONField(default=list)
+    scores = JSONField(default=list)
+    history = JSONField(default=list)
+
+    def __str__(self):
+        return f"{self.name} ({self.plan_id})"
+
+    class Meta(TimeStampedModel.Meta):
+        verbose_name = _('Archived Test Plan')
+        verbose_name_plural = _('Archived Test Plans')
     
\ No newline at end of file
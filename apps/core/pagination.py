@@ -1,6 +1,9 @@
 import math
+from decimal import Decimal
+from django.db.models import Value
+from django.db.models.functions import Coalesce
 from rest_framework.views import Response
-from rest_framework.pagination import PageNumberPagination, LimitOffsetPagination
+from rest_framework.pagination import PageNumberPagination, LimitOffsetPagination, CursorPagination
 from collections import OrderedDict
 from rest_framework import status
 from urllib.parse import quote
@@ -140,3 +143,72 @@ class CustomLimitOffsetPagination(LimitOffsetPagination):
             'message': 'Success',
             'page_count': self.get_limit(self.request),
         })
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor (keyset) pagination sorted by one of ``sort_fields``; ``?sort=-testscore``
+    sorts descending. Pages are fetched with ``WHERE sort_key > cursor`` instead of
+    an OFFSET, so a page costs the same wherever it is. The exception is a run of
+    rows sharing the sort value of the page boundary: DRF skips past those with an
+    offset (capped at ``offset_cutoff``), so a low cardinality sort such as
+    ``priority`` still pays for the rows it skips.
+
+    Nullable sort fields are listed in ``null_sort_values`` and sorted by
+    ``COALESCE(field, value)``, as a NULL cursor position cannot be compared. The
+    value must render like the column's own values (e.g. the same decimal scale)
+    so a row's position is the same whether or not it was NULL.
+    """
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    sort_query_param = 'sort'
+    sort_fields = ('id',)
+    null_sort_values = {}
+    ordering = 'id'
+
+    def get_sort(self, request):
+        sort = request.query_params.get(self.sort_query_param, self.ordering)
+        if sort.lstrip('-') not in self.sort_fields:
+            sort = self.ordering
+        return sort
+
+    def paginate_queryset(self, queryset, request, view=None):
+        field = self.get_sort(request).lstrip('-')
+        if field in self.null_sort_values:
+            queryset = queryset.annotate(**{
+                f'{field}_sort': Coalesce(field, Value(self.null_sort_values[field])),
+            })
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        sort = self.get_sort(request)
+        if sort.lstrip('-') in self.null_sort_values:
+            sort = f'{sort}_sort'
+        tie_breaker = '-id' if sort.startswith('-') else 'id'
+        return (sort,) if sort.lstrip('-') == 'id' else (sort, tie_breaker)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('page_size', self.get_page_size(self.request)),
+            ('status', True),
+            ('status_code', status.HTTP_200_OK),
+            ('message', 'Success'),
+            ('data', data)
+        ]))
+
+
+class PlanTestcasePagination(KeysetPagination):
+
+    sort_fields = ('id', 'testscore', 'name', 'priority', 'mode', 'modules')
+    null_sort_values = {'testscore': Decimal('0.0000'), 'name': '', 'priority': '', 'mode': '', 'modules': ''}
+
+
+class SessionTestcasePagination(KeysetPagination):
+
+    sort_fields = ('position', 'testscore', 'name', 'priority', 'module')
+    null_sort_values = {'testscore': Decimal('0.0000'), 'name': '', 'priority': '', 'module': ''}
+    ordering = 'position'
@@ -0,0 +1,129 @@
+"""
+Retention of AI chat sessions and their saved versions.
+
+Idle sessions are deleted after ``AI_SESSION_TTL_DAYS`` together with their
+versions and chat checkpoints, and draft versions older than ``AI_SESSION_VERSION_TTL_DAYS`` are
+dropped from live sessions so only the current (saved) version is kept. Rows are
+deleted in bounded batches, one short transaction each, so a run never holds
+long locks and the tables and their indexes stay small. Deleted versions drop
+their reference to the shared testcase payload blob. Chat checkpoints of threads
+idle for ``AGENT_CHECKPOINT_TTL_DAYS`` are evicted as well.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from apps.core.blobs import release_blobs
+from apps.core.models import AgentCheckpoint, AgentCheckpointWrite, AISessionStore, SessionVersionTestcase, \
+    TestPlanSession
+
+RETENTION_BATCH_SIZE = 500
+
+
+def _tables(ops):
+    return {
+        'session': ops.quote_name(AISessionStore._meta.db_table),
+        'version': ops.quote_name(TestPlanSession._meta.db_table),
+        'modules': ops.quote_name(TestPlanSession.modules.through._meta.db_table),
+        'testcase': ops.quote_name(SessionVersionTestcase._meta.db_table),
+    }
+
+
+def get_idle_sessions(ttl_days=None):
+    """Sessions with no activity and no new version for ``ttl_days``."""
+    ttl_days = settings.AI_SESSION_TTL_DAYS if ttl_days is None else ttl_days
+    cutoff = timezone.now() - timedelta(days=ttl_days)
+    return AISessionStore.objects.annotate(last_version=Max('sessions__created')).filter(
+        Q(last_version__isnull=True) | Q(last_version__lt=cutoff), modified__lt=cutoff,
+    ).order_by('modified').values_list('session_id', flat=True)
+
+
+def get_expired_drafts(version_ttl_days=None):
+    """Versions older than ``version_ttl_days`` that are not the current version of their session."""
+    version_ttl_days = settings.AI_SESSION_VERSION_TTL_DAYS if version_ttl_days is None else version_ttl_days
+    cutoff = timezone.now() - timedelta(days=version_ttl_days)
+    return TestPlanSession.objects.filter(created__lt=cutoff).exclude(
+        session__current_version=F('pk')
+    ).order_by('id').values_list('id', flat=True)
+
+
+def _delete_versions(cursor, t, where, params):
+    cursor.execute(f"DELETE FROM {t['testcase']} WHERE version_id IN (SELECT id FROM {t['version']} WHERE {where})",
+                   params)
+    cursor.execute(f"DELETE FROM {t['modules']} WHERE testplansession_id IN "
+                   f"(SELECT id FROM {t['version']} WHERE {where})", params)
+    cursor.execute(f"DELETE FROM {t['version']} WHERE {where} RETURNING testcase_blob_id", params)
+    rows = cursor.fetchall()
+    release_blobs([row[0] for row in rows])
+    return len(rows)
+
+
+def delete_sessions(session_ids):
+    """Delete the given sessions and all their versions; returns ``(sessions, versions)`` deleted."""
+    using = router.db_for_write(AISessionStore)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        t = _tables(connections[using].ops)
+        cursor.execute(
+            f"SELECT session_id FROM {t['session']} WHERE session_id = ANY(%s::uuid[]) "
+            f"ORDER BY session_id FOR UPDATE SKIP LOCKED",
+            [[str(session_id) for session_id in session_ids]],
+        )
+        ids = [str(row[0]) for row in cursor.fetchall()]
+        if not ids:
+            return 0, 0
+        versions = _delete_versions(cursor, t, "session_id = ANY(%s::uuid[])", [ids])
+        cursor.execute(f"DELETE FROM {t['session']} WHERE session_id = ANY(%s::uuid[])", [ids])
+        deleted = cursor.rowcount
+    delete_checkpoints(ids)
+    return deleted, versions
+
+
+def delete_versions(version_ids):
+    """Delete the given draft versions, never a session's current version."""
+    using = router.db_for_write(TestPlanSession)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        t = _tables(connections[using].ops)
+        return _delete_versions(
+            cursor, t,
+            f"id = ANY(%s) AND id NOT IN (SELECT current_version_id FROM {t['session']} "
+            f"WHERE current_version_id IS NOT NULL)",
+            [list(version_ids)],
+        )
+
+
+def get_idle_threads(ttl_days=None):
+    """Chat threads whose latest checkpoint is older than ``ttl_days``."""
+    ttl_days = settings.AGENT_CHECKPOINT_TTL_DAYS if ttl_days is None else ttl_days
+    cutoff = timezone.now() - timedelta(days=ttl_days)
+    return AgentCheckpoint.objects.values('thread_id').annotate(
+        last_checkpoint=Max('modified'),
+    ).filter(last_checkpoint__lt=cutoff).order_by('thread_id').values_list('thread_id', flat=True)
+
+
+def delete_checkpoints(thread_ids):
+    """Delete the LangGraph checkpoints and pending writes of the given chat threads."""
+    thread_ids = [str(thread_id) for thread_id in thread_ids]
+    with transaction.atomic(using=router.db_for_write(AgentCheckpoint)):
+        AgentCheckpointWrite.objects.filter(thread_id__in=thread_ids).delete()
+        return AgentCheckpoint.objects.filter(thread_id__in=thread_ids).delete()[0]
+
+
+def _in_batches(ids, batch_size, delete):
+    ids = list(ids)
+    for start in range(0, len(ids), batch_size):
+        yield delete(ids[start:start + batch_size])
+
+
+def compact_sessions(ttl_days=None, version_ttl_days=None, batch_size=RETENTION_BATCH_SIZE,
+                     checkpoint_ttl_days=None):
+    """Expire idle sessions, then drop expired drafts and chat checkpoints; returns the deleted row counts."""
+    summary = {'sessions': 0, 'versions': 0, 'drafts': 0, 'checkpoints': 0}
+    for sessions, versions in _in_batches(get_idle_sessions(ttl_days), batch_size, delete_sessions):
+        summary['sessions'] += sessions
+        summary['versions'] += versions
+    summary['drafts'] = sum(_in_batches(get_expired_drafts(version_ttl_days), batch_size, delete_versions))
+    summary['checkpoints'] = sum(_in_batches(get_idle_threads(checkpoint_ttl_days), batch_size, delete_checkpoints))
+    return summary
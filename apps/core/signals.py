@@ -1,9 +1,27 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from apps.core.blobs import release_blobs
 from apps.core.testscore import TestCaseScore
-from apps.core.models import TestCaseModel, TestCaseScoreModel, TestCaseMetric, TestCaseScoreModel
+from apps.core.models import TestCaseModel, TestCaseScoreModel, TestCaseMetric, TestCaseScoreModel, \
+    TestPlanSession, HistoryTestPlan, ArchivedTestPlan
 
 
+# Retention and archiving delete in SQL and release blobs themselves; these
+# receivers cover ORM deletes, including cascades from plans and sessions.
+@receiver(post_delete, sender=TestPlanSession)
+def release_session_blob(sender, instance, **kwargs):
+    release_blobs([instance.testcase_blob_id])
+
+
+@receiver(post_delete, sender=HistoryTestPlan)
+def release_history_blob(sender, instance, **kwargs):
+    release_blobs([instance.changes_blob_id])
+
+
+@receiver(post_delete, sender=ArchivedTestPlan)
+def release_archived_history_blobs(sender, instance, **kwargs):
+    release_blobs([history.get('changes_blob_id') for history in instance.history or []])
+
 
 # @receiver(post_save, sender=TestCaseMetric)
 # def modify_score(sender, instance, created, **kwargs):
@@ -787,7 +787,7 @@ class TestPlanSessionModelTest(TestCase):
         self.testplan_session = TestPlanSession.objects.create(
             session=self.session,
             context="Test context for planning",
-            version="1.0.0",
+            version=1,
             name="Session Test Plan",
             description="Test description",
             output_counts=5,
@@ -799,7 +799,7 @@ class TestPlanSessionModelTest(TestCase):
     def test_testplan_session_creation(self):
         """Test that TestPlanSession can be created successfully"""
         self.assertEqual(self.testplan_session.name, "Session Test Plan")
-        self.assertEqual(self.testplan_session.version, "1.0.0")
+        self.assertEqual(self.testplan_session.version, 1)
         self.assertEqual(self.testplan_session.status, TestPlanSession.StatusChoices.DRAFT)
 
     def test_testplan_session_default_status(self):
@@ -872,21 +872,20 @@ class TestPlanSessionModelTest(TestCase):
         self.assertIsNone(tps.context)
 
     def test_testplan_session_version_field(self):
-        """Test version CharField"""
+        """Test version PositiveIntegerField"""
         tps = TestPlanSession.objects.create(
             session=self.session,
             name="Version Test",
-            version="2.5.3"
+            version=3
         )
-        self.assertEqual(tps.version, "2.5.3")
+        self.assertEqual(tps.version, 3)
 
-    def test_testplan_session_version_max_length(self):
-        """Test version field respects max_length"""
-        long_version = "a" * 256
+    def test_testplan_session_version_positive(self):
+        """Test version field rejects negative numbers"""
         tps = TestPlanSession(
             session=self.session,
-            name="Version Length Test",
-            version=long_version
+            name="Version Range Test",
+            version=-1
         )
         with self.assertRaises(ValidationError):
             tps.full_clean()
@@ -986,7 +985,7 @@ class TestPlanSessionModelTest(TestCase):
         """Test unique_together constraint on (session, version)"""
         duplicate = TestPlanSession(
             session=self.session,
-            version="1.0.0",
+            version=1,
             name="Different Name"
         )
         with self.assertRaises(IntegrityError):
@@ -997,19 +996,19 @@ class TestPlanSessionModelTest(TestCase):
         session2 = AISessionStore.objects.create(is_active=True)
         tps = TestPlanSession.objects.create(
             session=session2,
-            version="1.0.0",
+            version=1,
             name="Different Session"
         )
-        self.assertEqual(tps.version, "1.0.0")
+        self.assertEqual(tps.version, 1)
 
     def test_testplan_session_unique_together_different_version(self):
         """Test that same session allowed with different version"""
         tps = TestPlanSession.objects.create(
             session=self.session,
-            version="2.0.0",
+            version=2,
             name="Different Version"
         )
-        self.assertEqual(tps.version, "2.0.0")
+        self.assertEqual(tps.version, 2)
 
     def test_testplan_session_timestamps_created(self):
         """Test that created timestamp is set"""
@@ -0,0 +1,1405 @@
+import asyncio
+import io
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from unittest import mock
+from datetime import timedelta
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from apps.core.models import LLMCacheEntry, TestCaseModel, TestCaseMetric, TestCaseScoreModel, Module, Project, TestPlan, \
+    TestScore, PriorityChoice, HistoryTestPlan, AISessionStore, TestPlanSession, ArchivedTestPlan, \
+    SessionVersionTestcase, PayloadBlob, AgentCheckpoint
+from apps.core.apis.serializers import CreateTestPlanSerializer, PlanSerializer
+from aimode.core.checkpointer import DatabaseSaver
+from aimode.core.suggestions import rule_based_suggestions
+from aimode.core.prompt_context import PromptContext, PromptContextProvider
+from aimode.core.shortlist import count_tokens, encode_candidates, pick_candidates, shortlist_candidates
+from apps.core.blobs import release_blobs, store_blob
+from apps.core.helpers import save_version, store_version_testcases
+
+
+class ExportAPITest(APITestCase):
+    """API tests for the streaming export endpoints"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.other_module = Module.objects.create(name="Payments")
+        self.project = Project.objects.create(name="nature")
+        self.testcase = TestCaseModel.objects.create(
+            name="TC Login", priority=PriorityChoice.CLASS_ONE, module=self.module, project=self.project
+        )
+        self.other_testcase = TestCaseModel.objects.create(
+            name="TC Payments", priority=PriorityChoice.CLASS_TWO, module=self.other_module, project=self.project
+        )
+        TestCaseMetric.objects.create(testcase=self.testcase, likelihood=4, impact=5, failure=2, total_runs=10)
+        TestCaseScoreModel.objects.create(testcases=self.testcase, score=Decimal("1.5"))
+        TestCaseScoreModel.objects.create(testcases=self.testcase, score=Decimal("2.5"))
+        self.testplan = TestPlan.objects.create(name="Release Plan")
+        TestScore.objects.create(testplan=self.testplan, testcases=self.testcase, testscore=Decimal("2.5"))
+        TestScore.objects.create(testplan=self.testplan, testcases=self.other_testcase, testscore=Decimal("1.0"))
+
+    def _content(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_export_repository_csv(self):
+        """Test that the repository streams as CSV with metrics and the latest score"""
+        response = self.client.get(reverse('export', args=['repository', 'csv']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = self._content(response).decode().splitlines()
+        self.assertTrue(lines[0].startswith('id,name,priority,feature'))
+        self.assertEqual(len(lines), 3)
+        self.assertIn('TC Login,class_1,Login', lines[1])
+        self.assertIn('2.5000', lines[1])
+
+    def test_export_repository_uses_latest_metric(self):
+        """Test that a testcase with several metric rows is exported once with the latest values"""
+        TestCaseMetric.objects.create(testcase=self.testcase, likelihood=9, impact=8, failure=3, total_runs=12)
+        response = self.client.get(reverse('export', args=['repository', 'ndjson']))
+        rows = [json.loads(line) for line in self._content(response).decode().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['TC Login', 'TC Payments'])
+        self.assertEqual((rows[0]['likelihood'], rows[0]['total_runs']), (9, 12))
+        self.assertIsNone(rows[1]['likelihood'])
+
+    def test_export_repository_uses_testcase_filter(self):
+        """Test that repository exports honour the TestcaseFilter params"""
+        response = self.client.get(reverse('export', args=['repository', 'ndjson']), {'feature': 'Payments'})
+        rows = [json.loads(line) for line in self._content(response).decode().splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['TC Payments'])
+
+    def test_export_plans_ndjson(self):
+        """Test that plan exports contain one row per TestScore"""
+        response = self.client.get(reverse('export', args=['plans', 'ndjson']), {'plan': str(self.testplan.id)})
+        rows = [json.loads(line) for line in self._content(response).decode().splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['plan_name'], 'Release Plan')
+
+    def test_export_plans_parquet(self):
+        """Test that parquet exports produce a readable file"""
+        import pyarrow.parquet as pq
+        response = self.client.get(reverse('export', args=['plans', 'parquet']), {'priority': 'class_1'})
+        table = pq.read_table(io.BytesIO(self._content(response)))
+        self.assertEqual(table.num_rows, 1)
+        self.assertEqual(table.column('testcase_name').to_pylist(), ['TC Login'])
+
+    def test_export_unknown_format(self):
+        """Test that an unknown format is rejected"""
+        response = self.client.get(reverse('export', args=['repository', 'xml']))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExecutionResultsAPITest(APITestCase):
+    """API tests for bulk CI results ingestion"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.testcase = TestCaseModel.objects.create(name="TC Login", module=self.module)
+        self.metric = TestCaseMetric.objects.create(
+            testcase=self.testcase, likelihood=4, impact=5, failure=1, total_runs=4, failure_rate=Decimal("25")
+        )
+        self.new_testcase = TestCaseModel.objects.create(name="TC Logout", module=self.module)
+
+    def test_ingest_updates_metrics_incrementally(self):
+        """Test that results are aggregated and added to the existing counters"""
+        results = [{"testcase": "TC Login", "passed": False, "duration": 2}] * 3 + \
+                  [{"testcase_id": self.testcase.id, "status": "pass", "duration": 2}]
+        response = self.client.post(reverse('results-ingest'), {"results": results}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.metric.refresh_from_db()
+        self.assertEqual(self.metric.total_runs, 8)
+        self.assertEqual(self.metric.failure, 4)
+        self.assertEqual(self.metric.failure_rate, Decimal("50.00"))
+        self.assertTrue(TestCaseScoreModel.objects.filter(testcases=self.testcase).exists())
+
+    def test_ingest_creates_missing_metrics(self):
+        """Test that a testcase without metrics gets a metric row"""
+        results = [{"testcase": "TC Logout", "passed": True}, {"testcase": "TC Logout", "passed": False}]
+        self.client.post(reverse('results-ingest'), {"results": results}, format='json')
+        metric = TestCaseMetric.objects.get(testcase=self.new_testcase)
+        self.assertEqual((metric.total_runs, metric.failure), (2, 1))
+
+    def test_ingest_reports_unknown_and_invalid(self):
+        """Test that unknown testcases and malformed rows are reported, not applied"""
+        results = [{"testcase": "Missing", "passed": True}, {"testcase": "TC Login"}]
+        response = self.client.post(reverse('results-ingest'), {"results": results}, format='json')
+        self.assertEqual(response.data['data']['unknown_testcases'], ["Missing"])
+        self.assertEqual(response.data['data']['invalid'], 1)
+        self.assertEqual(response.data['data']['testcases_updated'], 0)
+
+    def test_ingest_rejects_non_finite_and_negative_durations(self):
+        """Test that NaN, infinite and negative durations are counted as invalid"""
+        results = [{"testcase": "TC Login", "passed": True, "duration": duration}
+                   for duration in ("NaN", "Infinity", -1, "abc")]
+        results.append({"testcase": "TC Login", "passed": True, "duration": 4})
+        response = self.client.post(reverse('results-ingest'), {"results": results}, format='json')
+        self.assertEqual(response.data['data']['invalid'], 4)
+        self.metric.refresh_from_db()
+        self.assertEqual(self.metric.total_runs, 5)
+        self.assertEqual(self.metric.execution_time, Decimal("0.80"))
+
+    def test_ingest_reports_clamped_execution_time(self):
+        """Test that averages beyond the execution_time column are capped and reported"""
+        results = [{"testcase": "TC Login", "passed": True, "duration": 1000},
+                   {"testcase": "TC Logout", "passed": True, "duration": 500}]
+        response = self.client.post(reverse('results-ingest'), {"results": results}, format='json')
+        self.assertEqual(response.data['data']['clamped_testcases'], [self.testcase.id, self.new_testcase.id])
+        self.metric.refresh_from_db()
+        self.assertEqual(self.metric.execution_time, Decimal("99.99"))
+        self.assertEqual(TestCaseMetric.objects.get(testcase=self.new_testcase).execution_time, Decimal("99.99"))
+
+        response = self.client.post(reverse('results-ingest'), {"results": results[:1]}, format='json')
+        self.assertEqual(response.data['data']['clamped_testcases'], [self.testcase.id])
+
+
+class CreateTestPlanAPITest(APITestCase):
+    """API tests for the bulk test plan creation path"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.testcases = [
+            TestCaseModel.objects.create(name=f"TC {i}", module=self.module) for i in range(20)
+        ]
+
+    def _payload(self, testcases):
+        return {
+            "name": "Bulk Plan",
+            "modules": ["Login"],
+            "testcases": [{"testcase": tc.name, "testscore": 1.5, "mode": "ai"} for tc in testcases],
+        }
+
+    def _count_queries(self, payload):
+        serializer = CreateTestPlanSerializer(data=payload)
+        self.assertTrue(serializer.is_valid())
+        with CaptureQueriesContext(connections['core']) as ctx:
+            serializer.save()
+        return len(ctx.captured_queries)
+
+    def test_create_testplan_returns_unknown_testcases(self):
+        """Test that unknown names are returned and known ones are stored"""
+        payload = self._payload(self.testcases[:3])
+        payload['testcases'].append({"testcase": "Does not exist"})
+        payload['testcases'].append({"testcase": self.testcases[0].id})
+        response = self.client.post(reverse('create-testplan'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['unknown_testcases'], ["Does not exist"])
+        plan = TestPlan.objects.get(id=response.data['data']['id'])
+        self.assertEqual(plan.scores.count(), 3)
+
+    def test_create_testplan_query_count_is_constant(self):
+        """Test that saving a plan does not issue a query per testcase"""
+        small = self._count_queries(self._payload(self.testcases[:2]))
+        large = self._count_queries(self._payload(self.testcases))
+        self.assertEqual(small, large)
+
+
+class PlanUpdateAPITest(APITestCase):
+    """API tests for diff based plan updates"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.testcases = [
+            TestCaseModel.objects.create(name=f"TC {i}", module=self.module) for i in range(30)
+        ]
+
+    def _create_plan(self, testcases):
+        plan = TestPlan.objects.create(name="Plan")
+        TestScore.objects.bulk_create([
+            TestScore(testplan=plan, testcases=tc, testscore=Decimal("1.0"), mode='ai') for tc in testcases
+        ])
+        return plan
+
+    def _payload(self, plan, testcases, changed=None):
+        return {"testcases": [
+            {"testcases": tc.id, "testplan": plan.id, "mode": "ai",
+             "testscore": "9.0" if tc == changed else "1.0"}
+            for tc in testcases
+        ]}
+
+    def _count_update_queries(self, plan, payload):
+        serializer = PlanSerializer(plan, data=payload, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        with CaptureQueriesContext(connections['core']) as ctx:
+            serializer.save()
+        return len(ctx.captured_queries)
+
+    def test_update_applies_added_removed_and_changed(self):
+        """Test that only the differing TestScore rows are touched"""
+        plan = self._create_plan(self.testcases[:3])
+        kept_id = plan.scores.get(testcases=self.testcases[1]).id
+        payload = self._payload(plan, self.testcases[1:4], changed=self.testcases[2])
+        response = self.client.patch(reverse('plan-detail', args=[plan.id]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        scores = {s.testcases_id: s for s in plan.scores.all()}
+        self.assertEqual(set(scores), {tc.id for tc in self.testcases[1:4]})
+        self.assertEqual(scores[self.testcases[1].id].id, kept_id)
+        self.assertEqual(scores[self.testcases[2].id].testscore, Decimal("9.0"))
+
+    def test_update_collapses_duplicate_rows(self):
+        """Test that duplicate TestScore rows of a testcase are reduced to the oldest one"""
+        from apps.core.history import reconstruct_plan_version, record_plan_history
+
+        plan = self._create_plan(self.testcases[:2])
+        record_plan_history(plan, {})
+        kept_id = plan.scores.get(testcases=self.testcases[0]).id
+        TestScore.objects.bulk_create([
+            TestScore(testplan=plan, testcases=tc, testscore=Decimal("5.0"), mode='ai') for tc in self.testcases[:2]
+        ])
+        payload = self._payload(plan, self.testcases[:1], changed=self.testcases[0])
+        response = self.client.patch(reverse('plan-detail', args=[plan.id]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(list(plan.scores.values_list('id', 'testscore')), [(kept_id, Decimal("9.0"))])
+        changes = HistoryTestPlan.objects.get(testplan=plan, version_number=2).get_other_changes()
+        self.assertEqual(changes['removed'], [self.testcases[1].id])
+        version = reconstruct_plan_version(plan.id, 2)
+        self.assertEqual([tc['testcases_id'] for tc in version['testcases']], [self.testcases[0].id])
+
+    def test_update_query_count_independent_of_plan_size(self):
+        """Test that a single changed testcase costs the same for small and large plans"""
+        small_plan = self._create_plan(self.testcases[:3])
+        large_plan = self._create_plan(self.testcases)
+        small = self._count_update_queries(
+            small_plan, self._payload(small_plan, self.testcases[:3], changed=self.testcases[0]))
+        large = self._count_update_queries(
+            large_plan, self._payload(large_plan, self.testcases, changed=self.testcases[0]))
+        self.assertEqual(small, large)
+
+
+@override_settings(PLAN_HISTORY_SNAPSHOT_INTERVAL=3)
+class PlanHistoryAPITest(APITestCase):
+    """API tests for delta encoded plan history"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.testcases = [
+            TestCaseModel.objects.create(name=f"TC {i}", module=self.module) for i in range(6)
+        ]
+        self.plan = TestPlan.objects.create(name="Plan")
+
+    def _update(self, testcases, **fields):
+        payload = {"testcases": [
+            {"testcases": tc.id, "testplan": self.plan.id, "mode": "ai", "testscore": str(score)}
+            for tc, score in testcases
+        ], **fields}
+        response = self.client.patch(reverse('plan-detail', args=[self.plan.id]), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+    def _plan_state(self):
+        return {s.testcases_id: float(s.testscore) for s in self.plan.scores.all()}
+
+    def test_versions_are_sequential_with_periodic_snapshots(self):
+        """Test that versions increase by one and every third version is a snapshot"""
+        for i in range(5):
+            self._update([(tc, i) for tc in self.testcases[i:i + 2]])
+        history = list(HistoryTestPlan.objects.filter(testplan=self.plan).order_by('version_number'))
+        self.assertEqual([h.version_number for h in history], [1, 2, 3, 4, 5])
+        self.assertEqual([h.is_snapshot for h in history], [True, False, False, True, False])
+        self.assertEqual(history[-1].version, "Plan - v5")
+        self.assertNotIn('testcases', history[1].get_other_changes())
+
+    def test_reconstructed_versions_match_plan_state(self):
+        """Test that every version rebuilds to the plan state at the time it was saved"""
+        states = []
+        for i in range(5):
+            self._update([(tc, i) for tc in self.testcases[i:i + 3]], description=f"rev {i}")
+            states.append((self._plan_state(), f"rev {i}"))
+        for version_number, (expected, description) in enumerate(states, start=1):
+            response = self.client.get(reverse('plan-version', args=[self.plan.id, version_number]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()['data']
+            self.assertEqual(data['description'], description)
+            self.assertEqual({tc['testcases_id']: tc['testscore'] for tc in data['testcases']}, expected)
+
+    def test_legacy_history_gets_a_snapshot(self):
+        """Test that the first version after delta-only legacy history is a full snapshot"""
+        self._update([(self.testcases[0], 1), (self.testcases[1], 2)])
+        HistoryTestPlan.objects.filter(testplan=self.plan).update(is_snapshot=False, version_number=2)
+        self._update([(self.testcases[0], 3)])
+        history = HistoryTestPlan.objects.get(testplan=self.plan, version_number=3)
+        self.assertTrue(history.is_snapshot)
+        response = self.client.get(reverse('plan-version', args=[self.plan.id, 3]))
+        data = response.json()['data']
+        self.assertEqual({tc['testcases_id']: tc['testscore'] for tc in data['testcases']}, self._plan_state())
+
+    def test_unknown_version_returns_404(self):
+        """Test that a missing version is reported as not found"""
+        response = self.client.get(reverse('plan-version', args=[self.plan.id, 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PlanDetailSplitAPITest(APITestCase):
+    """API tests for the plan header and paginated testcases endpoints"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.login = Module.objects.create(name="Login")
+        self.payments = Module.objects.create(name="Payments")
+        self.plan = TestPlan.objects.create(name="Plan")
+        self.plan.modules.set([self.login, self.payments])
+        testcases = [
+            TestCaseModel.objects.create(name=f"TC {i:02d}", module=self.login if i % 3 else self.payments)
+            for i in range(12)
+        ]
+        TestScore.objects.bulk_create([
+            TestScore(testplan=self.plan, testcases=tc, testscore=Decimal(i % 5), mode='ai' if i % 2 else 'manual')
+            for i, tc in enumerate(testcases)
+        ])
+
+    def test_header_returns_aggregates(self):
+        """Test that the header reports counts and module breakdown without listing testcases"""
+        response = self.client.get(reverse('plan-header', args=[self.plan.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertEqual(data['testcase_count'], 12)
+        self.assertEqual(data['mode_counts'], {'ai': 6, 'manual': 6, 'classic': 0})
+        self.assertEqual(data['max_score'], 4.0)
+        self.assertEqual([(m['module'], m['count']) for m in data['module_breakdown']],
+                         [('Login', 8), ('Payments', 4)])
+        self.assertNotIn('testcases', data)
+
+    def test_testcases_keyset_pages_cover_plan_once(self):
+        """Test that following the cursors visits every testcase once in sort order"""
+        url = reverse('plan-testcases', args=[self.plan.id]) + '?sort=-testscore&page_size=5'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            body = response.json()
+            self.assertLessEqual(len(body['data']), 5)
+            seen.extend(body['data'])
+            url = body['next']
+        self.assertEqual(len({row['id'] for row in seen}), 12)
+        scores = [row['testscore'] for row in seen]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertEqual(set(seen[0]), {'id', 'testcase_id', 'name', 'modules', 'priority', 'testcase_type',
+                                        'mode', 'testscore', 'reason'})
+        self.assertEqual(body['page_size'], 5)
+
+    def test_testcases_keyset_pages_cover_null_sort_keys(self):
+        """Test that rows with a NULL score or module are paged like any other row"""
+        TestScore.objects.filter(testplan=self.plan, testscore=Decimal(4)).update(testscore=None)
+        TestCaseModel.objects.filter(name__in=["TC 00", "TC 01"]).update(module=None)
+        for sort in ('testscore', '-testscore', 'modules', '-modules'):
+            url = reverse('plan-testcases', args=[self.plan.id]) + f'?sort={sort}&page_size=3'
+            seen = []
+            while url:
+                body = self.client.get(url).json()
+                seen.extend(body['data'])
+                url = body['next']
+            self.assertEqual(len({row['id'] for row in seen}), 12, sort)
+
+    def test_testcases_unknown_plan_returns_404(self):
+        """Test that a missing plan is reported as not found"""
+        response = self.client.get(reverse('plan-testcases', args=[self.plan.id + 1000]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PlanListAPITest(APITestCase):
+    """API tests for the aggregated plan list"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.modules = [Module.objects.create(name=name) for name in ("Login", "Payments")]
+        self.testcases = [TestCaseModel.objects.create(name=f"TC {i}", module=self.modules[0]) for i in range(4)]
+
+    def _create_plans(self, count):
+        for i in range(count):
+            plan = TestPlan.objects.create(name=f"Plan {i}")
+            plan.modules.set(self.modules)
+            TestScore.objects.bulk_create([
+                TestScore(testplan=plan, testcases=tc, testscore=Decimal(j), mode='ai' if j else 'manual')
+                for j, tc in enumerate(self.testcases)
+            ])
+
+    def test_list_includes_aggregates(self):
+        """Test that counts, scores and modules are not inflated by the modules join"""
+        self._create_plans(1)
+        response = self.client.get(reverse('get-plans'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        plan = response.json()['data'][0]
+        self.assertEqual(plan['testcase_count'], 4)
+        self.assertEqual(plan['average_score'], 1.5)
+        self.assertEqual(plan['max_score'], 3.0)
+        self.assertEqual(plan['mode_counts'], {'ai': 3, 'manual': 1, 'classic': 0})
+        self.assertEqual(sorted(plan['modules']), ["Login", "Payments"])
+
+    def test_list_query_count_is_constant(self):
+        """Test that listing a page costs the same number of queries for 1 and 10 plans"""
+        self._create_plans(1)
+        with CaptureQueriesContext(connections['core']) as small:
+            self.client.get(reverse('get-plans'))
+        self._create_plans(9)
+        with CaptureQueriesContext(connections['core']) as large:
+            self.client.get(reverse('get-plans'))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+
+class DiffAPITest(APITestCase):
+    """API tests for the plan, plan version and session version diff endpoints"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.login = Module.objects.create(name="Login")
+        self.payments = Module.objects.create(name="Payments")
+        self.testcases = [
+            TestCaseModel.objects.create(name=f"TC {i}", module=self.login if i < 2 else self.payments)
+            for i in range(4)
+        ]
+
+    def _plan(self, name, scores):
+        plan = TestPlan.objects.create(name=name)
+        TestScore.objects.bulk_create([
+            TestScore(testplan=plan, testcases=self.testcases[i], testscore=Decimal(score)) for i, score in scores
+        ])
+        return plan
+
+    def test_plan_diff(self):
+        """Test added, removed, changed and module coverage between two plans"""
+        left = self._plan("Left", [(0, 1), (1, 2), (2, 3)])
+        right = self._plan("Right", [(1, 2), (2, 5), (3, 1)])
+        response = self.client.get(reverse('plan-diff', args=[left.id, right.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertEqual(data['summary'], {'added': 1, 'removed': 1, 'common': 2, 'changed': 1})
+        self.assertEqual(data['added'][0]['testcase_id'], self.testcases[3].id)
+        self.assertEqual(data['removed'][0]['testcase_id'], self.testcases[0].id)
+        self.assertEqual(data['changed'][0]['delta'], 2.0)
+        self.assertEqual(data['modules'], [
+            {'module': 'Login', 'left': 2, 'right': 1, 'change': -1},
+            {'module': 'Payments', 'left': 1, 'right': 2, 'change': 1},
+        ])
+
+    def test_plan_diff_unknown_plan(self):
+        """Test that a missing plan is reported as not found"""
+        left = self._plan("Left", [(0, 1)])
+        response = self.client.get(reverse('plan-diff', args=[left.id, left.id + 1000]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_plan_version_diff(self):
+        """Test diffing two history versions of the same plan"""
+        plan = TestPlan.objects.create(name="Plan")
+        for selected in ([0, 1], [1, 2]):
+            payload = {"testcases": [
+                {"testcases": self.testcases[i].id, "testplan": plan.id, "mode": "ai", "testscore": "1.0"}
+                for i in selected
+            ]}
+            self.client.patch(reverse('plan-detail', args=[plan.id]), payload, format='json')
+        response = self.client.get(reverse('plan-version-diff', args=[plan.id, 1, 2]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertEqual(data['summary'], {'added': 1, 'removed': 1, 'common': 1, 'changed': 0})
+        self.assertEqual(data['added'][0]['module'], 'Payments')
+
+    def test_session_version_diff(self):
+        """Test diffing the testcases of two session versions"""
+        session = AISessionStore.objects.create()
+        entry = lambda i, score: {"id": self.testcases[i].id, "testcase": self.testcases[i].name,
+                                  "modules": self.testcases[i].module.name, "testscore": score}
+        for version, testcase_data in ((1, [entry(0, 1.0), entry(1, 2.0)]), (2, [entry(1, 3.5), entry(2, 1.0)])):
+            instance = TestPlanSession.objects.create(session=session, name="S", version=version)
+            store_version_testcases(instance, testcase_data)
+        response = self.client.get(reverse('session-version-diff', args=[str(session.session_id), 1, 2]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()['data']
+        self.assertEqual(data['summary'], {'added': 1, 'removed': 1, 'common': 1, 'changed': 1})
+        self.assertEqual(data['changed'][0]['delta'], 1.5)
+        self.assertEqual(data['removed'][0]['name'], "TC 0")
+
+
+class ClonePlanAPITest(APITestCase):
+    """API tests for server side plan cloning"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.testcases = [TestCaseModel.objects.create(name=f"TC {i}", module=self.module) for i in range(3)]
+        self.plan = TestPlan.objects.create(name="Release 1", description="base", modes='ai')
+        self.plan.modules.set([self.module])
+        TestScore.objects.bulk_create([
+            TestScore(testplan=self.plan, testcases=tc, testscore=Decimal("1.5"), mode='ai', reasoning="r")
+            for tc in self.testcases
+        ])
+
+    def test_clone_copies_plan_modules_and_scores(self):
+        """Test that the clone has the same fields, modules and testcases"""
+        response = self.client.post(reverse('plan-clone', args=[self.plan.id]), {"name": "Release 2"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        clone = TestPlan.objects.get(id=response.json()['data']['id'])
+        self.assertEqual((clone.name, clone.description, clone.modes), ("Release 2", "base", 'ai'))
+        self.assertEqual(list(clone.modules.all()), [self.module])
+        self.assertEqual(
+            sorted(clone.scores.values_list('testcases_id', 'testscore', 'reasoning')),
+            sorted(self.plan.scores.values_list('testcases_id', 'testscore', 'reasoning')),
+        )
+        self.assertEqual(response.json()['data']['testcase_count'], 3)
+
+    def test_clone_refreshes_scores(self):
+        """Test that refresh_scores takes the latest materialised score where one exists"""
+        TestCaseScoreModel.objects.create(testcases=self.testcases[0], score=Decimal("2.0"))
+        TestCaseScoreModel.objects.create(testcases=self.testcases[0], score=Decimal("7.25"))
+        response = self.client.post(reverse('plan-clone', args=[self.plan.id]), {"refresh_scores": True},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        clone = TestPlan.objects.get(id=response.json()['data']['id'])
+        self.assertEqual(clone.name, "Release 1 (copy)")
+        scores = dict(clone.scores.values_list('testcases_id', 'testscore'))
+        self.assertEqual(scores[self.testcases[0].id], Decimal("7.25"))
+        self.assertEqual(scores[self.testcases[1].id], Decimal("1.5"))
+
+    def test_clone_unknown_plan(self):
+        """Test that cloning a missing plan returns 404"""
+        response = self.client.post(reverse('plan-clone', args=[self.plan.id + 1000]), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PlanArchiveTest(APITestCase):
+    """Tests for moving plans to cold storage and restoring them"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.testcases = [TestCaseModel.objects.create(name=f"TC {i}", module=self.module) for i in range(3)]
+        self.plan = self._plan("Old", is_active=False)
+        self.active_plan = self._plan("Current", is_active=True)
+        self.client.patch(reverse('plan-detail', args=[self.plan.id]), {"description": "edited"}, format='json')
+        TestPlan.objects.filter(id=self.plan.id).update(is_active=False, modified=timezone.now() - timedelta(days=60))
+
+    def _plan(self, name, is_active):
+        plan = TestPlan.objects.create(name=name, is_active=is_active)
+        plan.modules.set([self.module])
+        TestScore.objects.bulk_create([
+            TestScore(testplan=plan, testcases=tc, testscore=Decimal("2.5"), reasoning="r") for tc in self.testcases
+        ])
+        return plan
+
+    def _rows(self, plan_id):
+        return (
+            list(TestPlan.objects.filter(id=plan_id).values()),
+            sorted(TestScore.objects.filter(testplan_id=plan_id).values_list('id', 'testcases_id', 'testscore')),
+            list(HistoryTestPlan.objects.filter(testplan_id=plan_id).values('id', 'version_number', 'other_changes')),
+            list(TestPlan.objects.get(id=plan_id).modules.values_list('id', flat=True)),
+        )
+
+    def test_archive_moves_inactive_plan_and_restore_brings_it_back(self):
+        """Test that an archive and restore round trip keeps ids and rows intact"""
+        before = self._rows(self.plan.id)
+        call_command('archive_plans', inactive_days=30, stdout=io.StringIO())
+        self.assertFalse(TestPlan.objects.filter(id=self.plan.id).exists())
+        self.assertFalse(TestScore.objects.filter(testplan_id=self.plan.id).exists())
+        self.assertFalse(HistoryTestPlan.objects.filter(testplan_id=self.plan.id).exists())
+        self.assertTrue(TestPlan.objects.filter(id=self.active_plan.id).exists())
+        archived = ArchivedTestPlan.objects.get(plan_id=self.plan.id)
+        self.assertEqual((archived.reason, len(archived.scores), len(archived.history)), ('inactive', 3, 1))
+
+        response = self.client.post(reverse('plan-restore', args=[self.plan.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(self._rows(self.plan.id), before)
+        self.assertFalse(ArchivedTestPlan.objects.filter(plan_id=self.plan.id).exists())
+
+    def test_restore_fills_columns_added_after_archiving(self):
+        """Test that a column missing from an old archive gets its model default"""
+        call_command('archive_plans', inactive_days=30, stdout=io.StringIO())
+        archived = ArchivedTestPlan.objects.get(plan_id=self.plan.id)
+        del archived.plan['modes']
+        for score in archived.scores:
+            del score['mode']
+        archived.save()
+        response = self.client.post(reverse('plan-restore', args=[self.plan.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(TestPlan.objects.get(id=self.plan.id).modes, TestPlan.ModeChoices.CLASSIC)
+        self.assertEqual(set(TestScore.objects.filter(testplan_id=self.plan.id).values_list('mode', flat=True)),
+                         {TestPlan.ModeChoices.AI})
+
+    def test_restore_refuses_columns_missing_from_the_schema(self):
+        """Test that archived columns the tables no longer have stop the restore"""
+        call_command('archive_plans', inactive_days=30, stdout=io.StringIO())
+        archived = ArchivedTestPlan.objects.get(plan_id=self.plan.id)
+        archived.plan['title'] = archived.plan.pop('name')
+        archived.save()
+        response = self.client.post(reverse('plan-restore', args=[self.plan.id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('core_testplan.title', response.data['data']['error'])
+        self.assertFalse(TestPlan.objects.filter(id=self.plan.id).exists())
+        self.assertTrue(ArchivedTestPlan.objects.filter(plan_id=self.plan.id).exists())
+
+    def test_recent_inactive_and_active_plans_are_kept(self):
+        """Test that only plans past the age threshold are archived"""
+        call_command('archive_plans', inactive_days=90, stdout=io.StringIO())
+        self.assertEqual(ArchivedTestPlan.objects.count(), 0)
+        call_command('archive_plans', inactive_days=90, stale_days=30, stdout=io.StringIO())
+        self.assertEqual(list(ArchivedTestPlan.objects.values_list('plan_id', 'reason')),
+                         [(self.plan.id, 'inactive')])
+
+    def test_restore_unknown_plan(self):
+        """Test that restoring a plan that is not archived returns 404"""
+        response = self.client.post(reverse('plan-restore', args=[self.plan.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SessionVersionTestcasesAPITest(APITestCase):
+    """API tests for normalised AI session version testcases"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.session = AISessionStore.objects.create()
+        Module.objects.create(name="Login")
+        testcase_data = [
+            {"id": i, "testcase": f"TC {i}", "modules": "Login" if i % 2 else "Payments",
+             "priority": "class_1" if i < 3 else "class_2", "mode": "ai", "testscore": i * 0.5}
+            for i in range(1, 8)
+        ]
+        payload = {
+            "session": str(self.session.session_id), "context": "ctx", "version_info": "first",
+            "name": "Plan", "description": "desc", "modules": ["Login"], "output_counts": 7,
+            "testcase_data": testcase_data,
+        }
+        response = self.client.post(reverse('test-plan-version'), payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+
+    def test_save_stores_normalised_rows(self):
+        """Test that saving a version writes one row per testcase in order"""
+        version = TestPlanSession.objects.get(session=self.session, version=1)
+        self.assertEqual(list(version.version_testcases.values_list('testcase_id', flat=True)), list(range(1, 8)))
+
+    def test_out_of_range_and_invalid_scores_are_stored(self):
+        """Test that scores are rounded, clamped to the column and invalid ones stored as 0"""
+        version = TestPlanSession.objects.get(session=self.session, version=1)
+        scores = ["1.23456", 1e12, -1e12, "abc", "NaN", float("inf"), None, True, [1], 999999.99996]
+        rows = store_version_testcases(version, [{"id": 100 + i, "testscore": score} for i, score in enumerate(scores)])
+        self.assertEqual(len(rows), len(scores))
+        stored = version.version_testcases.filter(testcase_id__gte=100).order_by('testcase_id')
+        self.assertEqual(list(stored.values_list('testscore', flat=True)), [
+            Decimal("1.2346"), Decimal("999999.9999"), Decimal("-999999.9999"), Decimal(0), Decimal(0),
+            Decimal(0), Decimal(0), Decimal(0), Decimal(0), Decimal("999999.9999"),
+        ])
+
+    def test_module_graph_counts(self):
+        """Test that the module graph is grouped in SQL"""
+        response = self.client.get(reverse('test-graph', args=[str(self.session.session_id), 1]))
+        data = response.json()['data']
+        self.assertEqual(data['modules'], {"Login": 4, "Payments": 3})
+        self.assertEqual(data['priority'], {"class_1": 2, "class_2": 5})
+        self.assertEqual(data['version_info'], "first")
+
+    def test_testcases_are_filtered_and_paginated(self):
+        """Test filtering by module and following keyset pages"""
+        url = reverse('version-testcases', args=[str(self.session.session_id), 1]) + '?module=Login&page_size=3'
+        seen = []
+        while url:
+            body = self.client.get(url).json()
+            seen.extend(body['data'])
+            url = body['next']
+        self.assertEqual([tc['id'] for tc in seen], [1, 3, 5, 7])
+        self.assertEqual(seen[1]['testscore'], 1.5)
+
+    def test_version_detail_without_testcases(self):
+        """Test that the version detail can skip the testcase blob"""
+        url = reverse('version', args=[str(self.session.session_id), 1])
+        self.assertIn('testcases', self.client.get(url).json()['data'])
+        self.assertNotIn('testcases', self.client.get(url + '?include_testcases=false').json()['data'])
+
+
+class SessionVersionAllocationTest(TransactionTestCase):
+    """Tests for the atomic per-session version allocator"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.session = AISessionStore.objects.create()
+
+    def _save(self):
+        return save_version({
+            "session": str(self.session.session_id), "context": "ctx", "name": "Plan", "description": "",
+            "modules": [], "output_counts": 0, "testcase_data": [],
+        })
+
+    def test_versions_are_sequential_integers(self):
+        """Test that versions are allocated 1, 2, 3 from the session counter"""
+        self.assertEqual([self._save().version for _ in range(3)], [1, 2, 3])
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.version_counter, 3)
+
+    def test_parallel_saves_do_not_collide(self):
+        """Test that concurrent saves to one session all succeed with distinct versions"""
+        def save():
+            try:
+                return self._save().version
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            versions = list(executor.map(lambda _: save(), range(12)))
+        self.assertEqual(sorted(versions), list(range(1, 13)))
+        self.assertEqual(TestPlanSession.objects.filter(session=self.session).count(), 12)
+
+
+class SessionCurrentVersionTest(APITestCase):
+    """Tests for the current version pointer of AI sessions"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.session = AISessionStore.objects.create()
+
+    def _save(self):
+        return save_version({
+            "session": str(self.session.session_id), "context": "ctx", "name": "Plan", "description": "",
+            "modules": [], "output_counts": 0, "testcase_data": [],
+        })
+
+    def test_latest_save_is_current_and_others_are_draft(self):
+        """Test that status is derived from the session's current version"""
+        versions = [self._save() for _ in range(3)]
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.current_version, versions[-1])
+        response = self.client.get(reverse('version', args=[str(self.session.session_id)]))
+        self.assertEqual([(v['version'], v['status']) for v in response.json()['data']],
+                         [(3, 'saved'), (2, 'draft'), (1, 'draft')])
+        detail = self.client.get(reverse('version', args=[str(self.session.session_id), 1])).json()['data']
+        self.assertEqual(detail['status'], 'draft')
+
+    def test_save_cost_does_not_grow_with_history(self):
+        """Test that saving issues the same number of queries with 1 or 20 previous versions"""
+        self._save()
+        with CaptureQueriesContext(connections['core']) as first:
+            self._save()
+        for _ in range(20):
+            self._save()
+        with CaptureQueriesContext(connections['core']) as later:
+            self._save()
+        self.assertEqual(len(first.captured_queries), len(later.captured_queries))
+
+
+class SessionRetentionTest(TestCase):
+    """Tests for TTL based compaction of AI sessions"""
+
+    databases = {'core'}
+
+    def _session(self, age_days, versions=0):
+        session = AISessionStore.objects.create()
+        created = timezone.now() - timedelta(days=age_days)
+        for number in range(1, versions + 1):
+            version = TestPlanSession.objects.create(session=session, name="Plan", version=number,
+                                                     testcase_data=[{"id": number}])
+            store_version_testcases(version)
+            session.current_version = version
+        AISessionStore.objects.filter(pk=session.pk).update(modified=created, current_version=session.current_version)
+        TestPlanSession.objects.filter(session=session).update(created=created)
+        return session
+
+    def test_idle_sessions_are_deleted_with_their_versions(self):
+        """Test that sessions past the TTL go away and recent ones stay"""
+        idle = self._session(age_days=40, versions=2)
+        empty = self._session(age_days=40)
+        recent = self._session(age_days=1, versions=1)
+        call_command('compact_sessions', ttl_days=30, version_ttl_days=14, batch_size=1, stdout=io.StringIO())
+        self.assertEqual(list(AISessionStore.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertFalse(TestPlanSession.objects.filter(session__in=[idle.pk, empty.pk]).exists())
+        self.assertFalse(SessionVersionTestcase.objects.exclude(version__session=recent).exists())
+
+    def test_old_drafts_are_compacted_to_the_current_version(self):
+        """Test that expired drafts are removed but the current version is kept"""
+        session = self._session(age_days=20, versions=3)
+        AISessionStore.objects.filter(pk=session.pk).update(modified=timezone.now())
+        call_command('compact_sessions', ttl_days=30, version_ttl_days=14, stdout=io.StringIO())
+        session.refresh_from_db()
+        self.assertEqual(list(TestPlanSession.objects.filter(session=session).values_list('version', flat=True)), [3])
+        self.assertEqual(session.current_version.version, 3)
+
+
+class PayloadBlobTest(APITestCase):
+    """Tests for content addressed storage of session and history payloads"""
+
+    databases = {'core'}
+
+    def setUp(self):
+        """Set up test data"""
+        self.module = Module.objects.create(name="Login")
+        self.session = AISessionStore.objects.create()
+        self.testcases = [{"id": 1, "testcase": "TC 1", "modules": "Login", "testscore": 2.5}]
+
+    def _save(self):
+        return save_version({
+            "session": self.session.session_id, "context": "ctx", "name": "Plan", "description": "",
+            "modules": ["Login"], "output_counts": 1, "testcase_data": self.testcases,
+        })
+
+    def test_identical_payloads_share_one_blob(self):
+        """Test that saving the same testcases twice stores a single compressed blob"""
+        first, second = self._save(), self._save()
+        self.assertEqual(first.testcase_blob_id, second.testcase_blob_id)
+        self.assertIsNone(TestPlanSession.objects.get(pk=first.pk).testcase_data)
+        blob = PayloadBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(blob.load(), self.testcases)
+        response = self.client.get(reverse('version', args=[str(self.session.session_id), second.version]))
+        self.assertEqual(response.json()['data']['testcases'], self.testcases)
+
+    def test_release_deletes_unreferenced_blobs(self):
+        """Test that a blob is deleted once its last reference is released"""
+        blob_id = store_blob({"a": 1})
+        self.assertEqual(store_blob({"a": 1}), blob_id)
+        self.assertEqual(release_blobs([blob_id]), 0)
+        self.assertEqual(PayloadBlob.objects.get(pk=blob_id).ref_count, 1)
+        self.assertEqual(release_blobs([blob_id]), 1)
+        self.assertFalse(PayloadBlob.objects.exists())
+
+    def test_compaction_releases_version_blobs(self):
+        """Test that deleting expired drafts drops their blob references"""
+        first, second = self._save(), self._save()
+        TestPlanSession.objects.filter(pk=first.pk).update(created=timezone.now() - timedelta(days=20))
+        call_command('compact_sessions', ttl_days=30, version_ttl_days=14, stdout=io.StringIO())
+        self.assertEqual(PayloadBlob.objects.get(pk=second.testcase_blob_id).ref_count, 1)
+
+    def test_orm_deletes_release_blobs(self):
+        """Test that deleting sessions and plans through the ORM drops their blob references"""
+        first, second = self._save(), self._save()
+        first.delete()
+        self.assertEqual(PayloadBlob.objects.get(pk=second.testcase_blob_id).ref_count, 1)
+        self.session.delete()
+        self.assertFalse(PayloadBlob.objects.filter(pk=second.testcase_blob_id).exists())
+        plan = TestPlan.objects.create(name="Plan")
+        history = HistoryTestPlan.objects.create(testplan=plan, version="Plan - v1",
+                                                 changes_blob_id=store_blob({"fields": {}}))
+        plan.delete()
+        self.assertFalse(PayloadBlob.objects.filter(pk=history.changes_blob_id).exists())
+
+
+class DatabaseSaverTest(TransactionTestCase):
+    """Tests for the database backed LangGraph checkpointer"""
+
+    databases = {'core'}
+
+    def _graph(self, saver):
+        self.addCleanup(saver.close)
+        from typing import Annotated
+        import operator
+        from typing_extensions import TypedDict
+        from langchain_core.messages import AIMessage
+        from langgraph.graph import StateGraph
+
+        class State(TypedDict):
+            messages: Annotated[list, operator.add]
+
+        workflow = StateGraph(State)
+        workflow.add_node("reply", lambda state: {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]})
+        workflow.set_entry_point("reply")
+        workflow.set_finish_point("reply")
+        return workflow.compile(checkpointer=saver)
+
+    def _ask(self, graph, text, thread_id="thread-1"):
+        from langchain_core.messages import HumanMessage
+        return graph.invoke({"messages": [HumanMessage(content=text)]}, {"configurable": {"thread_id": thread_id}})
+
+    def test_state_is_shared_between_savers(self):
+        """Test that a conversation continues on another worker's saver"""
+        self._ask(self._graph(DatabaseSaver()), "first")
+        state = self._ask(self._graph(DatabaseSaver()), "second")
+        self.assertEqual([m.content for m in state['messages']], ["first", "reply 1", "second", "reply 3"])
+
+    def test_concurrent_chats_use_several_connections(self):
+        """Test that one saver serves concurrent conversations on parallel connections"""
+        saver = DatabaseSaver(workers=4)
+        graph = self._graph(saver)
+        get_tuple, active, peak, lock = saver._get_tuple, [0], [0], threading.Lock()
+
+        def slow_get_tuple(config):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                time.sleep(0.1)
+                return get_tuple(config)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        saver._get_tuple = slow_get_tuple
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            states = list(pool.map(lambda i: self._ask(graph, f"question {i}", thread_id=f"thread-{i}"), range(8)))
+        self.assertEqual([[m.content for m in state['messages']] for state in states],
+                         [[f"question {i}", "reply 1"] for i in range(8)])
+        self.assertGreater(peak[0], 1)
+        self.assertLessEqual(peak[0], 4)
+        self.assertEqual(len({id(connection) for connection in saver._connections}), len(saver._connections))
+
+    def test_history_and_messages_are_bounded(self):
+        """Test that old checkpoints are pruned and stored messages trimmed at a user message"""
+        saver = DatabaseSaver(history=2, max_messages=3, cache_size=1)
+        graph = self._graph(saver)
+        for number in range(4):
+            self._ask(graph, f"question {number}")
+        self.assertEqual(AgentCheckpoint.objects.filter(thread_id="thread-1").count(), 2)
+        self.assertLessEqual(len(saver.cache), 1)
+        messages = saver.get_tuple({"configurable": {"thread_id": "thread-1"}}).checkpoint['channel_values']['messages']
+        self.assertEqual([m.content for m in messages], ["question 3", "reply 3"])
+
+    def test_idle_threads_are_evicted(self):
+        """Test that compact_sessions deletes checkpoints of idle threads"""
+        graph = self._graph(DatabaseSaver())
+        self._ask(graph, "old", thread_id="idle")
+        self._ask(graph, "new", thread_id="active")
+        AgentCheckpoint.objects.filter(thread_id="idle").update(modified=timezone.now() - timedelta(days=10))
+        call_command('compact_sessions', checkpoint_ttl_days=7, stdout=io.StringIO())
+        self.assertEqual(set(AgentCheckpoint.objects.values_list('thread_id', flat=True)), {"active"})
+
+
+class LLMCacheTest(TestCase):
+    """Tests for the database cache of LLM responses"""
+
+    databases = {'core'}
+
+    def _model(self, cache):
+        from langchain_core.language_models import FakeListChatModel
+        return FakeListChatModel(responses=["first", "second", "third"], cache=cache)
+
+    def test_repeated_prompt_is_answered_from_the_cache(self):
+        """Test that the same prompt is only sent to the model once"""
+        from aimode.core.llm_cache import DatabaseLLMCache, cache_stats
+        model = self._model(DatabaseLLMCache("reasoning"))
+        self.assertEqual(model.invoke("why").content, "first")
+        self.assertEqual(model.invoke("why").content, "first")
+        self.assertEqual(model.invoke("why not").content, "second")
+        entry = LLMCacheEntry.objects.get(stage="reasoning", hits=1)
+        self.assertEqual(LLMCacheEntry.objects.count(), 2)
+        self.assertGreater(entry.size, 0)
+        stats = cache_stats()["reasoning"]
+        self.assertEqual((stats["entries"], stats["stored_hits"]), (2, 1))
+        self.assertGreaterEqual(stats["hits"], 1)
+        self.assertGreaterEqual(stats["misses"], 2)
+
+    def test_expired_entries_are_not_used(self):
+        """Test that an entry past its TTL is asked again, replaced and evicted"""
+        from aimode.core.llm_cache import DatabaseLLMCache, evict_entries
+        model = self._model(DatabaseLLMCache("reasoning", ttl_seconds=0))
+        self.assertEqual(model.invoke("why").content, "first")
+        self.assertEqual(model.invoke("why").content, "second")
+        self.assertEqual(LLMCacheEntry.objects.count(), 1)
+        self.assertEqual(evict_entries(), 1)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        """Test that only the most recently used entries are kept beyond the size limit"""
+        from aimode.core.llm_cache import DatabaseLLMCache, evict_entries
+        model = self._model(DatabaseLLMCache("reasoning", max_entries=2))
+        with CaptureQueriesContext(connections['core']) as queries:
+            model.invoke("a")
+            model.invoke("b")
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('DELETE')])
+        for prompt in ("a", "c"):
+            model.invoke(prompt)
+        self.assertEqual(LLMCacheEntry.objects.count(), 2)
+        self.assertEqual(model.invoke("a").content, "first")
+        self.assertEqual(evict_entries(max_entries=1), 1)
+
+    @override_settings(AI_LLM_CACHE_STAGES=["reasoning"])
+    def test_stages_opt_in(self):
+        """Test that only stages listed in AI_LLM_CACHE_STAGES get a cache"""
+        from aimode.core.llm_cache import DatabaseLLMCache, cached_llm
+        self.assertIsInstance(cached_llm("reasoning").cache, DatabaseLLMCache)
+        self.assertIsNone(cached_llm("selection").cache)
+
+
+class ChatSuggestionsTest(SimpleTestCase):
+    """Tests for the suggestions of the AI chat's final reply"""
+
+    modules = ["Audio", "EPG", "Login", "Payments", "Profile", "Settings"]
+
+    def _suggest(self, content, user_prompt):
+        return rule_based_suggestions(content, user_prompt, lambda: self.modules)
+
+    def test_rules_cover_the_known_cases(self):
+        """Test that saving, missing modules and missing counts get suggestions and other replies none"""
+        self.assertEqual(self._suggest("Here is your plan.", "plan for Login with 5 testcases, don't save it"),
+                         ["Save the test plan"])
+        self.assertEqual(self._suggest("Which module should the test plan cover?", "create a login test plan"),
+                         ["Login", "Audio", "EPG", "Payments", "Profile"])
+        self.assertEqual(self._suggest("How many testcases do you need for the Login module?", "plan for Login"),
+                         ["2", "4", "5", "10"])
+        self.assertEqual(self._suggest("The plan has been generated. Anything else?", "plan"), [])
+
+    def _run_turn(self, reply):
+        from langchain_core.messages import HumanMessage
+        from aimode.core import agent
+
+        structurer = mock.Mock()
+        with mock.patch.object(agent, 'llm_with_tools', mock.Mock(invoke=mock.Mock(return_value=reply))), \
+                mock.patch.object(agent, '_suggestion_chain', return_value=structurer), \
+                mock.patch.object(agent, '_prompt_variables', return_value={}):
+            result = agent.chatbot({"messages": [HumanMessage(content="plan")], "user_prompt": "plan",
+                                    "session_id": "s1"})
+        return result["messages"][0], structurer
+
+    def test_turn_leaves_no_session_bound(self):
+        """Test that a graph turn reads the session but never binds it past the request"""
+        from langchain_core.messages import AIMessage
+        from aimode.core.tools import get_current_session_id, session_context
+
+        with session_context("s1", "plan"):
+            self._run_turn(AIMessage(content="done"))
+            self.assertEqual(get_current_session_id(), "s1")
+        self._run_turn(AIMessage(content="done"))
+        self.assertIsNone(get_current_session_id())
+
+    @override_settings(AGENT_SUGGESTIONS="llm")
+    def test_structurer_only_runs_on_the_final_reply(self):
+        """Test that tool hops make a single LLM call"""
+        from langchain_core.messages import AIMessage
+
+        message, structurer = self._run_turn(AIMessage(content="", tool_calls=[
+            {"name": "generate_testplan", "args": {}, "id": "call-1"},
+        ]))
+        structurer.invoke.assert_not_called()
+        self.assertNotIn("structured", message.additional_kwargs)
+
+        message, structurer = self._run_turn(AIMessage(content="done"))
+        structurer.invoke.assert_called_once()
+
+    def test_rules_need_no_second_llm_call(self):
+        """Test that the default rules structure the final reply without the structurer"""
+        from langchain_core.messages import AIMessage
+
+        message, structurer = self._run_turn(AIMessage(content="done"))
+        structurer.invoke.assert_not_called()
+        self.assertEqual(message.additional_kwargs["structured"], {"base_content": "done", "suggestions": []})
+
+
+class PromptContextProviderTest(SimpleTestCase):
+    """Tests for the cached database context of the AI prompts"""
+
+    def _provider(self, versions, ttl_seconds=0):
+        provider = PromptContextProvider(ttl_seconds=ttl_seconds)
+        builds = []
+
+        def build(conn, version):
+            builds.append(version)
+            return PromptContext(version=version, module_names=[f"Module {len(builds)}"])
+
+        patches = [
+            mock.patch('aimode.core.prompt_context.db'),
+            mock.patch.object(provider, '_version', side_effect=versions),
+            mock.patch.object(provider, '_build', side_effect=build),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return provider, builds
+
+    def test_context_is_rebuilt_only_when_its_version_changes(self):
+        """Test that the context is reused while the version is unchanged"""
+        provider, builds = self._provider([("a",), ("a",), ("b",)])
+        self.assertEqual(provider.get().module_names, ["Module 1"])
+        self.assertEqual(provider.get().module_names, ["Module 1"])
+        self.assertEqual(provider.get().module_names, ["Module 2"])
+        self.assertEqual(builds, [("a",), ("b",)])
+
+    def test_version_is_checked_once_per_ttl(self):
+        """Test that no query runs within the TTL"""
+        provider, builds = self._provider([("a",)], ttl_seconds=60)
+        for _ in range(3):
+            provider.get()
+        self.assertEqual(provider._version.call_count, 1)
+
+    def test_prompts_render_the_context(self):
+        """Test that prompts are filled from the context"""
+        from aimode.core.prompts import AGENT_PROMPT
+
+        context = PromptContext(active_projects=["STB"], modules_by_project={"STB": ["Login"]})
+        system = AGENT_PROMPT.format_messages(messages=[], **context.variables())[0].content
+        self.assertIn("Active projects: ['STB']", system)
+        self.assertIn('"STB": [', system)
+
+
+class StartupImportTest(SimpleTestCase):
+    """Tests that process startup does not load the AI chat stack"""
+
+    IMPORT_TIME_BUDGET = 5
+    AI_PACKAGES = ('langchain_core', 'langchain_openai', 'langgraph', 'openai', 'tiktoken')
+
+    def test_api_import_does_not_load_the_ai_stack(self):
+        """Test that loading the URLconf imports no LLM or aimode module besides the loader"""
+        code = (
+            "import json, sys, time, django\n"
+            "started = time.perf_counter()\n"
+            "django.setup()\n"
+            "import apps.core.apis.urls\n"
+            "print(json.dumps({'seconds': time.perf_counter() - started, 'modules': sorted(sys.modules)}))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code], cwd=settings.BASE_DIR, capture_output=True,
+            text=True, env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'sentriQA.settings'}, check=True,
+        )
+        report = json.loads(result.stdout.strip().splitlines()[-1])
+        # -X importtime lines: "import time: self [us] | cumulative | imported package"
+        slowest = sorted(
+            (line.split('|') for line in result.stderr.splitlines() if line.startswith('import time:')
+             and line.split('|')[1].strip().isdigit()),
+            key=lambda columns: int(columns[1]), reverse=True,
+        )[:10]
+        details = "\n".join(f"{int(columns[1]) / 1e6:.2f}s {columns[2].strip()}" for columns in slowest)
+
+        loaded = [module for module in report['modules']
+                  if module.split('.')[0] in self.AI_PACKAGES or
+                  (module.startswith('aimode.') and module != 'aimode.loader')]
+        self.assertEqual(loaded, [], f"AI modules imported at startup; slowest imports:\n{details}")
+        self.assertLess(report['seconds'], self.IMPORT_TIME_BUDGET, f"Slow startup; slowest imports:\n{details}")
+
+    def test_llm_cache_import_does_not_build_the_llm(self):
+        """Test that the LLM cache and its command can be imported without building the chat model"""
+        code = (
+            "import sys, django\n"
+            "django.setup()\n"
+            "import aimode.core.llm_cache, apps.core.management.commands.llm_cache\n"
+            "from aimode.core import llms\n"
+            "print(llms._llm is None and 'langchain_openai' not in sys.modules)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, capture_output=True, text=True,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'sentriQA.settings'}, check=True,
+        )
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "True")
+
+
+class CandidateShortlistTest(SimpleTestCase):
+    """Tests for the token budgeted candidate shortlist of the intelligent selector"""
+
+    def setUp(self):
+        self.testcases = [
+            {"id": i, "name": f"Testcase {i}", "modules": "Login", "priority": f"Class {i % 3 + 1}",
+             "testscore": float(1000 - i), "failure_rate": 0.5, "defects": 1.0}
+            for i in range(1000)
+        ]
+
+    def test_shortlist_stays_within_the_token_budget(self):
+        """Test that the encoded shortlist fits the budget however many candidates there are"""
+        shortlist = shortlist_candidates(self.testcases, output_counts=5, token_budget=500)
+        self.assertLess(len(shortlist), len(self.testcases))
+        self.assertLessEqual(count_tokens(encode_candidates(shortlist)), 500)
+        self.assertEqual(shortlist, sorted(shortlist, key=lambda tc: tc["testscore"], reverse=True))
+
+    def test_shortlist_keeps_top_scores_and_every_priority(self):
+        """Test that the best scored candidates are kept and lower priorities are still sampled"""
+        for testcase in self.testcases[:100]:
+            testcase["priority"] = "Class 1"
+        shortlist = shortlist_candidates(self.testcases, output_counts=5, token_budget=600, top_factor=3)
+        ids = [testcase["id"] for testcase in shortlist]
+        self.assertEqual(ids[:15], list(range(15)))
+        self.assertEqual({testcase["priority"] for testcase in shortlist}, {"Class 1", "Class 2", "Class 3"})
+
+    def test_candidates_are_encoded_as_a_table(self):
+        """Test that candidates are encoded as one compact row each"""
+        self.assertEqual(
+            encode_candidates(self.testcases[:1]),
+            "id|name|module|priority|score|failure_rate|defects\n0|Testcase 0|Login|Class 1|1000.0|0.5|1.0",
+        )
+
+    def test_selected_ids_are_normalised(self):
+        """Test that ids returned as strings or objects match candidates and unknown ids are dropped"""
+        by_id = {testcase["id"]: testcase for testcase in self.testcases[:5]}
+        selected = ["3", {"id": 1}, 3.0, " 4 ", "x", 99, None, {"name": "no id"}]
+        with mock.patch('aimode.core.shortlist.logger') as logger:
+            picked = pick_candidates(selected, by_id)
+        self.assertEqual([testcase["id"] for testcase in picked], [3, 1, 4])
+        self.assertIsNot(picked[0], by_id[3])
+        self.assertIn("Dropped 4 testcase id(s)", logger.warning.call_args[0][0])
+
+
+class SelectorStagesTest(SimpleTestCase):
+    """Tests for the concurrent post-selection stages of the intelligent selector"""
+
+    def _stage(self, seconds, result=None, error=None):
+        def stage():
+            time.sleep(seconds)
+            if error:
+                raise error
+            return result
+        return stage
+
+    def test_stages_run_concurrently(self):
+        """Test that the stages take as long as the slowest one, not their sum"""
+        from aimode.core.intelligent_testcase_selector import _run_stages
+
+        started = time.perf_counter()
+        results = _run_stages(
+            {"warning": self._stage(0.3, "warn"), "reasoning": self._stage(0.3, "why"),
+             "impact": self._stage(0.1, "impact")},
+            {"warning": "", "reasoning": "", "impact": ""}, timeout=5,
+        )
+        elapsed = time.perf_counter() - started
+        self.assertEqual(results, {"warning": "warn", "reasoning": "why", "impact": "impact"})
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 0.55)
+
+    def test_failed_and_slow_stages_fall_back(self):
+        """Test that a raising stage and one past the timeout get their fallbacks within the timeout"""
+        from aimode.core.intelligent_testcase_selector import _run_stages
+
+        started = time.perf_counter()
+        results = _run_stages(
+            {"warning": self._stage(1.5, "late"), "reasoning": self._stage(0, error=ValueError("bad json")),
+             "impact": self._stage(0.05, "impact")},
+            {"warning": "no warning", "reasoning": "no reasoning", "impact": ""}, timeout=0.3,
+        )
+        elapsed = time.perf_counter() - started
+        self.assertEqual(results, {"warning": "no warning", "reasoning": "no reasoning", "impact": "impact"})
+        self.assertGreaterEqual(elapsed, 0.3)
+        self.assertLess(elapsed, 0.6)
+
+
+class AsyncChatAPITest(TestCase):
+    """Tests for the async AI chat endpoints"""
+
+    databases = {'core'}
+
+    async def test_chat_requests_wait_on_the_llm_concurrently(self):
+        """Test that one worker serves many chats while each waits on the LLM"""
+        from langchain_core.messages import AIMessage
+
+        class SlowGraph:
+            async def ainvoke(self, state, config=None):
+                await asyncio.sleep(0.2)
+                return {"messages": [*state["messages"], AIMessage(content="done")]}
+
+        with mock.patch('aimode.chatbot.graph', SlowGraph()):
+            started = time.perf_counter()
+            responses = await asyncio.gather(*(
+                self.async_client.post(reverse('ai-test-plan'), {"user_msg": "plan", "session_id": f"s{i}"},
+                                       content_type='application/json')
+                for i in range(50)
+            ))
+            elapsed = time.perf_counter() - started
+        self.assertEqual({response.status_code for response in responses}, {status.HTTP_200_OK})
+        self.assertEqual(responses[0].json(), {"content": "done", "session_id": "s0"})
+        # 50 sequential requests would take 10 seconds
+        self.assertLess(elapsed, 2)
+
+    async def test_invalid_chat_request(self):
+        """Test that validation errors are returned with a 400"""
+        response = await self.async_client.post(reverse('ai-test-plan'), {}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user_msg', response.json())
+
+    async def test_malformed_chat_request(self):
+        """Test that malformed JSON and unsupported content types are rejected by DRF"""
+        response = await self.async_client.post(reverse('ai-test-plan'), '{"user_msg": ',
+                                                 content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', response.json())
+        response = await self.async_client.post(reverse('ai-filter-test'), 'user_msg', content_type='text/plain')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_chat_endpoints_are_in_the_schema(self):
+        """Test that the async AI endpoints are documented in the OpenAPI schema"""
+        from drf_spectacular.generators import SchemaGenerator
+
+        schema = SchemaGenerator().get_schema(request=None, public=True)
+        for name in ('ai-test-plan', 'ai-test-plan-stream', 'ai-filter-test'):
+            operation = schema['paths'][reverse(name)]['post']
+            self.assertEqual(operation['tags'], ["AI Testcase Plan Creation API"])
+            self.assertIn('requestBody', operation)
+
+    async def test_chat_stream_sends_tokens_before_the_result(self):
+        """Test that the stream endpoint sends reply tokens and tool progress as server-sent events"""
+        from langchain_core.messages import AIMessage, AIMessageChunk
+        from aimode.core.agent import AGENT_REPLY_TAG
+
+        class StreamingGraph:
+            async def astream_events(self, state, config=None, version=None):
+                yield {"event": "on_tool_start", "name": "create_testplan", "tags": [], "data": {},
+                       "parent_ids": ["root"]}
+                yield {"event": "on_tool_end", "name": "create_testplan", "tags": [], "data": {},
+                       "parent_ids": ["root"]}
+                for token in ("Plan ", "ready"):
+                    yield {"event": "on_chat_model_stream", "name": "llm", "tags": [AGENT_REPLY_TAG],
+                           "data": {"chunk": AIMessageChunk(content=token)}, "parent_ids": ["root"]}
+                yield {"event": "on_chat_model_stream", "name": "llm", "tags": [],
+                       "data": {"chunk": AIMessageChunk(content="suggestion")}, "parent_ids": ["root"]}
+                yield {"event": "on_chain_end", "name": "LangGraph", "tags": [], "parent_ids": [],
+                       "data": {"output": {"messages": [*state["messages"], AIMessage(content="Plan ready")]}}}
+
+        with mock.patch('aimode.chatbot.graph', StreamingGraph()):
+            response = await self.async_client.post(reverse('ai-test-plan-stream'),
+                                                    {"user_msg": "plan", "session_id": "s1"},
+                                                    content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        events = [
+            (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1].removeprefix("data: ")))
+            for block in body.strip().split("\n\n")
+        ]
+        self.assertEqual(events, [
+            ("session", {"session_id": "s1"}),
+            ("tool_start", {"tool": "create_testplan"}),
+            ("tool_end", {"tool": "create_testplan"}),
+            ("token", {"content": "Plan "}),
+            ("token", {"content": "ready"}),
+            ("result", {"content": "Plan ready", "session_id": "s1"}),
+        ])
+
+    async def test_chat_stream_closed_from_another_task(self):
+        """Test that a stream closed on client disconnect cancels the graph without a context reset error"""
+        from langchain_core.messages import AIMessageChunk
+        from aimode import chatbot
+        from aimode.core.agent import AGENT_REPLY_TAG
+        from aimode.core.tools import get_current_session_id
+
+        seen, cancelled = [], asyncio.Event()
+
+        class HangingGraph:
+            async def astream_events(self, state, config=None, version=None):
+                seen.append(get_current_session_id())
+                yield {"event": "on_chat_model_stream", "name": "llm", "tags": [AGENT_REPLY_TAG],
+                       "data": {"chunk": AIMessageChunk(content="Plan")}, "parent_ids": ["root"]}
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+
+        with mock.patch('aimode.chatbot.graph', HangingGraph()):
+            events = chatbot.astream_llm_response("plan", "s1")
+            self.assertEqual(await asyncio.create_task(anext(events)), ("token", {"content": "Plan"}))
+            await asyncio.create_task(events.aclose())
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+        self.assertEqual(seen, ["s1"])
+        self.assertIsNone(get_current_session_id())
@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Serve it with ``gunicorn -k uvicorn.workers.UvicornWorker sentriQA.asgi:application``
+so the async AI chat views can keep many requests waiting on the LLM per worker.
 """
 
 import os
@@ -14,3 +17,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sentriQA.settings")
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.AI_WARM_UP:
+    from aimode.loader import warm_up  # noqa: E402
+    warm_up()
@@ -5,6 +5,10 @@ from sentriQA.helpers.renders import ResponseInfo
 from rest_framework import status
 from apps.core.mixins import OptionMixin
 from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+import inspect
 
 class CustomGenericAPIView(GenericAPIView):
 
@@ -277,4 +281,42 @@ class OptionAPIView(OptionMixin, GenericAPIView):
         return ResponseInfo.success_response(
             data=serializer.data if serializer.data else [],
             status_code=status.HTTP_201_CREATED
-        )
\ No newline at end of file
+        )
+
+
+class AsyncAPIView(GenericAPIView):
+    """
+    Async view for endpoints that spend most of their time waiting on the LLM.
+    DRF only dispatches sync handlers, so ``dispatch`` is reimplemented as a
+    coroutine: authentication, permissions, throttling and content negotiation
+    run in a worker thread (they may hit the database), the handler is awaited
+    and DRF errors such as malformed JSON (400) or an unsupported media type
+    (415) go through ``handle_exception`` like in any other DRF view. Handlers
+    must be ``async def``.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    @staticmethod
+    def json_response(data, status_code=status.HTTP_200_OK):
+        return JsonResponse(data, status=status_code, encoder=JSONEncoder, safe=False)
@@ -1,6 +1,8 @@
+import json
 from typing import Any, Protocol
 from rest_framework import status
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 
 
 
@@ -46,4 +48,9 @@ class ResponseInfo:
             "message": message,
             "status_code": status.HTTP_400_BAD_REQUEST
         }
-        return Response(response, status=status_code)
\ No newline at end of file
+        return Response(response, status=status_code)
+
+
+def sse_message(event: str, data: Any) -> str:
+    """Encode one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=JSONEncoder)}\n\n"
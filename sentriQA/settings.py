@@ -61,7 +61,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "sentriQA.middleware.AsyncWhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -218,6 +218,61 @@ LOGGING = {
 }
 
 
+# Plan history keeps a full snapshot every N versions and deltas in between
+PLAN_HISTORY_SNAPSHOT_INTERVAL = int(os.environ.get("PLAN_HISTORY_SNAPSHOT_INTERVAL", 10))
+
+# Plans moved to cold storage by the archive_plans command; stale archiving is off when 0
+PLAN_ARCHIVE_INACTIVE_DAYS = int(os.environ.get("PLAN_ARCHIVE_INACTIVE_DAYS", 30))
+PLAN_ARCHIVE_STALE_DAYS = int(os.environ.get("PLAN_ARCHIVE_STALE_DAYS", 0))
+
+# AI chat sessions idle for this long are deleted by compact_sessions, and draft
+# versions older than AI_SESSION_VERSION_TTL_DAYS are dropped from live sessions
+AI_SESSION_TTL_DAYS = int(os.environ.get("AI_SESSION_TTL_DAYS", 30))
+AI_SESSION_VERSION_TTL_DAYS = int(os.environ.get("AI_SESSION_VERSION_TTL_DAYS", 14))
+
+# LangGraph checkpoints of the AI chat are stored in the database: each thread keeps
+# its latest AGENT_CHECKPOINT_HISTORY checkpoints holding at most AGENT_CHECKPOINT_MAX_MESSAGES
+# messages, threads idle for AGENT_CHECKPOINT_TTL_DAYS are evicted by compact_sessions and
+# each worker caches up to AGENT_CHECKPOINT_CACHE_SIZE decoded checkpoints. Queries run on a pool
+# of AGENT_CHECKPOINT_WORKERS threads, each holding one database connection
+AGENT_CHECKPOINT_HISTORY = int(os.environ.get("AGENT_CHECKPOINT_HISTORY", 5))
+AGENT_CHECKPOINT_MAX_MESSAGES = int(os.environ.get("AGENT_CHECKPOINT_MAX_MESSAGES", 40))
+AGENT_CHECKPOINT_TTL_DAYS = int(os.environ.get("AGENT_CHECKPOINT_TTL_DAYS", 7))
+AGENT_CHECKPOINT_CACHE_SIZE = int(os.environ.get("AGENT_CHECKPOINT_CACHE_SIZE", 128))
+AGENT_CHECKPOINT_WORKERS = int(os.environ.get("AGENT_CHECKPOINT_WORKERS", 4))
+
+# Seconds the intelligent selector waits for its coverage warning and reasoning LLM
+# calls, which run concurrently, before answering without them
+AI_SELECTOR_STAGE_TIMEOUT = float(os.environ.get("AI_SELECTOR_STAGE_TIMEOUT", 60))
+
+# The intelligent selector shows the LLM at most AI_SHORTLIST_TOKEN_BUDGET tokens of candidates:
+# the best AI_SHORTLIST_TOP_FACTOR x requested count by score, then the best of each priority
+AI_SHORTLIST_TOKEN_BUDGET = int(os.environ.get("AI_SHORTLIST_TOKEN_BUDGET", 8000))
+AI_SHORTLIST_TOP_FACTOR = int(os.environ.get("AI_SHORTLIST_TOP_FACTOR", 3))
+AI_TOKEN_ENCODING = os.environ.get("AI_TOKEN_ENCODING", "o200k_base")
+
+# LLM responses of the prompt stages listed in AI_LLM_CACHE_STAGES are cached in the database
+# for AI_LLM_CACHE_TTL_SECONDS, keeping the AI_LLM_CACHE_MAX_ENTRIES most recently used
+AI_LLM_CACHE_STAGES = [
+    stage.strip() for stage in os.environ.get(
+        "AI_LLM_CACHE_STAGES", "sql_query,selection,coverage_warning,reasoning,coverage_impact"
+    ).split(",") if stage.strip()
+]
+AI_LLM_CACHE_TTL_SECONDS = int(os.environ.get("AI_LLM_CACHE_TTL_SECONDS", 24 * 60 * 60))
+AI_LLM_CACHE_MAX_ENTRIES = int(os.environ.get("AI_LLM_CACHE_MAX_ENTRIES", 5000))
+
+# Suggestions of the AI chat's final reply: "rules" derives them without an LLM call,
+# "llm" asks the suggestion structurer (one extra LLM call per chat turn)
+AGENT_SUGGESTIONS = os.environ.get("AGENT_SUGGESTIONS", "rules")
+
+# Tables, projects and modules rendered into the AI prompts are cached per process; every
+# AI_PROMPT_CONTEXT_TTL_SECONDS a version query checks whether they need rebuilding
+AI_PROMPT_CONTEXT_TTL_SECONDS = int(os.environ.get("AI_PROMPT_CONTEXT_TTL_SECONDS", 60))
+
+# The AI chat stack is loaded on the first AI request; set AI_WARM_UP=1 to load it when
+# the ASGI/WSGI application starts instead
+AI_WARM_UP = os.environ.get("AI_WARM_UP", "0").lower() in ("1", "true", "yes")
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 